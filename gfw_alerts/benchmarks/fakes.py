@@ -0,0 +1,167 @@
+import base64
+import hashlib
+import sys
+import types
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# === GFW ===
+class FakeGFW:
+    """
+    Sustituto local de la API de GFW: sirve un CSV fijo como si fuera la descarga.
+    """
+
+    def __init__(self, csv_bytes: bytes):
+        self.csv_bytes = csv_bytes
+        self.calls = 0
+
+    def authenticate_gfw(self, username, password):
+        self.calls += 1
+        return "token-sintetico"
+
+    def get_api_key(self, token, alias, email, organization=""):
+        self.calls += 1
+        return "api-key-sintetica"
+
+    def download_alerts(self, api_key, start_date, end_date, polygon, *args, **kwargs):
+        self.calls += 1
+        return self.csv_bytes
+
+
+# === Earth Engine ===
+class _FakeEEObject:
+    """
+    Objeto encadenable que imita la API perezosa de Earth Engine.
+    """
+
+    def __init__(self, n_images=1):
+        self._n_images = n_images
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def getInfo(self):
+        return self._n_images
+
+    def getMapId(self, vis_params=None):
+        return {"tile_fetcher": types.SimpleNamespace(url_format="https://tiles.invalid/{z}/{x}/{y}.png")}
+
+    def getThumbURL(self, params=None):
+        return "https://tiles.invalid/thumbnail.png"
+
+
+def make_fake_ee(n_images=1) -> types.ModuleType:
+    ee = types.ModuleType("ee")
+    ee.Initialize = lambda *args, **kwargs: None
+    ee.Authenticate = lambda *args, **kwargs: None
+    ee.Geometry = types.SimpleNamespace(Polygon=lambda *args, **kwargs: _FakeEEObject(n_images))
+    ee.ImageCollection = lambda *args, **kwargs: _FakeEEObject(n_images)
+    ee.Filter = types.SimpleNamespace(lt=lambda *args, **kwargs: None)
+    return ee
+
+
+# === Google Cloud Storage ===
+class FakeBlob:
+    """
+    Blob en memoria; cada escritura incrementa su generación (como en GCS) y se respetan
+    las precondiciones `if_generation_match`.
+    """
+
+    def __init__(self, store, bucket_name, name):
+        self._store, self._key = store, (bucket_name, name)
+
+    @property
+    def generation(self):
+        return FakeStorageClient.generations.get(self._key, 0)
+
+    @property
+    def md5_hash(self):
+        return base64.b64encode(hashlib.md5(self._store[self._key]).digest()).decode()
+
+    def _check(self, if_generation_match):
+        if if_generation_match is not None and if_generation_match != self.generation:
+            from google.api_core.exceptions import PreconditionFailed
+            raise PreconditionFailed(f"generación {self.generation} != {if_generation_match}")
+
+    def _write(self, data, if_generation_match):
+        self._check(if_generation_match)
+        self._store[self._key] = data
+        FakeStorageClient.generations[self._key] = self.generation + 1
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        self._write(data.encode("utf-8") if isinstance(data, str) else data, if_generation_match)
+
+    def upload_from_filename(self, filename, if_generation_match=None):
+        self._write(Path(filename).read_bytes(), if_generation_match)
+
+    def exists(self):
+        return self._key in self._store
+
+    def download_as_bytes(self, if_generation_match=None):
+        self._check(if_generation_match)
+        return self._store[self._key]
+
+    def download_to_filename(self, filename):
+        Path(filename).write_bytes(self._store[self._key])
+
+
+class FakeBucket:
+    def __init__(self, store, name):
+        self._store, self.name = store, name
+
+    def blob(self, name):
+        return FakeBlob(self._store, self.name, name)
+
+    def get_blob(self, name):
+        blob = self.blob(name)
+        return blob if blob.exists() else None
+
+
+class FakeStorageClient:
+    """
+    Cliente de GCS en memoria: todos los clientes comparten el mismo almacén.
+    """
+    store = {}
+    generations = {}
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def bucket(self, name):
+        return FakeBucket(self.store, name)
+
+
+def make_fake_storage() -> types.ModuleType:
+    storage = types.ModuleType("google.cloud.storage")
+    storage.Client = FakeStorageClient
+    return storage
+
+
+@contextmanager
+def fake_services(n_images=1):
+    """
+    Instala Earth Engine y google.cloud.storage falsos en `sys.modules` mientras dure el bloque.
+    Los módulos del pipeline los importan de forma perezosa, así que reciben los sustitutos.
+    """
+    try:
+        import google.cloud as cloud
+    except ImportError:
+        cloud = types.ModuleType("google.cloud")
+        sys.modules.setdefault("google", types.ModuleType("google")).cloud = cloud
+        sys.modules["google.cloud"] = cloud
+
+    fakes = {"ee": make_fake_ee(n_images), "google.cloud.storage": make_fake_storage()}
+    saved = {name: sys.modules.get(name) for name in fakes}
+    saved_storage = getattr(cloud, "storage", None)
+    sys.modules.update(fakes)
+    cloud.storage = fakes["google.cloud.storage"]
+    try:
+        yield fakes
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        cloud.storage = saved_storage
@@ -0,0 +1,291 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+GFW_ALERTS_DIR = Path(__file__).resolve().parent.parent
+TEMPLATE_PATH = GFW_ALERTS_DIR / "reporte" / "report_template.html"
+RESULTS_DIR = Path(__file__).resolve().parent / "resultados"
+
+# Las mismas llamadas que hace main.py, en su orden
+STAGES = [
+    "descarga",
+    "csv_to_geodataframe",
+    "load_reference_layers",
+    "process_alerts",
+    "alert_cube",
+    "cluster_alerts_by_section",
+    "get_cluster_bboxes",
+    "plot_alerts_interactive",
+    "plot_sentinel_cluster_interactive",
+    "build_report_json",
+    "render",
+]
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# Etapas que escriben un marcador HTML por alerta: por defecto no se corren por encima de este tamaño
+STAGE_MAX_ALERTS = {"plot_alerts_interactive": 100_000}
+
+# Presupuesto de arranque en frío (importar main.py / main.py --help), en segundos
+IMPORT_BUDGET_S = 1.0
+
+
+def _rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _rows(obj):
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+def measure(stage, n_alerts, fn, *args, rows_in=None, trace_memory=False, **kwargs):
+    """
+    Ejecuta `fn` y devuelve (resultado, métricas) con tiempo de pared, CPU,
+    pico de memoria de Python (tracemalloc, opcional) y RSS máximo del proceso.
+    """
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    result = fn(*args, **kwargs)
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    peak_mb = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = round(peak / (1024 * 1024), 2)
+
+    metrics = {
+        "etapa": stage,
+        "n_alertas": n_alerts,
+        "filas_entrada": rows_in,
+        "filas_salida": _rows(result),
+        "tiempo_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "memoria_pico_mb": peak_mb,
+        # pico acumulado del proceso (incluye las etapas y tamaños anteriores)
+        "rss_pico_proceso_mb": round(rss, 1) if (rss := _rss_mb()) is not None else None,
+    }
+    print(f"  {stage:<36} {wall:>9.3f} s" + (f"  {peak_mb:>9.1f} MB" if peak_mb is not None else ""))
+    return result, metrics
+
+
+def measure_startup(repeats=3):
+    """
+    Mide el arranque en frío en procesos nuevos: `import main` y `main.py --help`.
+    """
+    commands = {
+        "import_main": [sys.executable, "-c", "import main"],
+        "main_help": [sys.executable, "main.py", "--help"],
+    }
+    results = []
+    for name, cmd in commands.items():
+        timings = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            subprocess.run(cmd, cwd=GFW_ALERTS_DIR, check=True, capture_output=True)
+            timings.append(time.perf_counter() - t0)
+        best = min(timings)
+        results.append({
+            "etapa": f"arranque_{name}",
+            "tiempo_s": round(best, 4),
+            "presupuesto_s": IMPORT_BUDGET_S,
+            "dentro_presupuesto": best <= IMPORT_BUDGET_S,
+        })
+        print(f"  arranque_{name:<27} {best:>9.3f} s (presupuesto {IMPORT_BUDGET_S} s)")
+    return results
+
+
+def run_size(n_alerts, stages, workdir, max_clusters, trace_memory, seed, workers=(1,)):
+    """
+    Corre las etapas de main.py con `n_alerts` alertas sintéticas. El cruce territorial y
+    el clustering se miden una vez por cada número de procesos de `workers` (`--procesos`).
+    """
+    import geopandas as gpd
+
+    from benchmarks import synthetic
+    from benchmarks.fakes import FakeGFW, fake_services
+    from src.download_gfw_data import CSV_CHUNK_ROWS, save_to_csv, csv_to_geodataframe
+    from src.aoi import prepare_aoi
+    from src.process_gfw_alerts import (
+        load_reference_layers, process_alerts, filter_confidence, cluster_alerts_by_section, get_cluster_bboxes
+    )
+    from src.alert_cube import build_alert_cube, summary_from_cube
+    from src.maps import plot_alerts_interactive, plot_sentinel_cluster_interactive
+    from src.create_final_json import build_report_json
+    from reporte.render_report import render
+
+    results = []
+
+    def run(stage, fn, *args, **kwargs):
+        result, metrics = measure(stage, n_alerts, fn, *args, trace_memory=trace_memory, **kwargs)
+        results.append(metrics)
+        return result
+
+    def maybe_run(stage, fn, *args, rows_in=None, **kwargs):
+        if stage in stages:
+            return run(stage, fn, *args, rows_in=rows_in, **kwargs)
+        return fn(*args, **kwargs)
+
+    def run_per_workers(stage, fn, *args, rows_in=None, **kwargs):
+        # Una medición por número de procesos; las etapas siguientes usan el primer resultado
+        first = None
+        for n_workers in workers:
+            if stage in stages:
+                label = f"{stage} (procesos={n_workers})" if len(workers) > 1 else stage
+                result = run(label, fn, *args, rows_in=rows_in, workers=n_workers, **kwargs)
+                results[-1]["procesos"] = n_workers
+            else:
+                result = fn(*args, workers=n_workers, **kwargs)
+            first = result if first is None else first
+        return first
+
+    def wanted(stage):
+        return stage in stages and n_alerts <= STAGE_MAX_ALERTS.get(stage, n_alerts)
+
+    # === Insumos sintéticos (no se miden) ===
+    folder = Path(workdir) / f"n_{n_alerts}"
+    folder.mkdir(parents=True, exist_ok=True)
+    aoi_path = folder / "area_estudio.geojson"
+    veredas_path = folder / "veredas.shp"
+    secciones_path = folder / "secciones.shp"
+    synthetic.make_aoi().to_file(aoi_path, driver="GeoJSON")
+    synthetic.make_veredas().to_file(veredas_path)
+    synthetic.make_secciones(seed=seed).to_file(secciones_path)
+    for name in ("header1.png", "header2.png", "footer.png"):
+        (folder / name).write_bytes(b"")
+
+    alerts_df = synthetic.make_alerts(n_alerts, seed=seed)
+    gfw = FakeGFW(alerts_df.to_csv(index=False).encode("utf-8"))
+    csv_path = folder / "alertas.csv"
+    _, aoi_geom = prepare_aoi(str(aoi_path), cache_dir=str(folder / "aoi_cache"))
+
+    # === Etapas (como en main.py) ===
+    data = gfw.download_alerts("api-key", "2024-01-01", "2024-03-31", polygon=None)
+    maybe_run("descarga", save_to_csv, data, csv_path, rows_in=n_alerts)
+
+    def load_alerts():
+        return csv_to_geodataframe(csv_path, chunksize=CSV_CHUNK_ROWS, aoi=aoi_geom)
+
+    gdf = maybe_run("csv_to_geodataframe", load_alerts)
+    veredas, secciones = maybe_run(
+        "load_reference_layers", load_reference_layers, str(veredas_path), str(secciones_path),
+        bbox=gpd.GeoSeries([aoi_geom], crs="EPSG:4326")
+    )
+    alerts_all = run_per_workers("process_alerts", process_alerts, gdf, veredas, secciones,
+                                 confidence=None, rows_in=len(gdf))
+
+    def cube_summary():
+        return summary_from_cube(build_alert_cube(alerts_all))
+
+    summary = maybe_run("alert_cube", cube_summary, rows_in=len(alerts_all))
+
+    alerts_gdf = filter_confidence(alerts_all, "highest")
+    clusters = run_per_workers("cluster_alerts_by_section", cluster_alerts_by_section, alerts_gdf,
+                               rows_in=len(alerts_gdf))
+    bboxes = maybe_run("get_cluster_bboxes", get_cluster_bboxes, clusters, rows_in=len(clusters))
+
+    if wanted("plot_alerts_interactive"):
+        run("plot_alerts_interactive", plot_alerts_interactive, gdf, str(aoi_path),
+            str(folder / "mapa_alertas.html"), rows_in=len(gdf))
+
+    sentinel_results = []
+    with fake_services():
+        if wanted("plot_sentinel_cluster_interactive"):
+            def sentinel_maps():
+                for _, row in bboxes.head(max_clusters).iterrows():
+                    cid = int(row["cluster_id"])
+                    out = str(folder / f"sentinel_cluster_{cid}.html")
+                    if plot_sentinel_cluster_interactive(row.geometry, cid, "2024-01-01", "2024-03-31", out, alerts_gdf=gdf):
+                        sentinel_results.append({"cluster_id": cid, "map_html": out})
+                return sentinel_results
+            run("plot_sentinel_cluster_interactive", sentinel_maps, rows_in=min(len(bboxes), max_clusters))
+
+        json_path = str(folder / "reporte_final.json")
+        report_args = (summary, clusters, "I", "2024", str(folder / "header1.png"), str(folder / "header2.png"),
+                       str(folder / "footer.png"), str(folder / "mapa_alertas.html"), json_path)
+        maybe_run("build_report_json", build_report_json, *report_args, sentinel_results=sentinel_results,
+                  rows_in=len(clusters))
+
+        if "render" in stages:
+            run("render", render, TEMPLATE_PATH, Path(json_path), folder / "reporte_final.html")
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de alertas GFW con datos sintéticos")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Número de alertas sintéticas por corrida")
+    parser.add_argument("--etapas", nargs="+", default=STAGES, choices=STAGES, help="Etapas a medir")
+    parser.add_argument("--max-clusters", type=int, default=20,
+                        help="Clusters con mapa Sentinel (Earth Engine simulado)")
+    parser.add_argument("--memoria", action="store_true",
+                        help="Mide el pico de memoria con tracemalloc (agrega sobrecosto al tiempo)")
+    parser.add_argument("--sin-arranque", action="store_true", help="No mide el arranque en frío")
+    parser.add_argument("--verificar-presupuesto", action="store_true",
+                        help="Termina con error si el arranque supera el presupuesto")
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1],
+                        help="Procesos para el cruce territorial y el clustering (una medición por valor)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", type=str, default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args(argv)
+
+    os.chdir(GFW_ALERTS_DIR)
+    sys.path.insert(0, str(GFW_ALERTS_DIR))
+
+    report = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "resultados": [],
+    }
+
+    startup_ok = True
+    if not args.sin_arranque:
+        print("⏱️ Arranque en frío")
+        startup = measure_startup()
+        startup_ok = all(r["dentro_presupuesto"] for r in startup)
+        report["resultados"].extend(startup)
+
+    with tempfile.TemporaryDirectory(prefix="simbyp_bench_") as workdir:
+        for n_alerts in args.tamanos:
+            print(f"⏱️ {n_alerts:,} alertas")
+            report["resultados"].extend(
+                run_size(n_alerts, args.etapas, workdir, args.max_clusters, args.memoria, args.semilla,
+                         workers=args.procesos)
+            )
+
+    output = Path(args.salida) if args.salida else RESULTS_DIR / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"✅ Resultados guardados en: {output}")
+
+    if args.verificar_presupuesto and not startup_ok:
+        print(f"❌ El arranque supera el presupuesto de {IMPORT_BUDGET_S} s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Área de estudio sintética alrededor de Bogotá (EPSG:4326)
+AOI_BOUNDS = (-74.45, 3.95, -73.85, 4.85)
+CONFIDENCE_LEVELS = ["nominal", "high", "highest"]
+SUBSYSTEM_LEVELS = ["not_detected", "nominal", "high"]
+SECCION_NUMERIC_COLUMNS = [
+    'STVIVIENDA', 'STP19_EC_1', 'STP19_ES_2', 'STP19_ACU1', 'STP19_ACU2', 'STP19_ALC1',
+    'STP19_ALC2', 'STP19_GAS1', 'STP19_GAS2', 'STP19_REC1', 'STP19_REC2', 'STP19_INT1',
+    'STP19_INT2', 'STP27_PERS', 'pobdens20', 'gdp_20_m2p', 'acss_mrkt', 'elevation',
+    'dprivt', 'treecv_24'
+]
+
+
+def make_aoi(bounds=AOI_BOUNDS) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame({"nombre": ["area_sintetica"]}, geometry=[shapely.box(*bounds)], crs="EPSG:4326")
+
+
+def make_alerts(
+    n_alerts: int,
+    bounds=AOI_BOUNDS,
+    n_hotspots: int = 50,
+    clustered_fraction: float = 0.8,
+    spread_deg: float = 0.01,
+    start_date: str = "2024-01-01",
+    end_date: str = "2024-03-31",
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Genera alertas con las columnas del CSV de GFW.
+
+    Una fracción `clustered_fraction` se concentra alrededor de `n_hotspots` focos
+    (desviación `spread_deg`); el resto se distribuye uniformemente en el área.
+    """
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = bounds
+
+    n_clustered = int(n_alerts * clustered_fraction)
+    centers = np.column_stack([rng.uniform(xmin, xmax, n_hotspots), rng.uniform(ymin, ymax, n_hotspots)])
+    picked = centers[rng.integers(0, n_hotspots, n_clustered)]
+    clustered = picked + rng.normal(0, spread_deg, (n_clustered, 2))
+    scattered = np.column_stack([
+        rng.uniform(xmin, xmax, n_alerts - n_clustered),
+        rng.uniform(ymin, ymax, n_alerts - n_clustered),
+    ])
+    coords = np.vstack([clustered, scattered])
+    coords[:, 0] = coords[:, 0].clip(xmin, xmax)
+    coords[:, 1] = coords[:, 1].clip(ymin, ymax)
+
+    dates = pd.date_range(start_date, end_date, freq="D").strftime("%Y-%m-%d").to_numpy()
+    return pd.DataFrame({
+        "longitude": coords[:, 0].round(6),
+        "latitude": coords[:, 1].round(6),
+        "gfw_integrated_alerts__date": dates[rng.integers(0, len(dates), n_alerts)],
+        "gfw_integrated_alerts__confidence": rng.choice(CONFIDENCE_LEVELS, n_alerts, p=[0.3, 0.3, 0.4]),
+        "umd_glad_landsat_alerts__confidence": rng.choice(SUBSYSTEM_LEVELS, n_alerts),
+        "umd_glad_sentinel2_alerts__confidence": rng.choice(SUBSYSTEM_LEVELS, n_alerts),
+        "wur_radd_alerts__confidence": rng.choice(SUBSYSTEM_LEVELS, n_alerts),
+    })
+
+
+def _grid(bounds, nx, ny):
+    xmin, ymin, xmax, ymax = bounds
+    xs = np.linspace(xmin, xmax, nx + 1)
+    ys = np.linspace(ymin, ymax, ny + 1)
+    ix, iy = np.meshgrid(np.arange(nx), np.arange(ny), indexing="ij")
+    ix, iy = ix.ravel(), iy.ravel()
+    return ix, iy, shapely.box(xs[ix], ys[iy], xs[ix + 1], ys[iy + 1])
+
+
+def make_veredas(bounds=AOI_BOUNDS, nx: int = 20, ny: int = 30) -> gpd.GeoDataFrame:
+    """
+    Grilla de veredas; cada columna de 5 celdas pertenece a un municipio.
+    """
+    ix, iy, geoms = _grid(bounds, nx, ny)
+    return gpd.GeoDataFrame({
+        "CODIGO_VER": [f"V{x:03d}{y:03d}" for x, y in zip(ix, iy)],
+        "NOMB_MPIO": [f"Municipio {x // 5}" for x in ix],
+        "NOMBRE_VER": [f"Vereda {x}-{y}" for x, y in zip(ix, iy)],
+    }, geometry=geoms, crs="EPSG:4326")
+
+
+def make_secciones(bounds=AOI_BOUNDS, nx: int = 40, ny: int = 60, seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    Grilla de secciones rurales con los atributos censales y socioeconómicos del panel SDP.
+    """
+    rng = np.random.default_rng(seed)
+    ix, iy, geoms = _grid(bounds, nx, ny)
+    n = len(geoms)
+    data = {
+        "MPIO_CDPMP": [f"{25000 + x // 10:05d}" for x in ix],
+        "SECR_CCNCT": [f"S{x:03d}{y:03d}" for x, y in zip(ix, iy)],
+    }
+    for col in SECCION_NUMERIC_COLUMNS:
+        data[col] = rng.uniform(0, 500, n).round(2)
+    data["STVIVIENDA"] = rng.integers(0, 400, n)
+    return gpd.GeoDataFrame(data, geometry=geoms, crs="EPSG:4326")
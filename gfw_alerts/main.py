@@ -1,99 +1,160 @@
 import argparse
-from dotenv import load_dotenv
+import asyncio
 import os
 from pathlib import Path
-import dotenv
 import warnings
 
-# Suppress urllib3 SSL warning
-warnings.filterwarnings("ignore", message="urllib3 v2 only supports OpenSSL 1.1.1+")
-
-dotenv.load_dotenv()
-
-# Authenticate with Google Cloud
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-
-# === Importar funciones del pipeline ===
-from src.download_gfw_data import (
-    get_api_key,
-    get_start_end_dates,
-    extract_polygon_from_file,
-    download_alerts,
-    save_to_csv,
-    csv_to_geodataframe,
-    save_geodataframe_to_geojson,
-    summarize_alert_confidences,
-    authenticate_gfw
-)
-from src.process_gfw_alerts import (
-    process_alerts,
-    cluster_alerts_by_section,
-    get_cluster_bboxes,
-)
-from src.create_final_json import build_report_json
-from src.maps import plot_alerts_interactive, plot_sentinel_cluster_interactive
-from reporte.render_report import render
-
-# Cargar variables de entorno 
-# Buscar el .env en la raíz del proyecto (un nivel arriba de bosques-bog)
-env_path = Path(__file__).parent.parent / ".env"
-print(f"Debug: env_path = {env_path}")
-print(f"Debug: env_path exists = {env_path.exists()}")
-load_dotenv(env_path)
-
-USERNAME = os.getenv("GFW_USERNAME")
-PASSWORD = os.getenv("GFW_PASSWORD")
-ALIAS = os.getenv("ALIAS")
-EMAIL = os.getenv("EMAIL")
-ORG = os.getenv("ORG")
-OUTPUTS_BASE_PATH = os.getenv("OUTPUTS_BASE_PATH")
-GOOGLE_CLOUD_PROJECT = os.getenv("GCP_PROJECT")
-INPUTS_PATH = os.getenv("INPUTS_PATH")
-
-print(f"Debug: USERNAME = {USERNAME}")
-print(f"Debug: PASSWORD = {'*' * len(PASSWORD) if PASSWORD else None}")
-print(f"Debug: ALIAS = {ALIAS}")
-print(f"Debug: EMAIL = {EMAIL}")
-print(f"Debug: ORG = {ORG}")
-print(f"Debug: OUTPUTS_BASE_PATH = {OUTPUTS_BASE_PATH}")
-print(f"Debug: GOOGLE_CLOUD_PROJECT = {GOOGLE_CLOUD_PROJECT}")
-print(f"Debug: INPUTS_PATH = {INPUTS_PATH}")
-
-# === Validar que las variables de entorno se cargaron correctamente ===
-required_env_vars = {
-    "USERNAME": USERNAME,
-    "PASSWORD": PASSWORD,
-    "ALIAS": ALIAS,
-    "EMAIL": EMAIL,
-    "ORG": ORG,
-    "OUTPUTS_BASE_PATH": OUTPUTS_BASE_PATH,
-    "GCP_PROJECT": GOOGLE_CLOUD_PROJECT,
-    "INPUTS_PATH": INPUTS_PATH,
+# Los módulos del pipeline (geopandas, Earth Engine, folium, GCS...) se importan dentro
+# de `main`, después de leer los argumentos: `--help` y los procesos auxiliares no
+# pagan su costo de importación.
+
+REQUIRED_ENV_VARS = {
+    "USERNAME": "GFW_USERNAME",
+    "PASSWORD": "GFW_PASSWORD",
+    "ALIAS": "ALIAS",
+    "EMAIL": "EMAIL",
+    "ORG": "ORG",
+    "OUTPUTS_BASE_PATH": "OUTPUTS_BASE_PATH",
+    "GOOGLE_CLOUD_PROJECT": "GCP_PROJECT",
+    "INPUTS_PATH": "INPUTS_PATH",
 }
 
-missing_vars = [key for key, value in required_env_vars.items() if value is None]
+# Mapas Sentinel generados a la vez (solicitudes simultáneas a Earth Engine)
+SENTINEL_CONCURRENCY = 4
 
-if missing_vars:
-    print(f"Error: Faltan las siguientes variables de entorno en {env_path}:")
-    for var in missing_vars:
-        print(f" - {var}")
-    exit(1)
 
-# === Rutas de insumos ===
-POLYGON_PATH = os.path.join(INPUTS_PATH, "area_estudio", "gfw", "area_estudio.geojson")
-VEREDAS_PATH = os.path.join(INPUTS_PATH, "area_estudio", "gfw", "veredas_cund_2024/veredas_cund_2024.shp")
-SECCIONES_PATH = os.path.join(INPUTS_PATH, "area_estudio", "gfw", "panel_secciones_rurales", "V3/panel_SDP_29092025-v3.shp")
-HEADER_IMG1_PATH = os.path.join(INPUTS_PATH, "area_estudio", "asi_4.png")
-HEADER_IMG2_PATH = os.path.join(INPUTS_PATH, "area_estudio", "bogota_4.png")
-FOOTER_IMG_PATH = os.path.join(INPUTS_PATH, "area_estudio", "secre_5.png")
-
-if __name__ == "__main__":
-    # === Argumentos de ejecución ===
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Pipeline de alertas GFW")
     parser.add_argument("--trimestre", type=str, required=True, help="Trimestre: I, II, III o IV")
     parser.add_argument("--anio", type=str, required=True, help="Año en formato YYYY")
-    args = parser.parse_args()
-
+    parser.add_argument("--debug", action="store_true", help="Muestra la configuración cargada")
+    parser.add_argument("--perfilar", action="store_true",
+                        help="Guarda un perfil cProfile por etapa en <salida>/perfiles")
+    parser.add_argument("--cassettes", choices=["off", "record", "replay"], default=None,
+                        help="Graba (record) o reproduce sin red (replay) las llamadas a GFW, EE y GCS. "
+                             "Equivale a SIMBYP_CASSETTE_MODE; el almacén se define con SIMBYP_CASSETTE_DIR")
+    parser.add_argument("--modo-reporte", choices=["iframe", "compartido", "lazy"], default="iframe",
+                        help="iframe: una página folium por mapa. compartido: iframes con páginas mínimas "
+                             "(solo datos) y JS/CSS compartido en assets/. lazy: un solo Leaflet que crea "
+                             "cada mapa al entrar en pantalla, con miniaturas Sentinel-2 estáticas")
+    parser.add_argument("--procesos", type=int, default=1,
+                        help="Procesos para el cruce territorial y el clustering (por teselas / secciones). "
+                             "El resultado es idéntico al de 1 proceso")
+    parser.add_argument("--cola-sentinel", default=None, metavar="URL",
+                        help="Publica los mapas Sentinel por cluster en una cola durable (sqlite:///ruta.db "
+                             "o file:///carpeta) que otros nodos consumen con sentinel_worker.py")
+    return parser.parse_args(argv)
+
+
+def load_config(debug=False):
+    """
+    Carga las variables de entorno (.env en la raíz del proyecto) y arma las rutas de insumos.
+    Termina el proceso si falta alguna variable requerida.
+    """
+    from dotenv import load_dotenv
+
+    # Buscar el .env en la raíz del proyecto (un nivel arriba de gfw_alerts)
+    env_path = Path(__file__).parent.parent / ".env"
+    load_dotenv()
+    load_dotenv(env_path)
+
+    # Authenticate with Google Cloud
+    credentials = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    if credentials:
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials
+
+    config = {key: os.getenv(var) for key, var in REQUIRED_ENV_VARS.items()}
+
+    if debug:
+        print(f"Debug: env_path = {env_path}")
+        print(f"Debug: env_path exists = {env_path.exists()}")
+        for key, value in config.items():
+            shown = "*" * len(value) if key == "PASSWORD" and value else value
+            print(f"Debug: {key} = {shown}")
+
+    # === Validar que las variables de entorno se cargaron correctamente ===
+    missing_vars = [REQUIRED_ENV_VARS[key] for key, value in config.items() if value is None]
+
+    if missing_vars:
+        print(f"Error: Faltan las siguientes variables de entorno en {env_path}:")
+        for var in missing_vars:
+            print(f" - {var}")
+        exit(1)
+
+    # === Rutas de insumos ===
+    inputs_path = config["INPUTS_PATH"]
+    config["POLYGON_PATH"] = os.path.join(inputs_path, "area_estudio", "gfw", "area_estudio.geojson")
+    config["VEREDAS_PATH"] = os.path.join(inputs_path, "area_estudio", "gfw", "veredas_cund_2024/veredas_cund_2024.shp")
+    config["SECCIONES_PATH"] = os.path.join(inputs_path, "area_estudio", "gfw", "panel_secciones_rurales", "V3/panel_SDP_29092025-v3.shp")
+    config["HEADER_IMG1_PATH"] = os.path.join(inputs_path, "area_estudio", "asi_4.png")
+    config["HEADER_IMG2_PATH"] = os.path.join(inputs_path, "area_estudio", "bogota_4.png")
+    config["FOOTER_IMG_PATH"] = os.path.join(inputs_path, "area_estudio", "secre_5.png")
+    return config
+
+
+def main(argv=None):
+    # === Argumentos de ejecución ===
+    args = parse_args(argv)
+
+    # Suppress urllib3 SSL warning
+    warnings.filterwarnings("ignore", message="urllib3 v2 only supports OpenSSL 1.1.1+")
+
+    config = load_config(debug=args.debug)
+    if args.cassettes:
+        os.environ["SIMBYP_CASSETTE_MODE"] = args.cassettes
+    asyncio.run(run_pipeline(args, config))
+
+
+async def run_pipeline(args, config):
+    """
+    Ejecuta el pipeline como un grafo de tareas asyncio: los pasos de I/O independientes
+    (GCS, autenticación GFW, capas de referencia, mapas Sentinel, subidas) se solapan y
+    los pasos de cómputo corren en hilos del executor (`run_stage`), de modo que la
+    duración total se acerca a la del camino crítico.
+    """
+    USERNAME = config["USERNAME"]
+    PASSWORD = config["PASSWORD"]
+    ALIAS = config["ALIAS"]
+    EMAIL = config["EMAIL"]
+    ORG = config["ORG"]
+    GOOGLE_CLOUD_PROJECT = config["GOOGLE_CLOUD_PROJECT"]
+    POLYGON_PATH = config["POLYGON_PATH"]
+    VEREDAS_PATH = config["VEREDAS_PATH"]
+    SECCIONES_PATH = config["SECCIONES_PATH"]
+    HEADER_IMG1_PATH = config["HEADER_IMG1_PATH"]
+    HEADER_IMG2_PATH = config["HEADER_IMG2_PATH"]
+    FOOTER_IMG_PATH = config["FOOTER_IMG_PATH"]
+
+    # === Importar funciones del pipeline ===
+    import geopandas as gpd
+    from src.download_gfw_data import (
+        GFWClient,
+        get_start_end_dates,
+        save_to_csv,
+        csv_to_geodataframe,
+        CSV_CHUNK_ROWS,
+    )
+    from src.aoi import prepare_aoi
+    from src.spatial_store import save_flatgeobuf, save_partitioned_geoparquet
+    from src.process_gfw_alerts import (
+        process_alerts,
+        load_reference_layers,
+        filter_confidence,
+        cluster_alerts_by_section,
+        get_cluster_bboxes,
+    )
+    from src.alert_cube import build_alert_cube, check_cube_total, save_alert_cube, summary_from_cube
+    from src.hotspots import build_hotspot_index, check_hotspot_total, save_hotspot_index
+    from src.cluster_history import HISTORY_FILENAME, update_cluster_history
+    from src.create_final_json import build_report_json
+    from src.maps import plot_alerts_interactive, alerts_map_view
+    from src.sentinel_jobs import build_cluster_jobs, run_cluster_job, fetch_job_artifacts
+    from src.work_queue import DONE, FAILED, open_queue, run_worker, wait_drained, default_worker_id
+    from reporte.render_report import render
+    from src.instrumentation import start_metrics, stage, run_stage
+    from src.gcs_io import download_gcs_to_local, upload_file_to_gcs, update_gcs_file, IncrementalUploader
+
+    LAZY_MAPS = args.modo_reporte == "lazy"
     TRIMESTRE = args.trimestre
     ANIO = args.anio
     START_DATE, END_DATE = get_start_end_dates(TRIMESTRE, ANIO)
@@ -104,94 +165,240 @@ if __name__ == "__main__":
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
     SENTINEL_IMAGES_PATH = os.path.join(OUTPUT_FOLDER, "sentinel_imagenes")
     os.makedirs(SENTINEL_IMAGES_PATH, exist_ok=True)
+    # En modo "compartido" cada mapa es una página mínima que usa <salida>/assets
+    MAP_ASSETS_DIR = os.path.join(OUTPUT_FOLDER, "assets") if args.modo_reporte == "compartido" else None
 
-    # === Descargar imágenes de encabezado y pie de página desde GCS ===
-    from google.cloud import storage
-
-    def download_gcs_to_local(gcs_path, local_path):
-        _, rest = gcs_path.split("gs://", 1)
-        bucket_name, blob_path = rest.split("/", 1)
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        blob.download_to_filename(local_path)
+    # === Métricas por etapa (y perfiles cProfile con --perfilar) ===
+    metrics = start_metrics(
+        profile_dir=os.path.join(OUTPUT_FOLDER, "perfiles") if args.perfilar else None
+    )
+    METRICS_PATH = os.path.join(OUTPUT_FOLDER, "metricas_pipeline.json")
 
+    # === Rutas de archivos (locales) ===
     local_header1 = os.path.join(OUTPUT_FOLDER, "asi_4.png")
-    download_gcs_to_local(HEADER_IMG1_PATH, local_header1)
     local_header2 = os.path.join(OUTPUT_FOLDER, "bogota_4.png")
-    download_gcs_to_local(HEADER_IMG2_PATH, local_header2)
     local_footer = os.path.join(OUTPUT_FOLDER, "secre_5.png")
-    download_gcs_to_local(FOOTER_IMG_PATH, local_footer)
-
-    # === Rutas de archivos (locales) ===
     CSV_OUTPUT_PATH = os.path.join(OUTPUT_FOLDER, f"alertas_gfw_{fecha_rango}.csv")
-    GEOJSON_OUTPUT_PATH = os.path.join(OUTPUT_FOLDER, f"alertas_gfw_{fecha_rango}.geojson")
-    DF_ANALYSIS_PATH = os.path.join(OUTPUT_FOLDER, f"alertas_gfw_analisis_{fecha_rango}.geojson")
+    # Salidas con índice espacial: FlatGeobuf (alertas) y GeoParquet particionado por municipio (análisis)
+    ALERTS_FGB_PATH = os.path.join(OUTPUT_FOLDER, f"alertas_gfw_{fecha_rango}.fgb")
+    DF_ANALYSIS_PATH = os.path.join(OUTPUT_FOLDER, f"alertas_gfw_analisis_{fecha_rango}")
+    CUBE_PATH = os.path.join(OUTPUT_FOLDER, f"cubo_alertas_{fecha_rango}.parquet")
+    HOTSPOTS_PATH = os.path.join(OUTPUT_FOLDER, f"hotspots_alertas_{fecha_rango}.parquet")
+    TRACKING_PATH = os.path.join(OUTPUT_FOLDER, f"seguimiento_clusters_{fecha_rango}.csv")
+    # Historial de clusters de todos los periodos (compartido entre corridas)
+    HISTORY_PATH = os.path.join("temp_data", HISTORY_FILENAME)
+    HISTORY_GCS_PATH = f"gs://reportes-simbyp/reportes_gfw/{HISTORY_FILENAME}"
     MAP_OUTPUT_PATH = os.path.join(OUTPUT_FOLDER, f"alertas_mapa_{fecha_rango}.html")
     JSON_FINAL_PATH = os.path.join(OUTPUT_FOLDER, "reporte_final.json")
     TPL_PATH = Path("gfw_alerts/reporte/report_template.html")
     OUT_PATH = Path(OUTPUT_FOLDER) / "reporte_final.html"
     DATA_PATH = Path(JSON_FINAL_PATH)
 
+    # === Subidas a GCS a medida que se terminan los artefactos ===
+    gcs_prefix = f"reportes_gfw/{fecha_rango}"
+    uploader = IncrementalUploader(OUTPUT_FOLDER, "reportes-simbyp", gcs_prefix).start()
+
+    # === Descargar imágenes de encabezado y pie de página desde GCS ===
+    async def download_headers():
+        with stage("insumos_gcs", profile=False):
+            await asyncio.gather(*(
+                asyncio.to_thread(download_gcs_to_local, gcs_path, local_path)
+                for gcs_path, local_path in (
+                    (HEADER_IMG1_PATH, local_header1),
+                    (HEADER_IMG2_PATH, local_header2),
+                    (FOOTER_IMG_PATH, local_footer),
+                )
+            ))
+
+    headers_task = asyncio.create_task(download_headers())
+
     # === Autenticación ===
     print("🔐 Autenticando en GFW...")
-    token = authenticate_gfw(username=USERNAME, password=PASSWORD)
-    api_key = get_api_key(token, alias=ALIAS, email=EMAIL, organization=ORG)
+    # Token y API key se reutilizan desde la caché local mientras no expiren
+    gfw = GFWClient(username=USERNAME, password=PASSWORD, alias=ALIAS, email=EMAIL, organization=ORG)
+    auth_task = asyncio.create_task(run_stage("autenticacion", gfw.get_api_key, rows_out=None))
 
     # === Descarga y procesamiento de alertas ===
-    print("📦 Extrayendo polígono del archivo...")
-    polygon = extract_polygon_from_file(POLYGON_PATH)
-
+    print("📦 Preparando área de interés...")
+    # Geometría simplificada (y ampliada) para GFW; la exacta sirve para recortar después
+    aoi_payload, aoi_geom = await run_stage("aoi", prepare_aoi, POLYGON_PATH, rows_out=None)
+
+    # Las capas de referencia se leen (recortadas al AOI) mientras se descargan las alertas
+    print("🗂️ Cargando capas de referencia...")
+    aoi_bbox = gpd.GeoSeries([aoi_geom], crs="EPSG:4326")
+    layers_task = asyncio.create_task(run_stage(
+        "capas_referencia", load_reference_layers, VEREDAS_PATH, SECCIONES_PATH, bbox=aoi_bbox,
+        rows_out=lambda layers: len(layers[1])
+    ))
+
+    await auth_task
     print("⬇️ Descargando alertas...")
-    data = download_alerts(api_key, START_DATE, END_DATE, polygon)
-    save_to_csv(data, CSV_OUTPUT_PATH)
+
+    def download():
+        data = gfw.download_alerts(START_DATE, END_DATE, aoi_payload)
+        save_to_csv(data, CSV_OUTPUT_PATH)
+
+    await run_stage("descarga", download, rows_out=None)
+    uploader.submit(CSV_OUTPUT_PATH)
 
     print("📄 Convirtiendo CSV a GeoDataFrame...")
-    gdf_alertas = csv_to_geodataframe(CSV_OUTPUT_PATH)
-    save_geodataframe_to_geojson(gdf_alertas, GEOJSON_OUTPUT_PATH)
 
-    print("📊 Resumiendo niveles de alerta...")
-    summary = summarize_alert_confidences(gdf_alertas)
+    def load_alerts():
+        # En bloques: cada uno se recorta al AOI antes de leer el siguiente
+        gdf = csv_to_geodataframe(CSV_OUTPUT_PATH, chunksize=CSV_CHUNK_ROWS, aoi=aoi_geom)
+        save_flatgeobuf(gdf, ALERTS_FGB_PATH)
+        return gdf
+
+    gdf_alertas = await run_stage("carga_alertas", load_alerts)
+    uploader.submit(ALERTS_FGB_PATH)
+
+    # === Crear mapa general de alertas (solo depende de las alertas) ===
+    async def general_map():
+        print("🗺️ Creando visualización general...")
+        if LAZY_MAPS:
+            return await run_stage("mapa_alertas", alerts_map_view, gdf_alertas, aoi_payload,
+                                   rows_in=len(gdf_alertas), rows_out=None)
+        await run_stage("mapa_alertas", plot_alerts_interactive, gdf_alertas, POLYGON_PATH, MAP_OUTPUT_PATH,
+                        assets_dir=MAP_ASSETS_DIR, rows_in=len(gdf_alertas), rows_out=None)
+        uploader.submit(MAP_OUTPUT_PATH)
+        return None
+
+    general_map_task = asyncio.create_task(general_map())
+
+    # === Índice de hotspots: solo usa posición, fecha y confianza de las alertas (sin cruzar,
+    # así cada alerta cuenta una vez) y corre mientras se enriquecen ===
+    async def hotspots_index():
+        print("🔥 Indexando densidad de alertas en grilla jerárquica...")
+
+        def build():
+            hotspots = build_hotspot_index(gdf_alertas)
+            check_hotspot_total(hotspots, len(gdf_alertas))
+            save_hotspot_index(hotspots, HOTSPOTS_PATH)
+            return hotspots
+
+        await run_stage("hotspots", build, rows_in=len(gdf_alertas))
+        uploader.submit(HOTSPOTS_PATH)
+
+    hotspots_task = asyncio.create_task(hotspots_index())
 
     print("🔍 Enriqueciendo alertas con información territorial...")
-    alerts_gdf = process_alerts(GEOJSON_OUTPUT_PATH, VEREDAS_PATH, SECCIONES_PATH)
-    alerts_with_clusters = cluster_alerts_by_section(alerts_gdf)
-    alerts_with_clusters.to_file(DF_ANALYSIS_PATH)
-    clusters_bboxes = get_cluster_bboxes(alerts_with_clusters)
+    veredas, secciones = await layers_task
+    alerts_all = await run_stage("enriquecimiento", process_alerts, gdf_alertas, veredas, secciones,
+                                 confidence=None, workers=args.procesos,
+                                 rows_in=len(gdf_alertas))
+
+    # === Cubo y clusters dependen solo de las alertas enriquecidas ===
+    async def cube_summary():
+        print("📊 Construyendo cubo de alertas y resumiendo niveles...")
+
+        def build():
+            cube = build_alert_cube(alerts_all)
+            check_cube_total(cube, len(gdf_alertas))
+            save_alert_cube(cube, CUBE_PATH)
+            return cube
+
+        cube = await run_stage("cubo", build, rows_in=len(alerts_all))
+        uploader.submit(CUBE_PATH)
+        return summary_from_cube(cube)
+
+    cube_task = asyncio.create_task(cube_summary())
+
+    alerts_gdf = filter_confidence(alerts_all, "highest")
+
+    def clustering():
+        clustered = cluster_alerts_by_section(alerts_gdf, workers=args.procesos)
+        save_partitioned_geoparquet(clustered, DF_ANALYSIS_PATH)
+        return clustered, get_cluster_bboxes(clustered)
+
+    alerts_with_clusters, clusters_bboxes = await run_stage(
+        "clustering", clustering, rows_in=len(alerts_gdf), rows_out=lambda result: len(result[1])
+    )
+    uploader.submit(DF_ANALYSIS_PATH)
+
+    # === Seguimiento de clusters entre periodos (id estable, nuevo / creciente / recurrente) ===
+    def cluster_tracking():
+        print("🧭 Relacionando clusters con periodos anteriores...")
+        # El historial es compartido entre corridas: se sube solo si nadie lo cambió desde la descarga
+        tracking = update_gcs_file(
+            HISTORY_GCS_PATH, HISTORY_PATH,
+            lambda: update_cluster_history(alerts_with_clusters, HISTORY_PATH, TRIMESTRE, ANIO),
+        )
+        tracking.to_csv(TRACKING_PATH)
+        return tracking
+
+    tracking_task = asyncio.create_task(
+        run_stage("historial", cluster_tracking, rows_in=len(clusters_bboxes))
+    )
 
     # === Crear mapas Sentinel interactivos ===
     print("🛰️ Generando mapas Sentinel-2 interactivos...")
-    sentinel_results = []
-    for _, row in clusters_bboxes.iterrows():
-        cluster_id = int(row["cluster_id"])
-        output_path = os.path.join(SENTINEL_IMAGES_PATH, f"sentinel_cluster_{cluster_id}.html")
-
-        map_path = plot_sentinel_cluster_interactive(
-            cluster_geom=row.geometry,
-            cluster_id=cluster_id,
-            start_date=START_DATE,
-            end_date=END_DATE,
-            output_path=output_path, 
-            alerts_gdf=gdf_alertas,
-            project=GOOGLE_CLOUD_PROJECT
-        )
 
-        if map_path and os.path.exists(output_path):
-            print(f"✅ Mapa generado para cluster {cluster_id}: {output_path}")
-            sentinel_results.append({
-                "cluster_id": cluster_id,
-                "map_html": map_path
-            })
+    # Un trabajo autocontenido por cluster (geometría, fechas, alertas 'highest' del cluster)
+    sentinel_jobs = build_cluster_jobs(
+        clusters_bboxes, gdf_alertas, START_DATE, END_DATE, SENTINEL_IMAGES_PATH,
+        mode=args.modo_reporte, project=GOOGLE_CLOUD_PROJECT, assets_dir=MAP_ASSETS_DIR,
+        gcs_root=f"gs://reportes-simbyp/{gcs_prefix}" if args.cola_sentinel else None,
+        local_root=OUTPUT_FOLDER
+    )
+
+    # Los clusters son independientes: varias solicitudes a Earth Engine en vuelo a la vez
+    sentinel_slots = asyncio.Semaphore(SENTINEL_CONCURRENCY)
+
+    async def sentinel_task(payload):
+        async with sentinel_slots:
+            result = await asyncio.to_thread(run_cluster_job, payload)
+        if result:
+            uploader.submit(result.get("map_html"), result.get("miniatura"))
+        return result
+
+    async def sentinel_queue():
+        # Trabajos en una cola durable: otros nodos (sentinel_worker.py) pueden consumirlos;
+        # este proceso también lo hace y termina cuando la cola se vacía
+        queue = open_queue(args.cola_sentinel, f"sentinel_{fecha_rango}")
+        # Los fallidos se reintentan; en modo lazy tampoco se reutilizan resultados de otra
+        # corrida, porque las URLs de teselas de Earth Engine expiran
+        requeue = (FAILED, DONE) if LAZY_MAPS else (FAILED,)
+        new_jobs = await asyncio.to_thread(queue.publish, sentinel_jobs, requeue)
+        print(f"📬 {new_jobs} trabajos nuevos o reencolados en la cola {queue.name} ({len(sentinel_jobs)} clusters)")
+        await asyncio.gather(*(
+            asyncio.to_thread(run_worker, queue, run_cluster_job, worker_id=f"{default_worker_id()}-{i}")
+            for i in range(SENTINEL_CONCURRENCY)
+        ))
+        await wait_drained(queue)
+
+        done = await asyncio.to_thread(queue.results, list(sentinel_jobs))
+        states = await asyncio.to_thread(queue.states)
+        results = []
+        for job_id, payload in sentinel_jobs.items():
+            result = done.get(job_id)
+            if result is None:
+                reason = "trabajo fallido" if states.get(job_id) == FAILED else "sin imágenes Sentinel-2"
+                print(f"⚠️ Cluster {payload['cluster_id']}: sin mapa ({reason})")
+            if result:
+                # Los archivos hechos en otros nodos ya están en GCS: solo se traen para el render
+                local_path = await asyncio.to_thread(fetch_job_artifacts, payload, result)
+                uploader.mark_uploaded(local_path)
+            results.append(result)
+        return results
+
+    with stage("mapas_sentinel", rows_in=len(clusters_bboxes), profile=False) as st:
+        if args.cola_sentinel:
+            results = await sentinel_queue()
         else:
-            print(f"❌ Mapa NO generado para cluster {cluster_id}: {output_path} (map_path: {map_path})")
+            results = await asyncio.gather(*(sentinel_task(payload) for payload in sentinel_jobs.values()))
+        sentinel_results = [result for result in results if result]
+        st["filas_salida"] = len(sentinel_results)
 
-    # === Crear mapa general de alertas ===
-    print("🗺️ Creando visualización general...")
-    plot_alerts_interactive(gdf_alertas, POLYGON_PATH, MAP_OUTPUT_PATH)
+    summary = await cube_task
+    tracking = await tracking_task
+    uploader.submit(TRACKING_PATH)
+    vista_general = await general_map_task
+    await asyncio.gather(hotspots_task, headers_task)
 
     # === Construir JSON consolidado ===
     print("📝 Construyendo JSON final...")
-    report_data = build_report_json(
+    report_data = await run_stage(
+        "json", build_report_json,
         summary,
         alerts_with_clusters,
         trimestre=TRIMESTRE,
@@ -199,30 +406,30 @@ if __name__ == "__main__":
         ruta_header_img1=local_header1,
         ruta_header_img2=local_header2,
         ruta_footer_img=local_footer,
-        ruta_mapa_alertas=MAP_OUTPUT_PATH,
+        ruta_mapa_alertas=None if LAZY_MAPS else MAP_OUTPUT_PATH,
         output_path=JSON_FINAL_PATH,
-        sentinel_results=sentinel_results
+        sentinel_results=sentinel_results,
+        render_mode="lazy" if LAZY_MAPS else "iframe",
+        vista_general=vista_general,
+        seguimiento=tracking,
+        rows_in=len(alerts_with_clusters),
+        rows_out=lambda data: len(data["SECCIONES_MUY_ALTO"])
     )
 
     # === Renderizar reporte HTML ===
     print("📝 Renderizando reporte HTML...")
-    render(TPL_PATH, DATA_PATH, OUT_PATH)
-
-    # === Subir carpeta completa a GCS ===
-    def upload_folder_to_gcs(local_folder, gcs_bucket, gcs_prefix):
-        client = storage.Client()
-        bucket = client.bucket(gcs_bucket)
-        for root, dirs, files in os.walk(local_folder):
-            for file in files:
-                local_path = os.path.join(root, file)
-                relative_path = os.path.relpath(local_path, local_folder)
-                gcs_path = os.path.join(gcs_prefix, relative_path).replace("\\", "/")
-                blob = bucket.blob(gcs_path)
-                blob.upload_from_filename(local_path)
-                print(f"✅ Subido {local_path} a gs://{gcs_bucket}/{gcs_path}")
+    await run_stage("render", render, TPL_PATH, DATA_PATH, OUT_PATH, rows_out=None)
 
+    # === Subir lo que falte de la carpeta y esperar las subidas pendientes ===
     print("☁️ Subiendo outputs a GCS...")
-    upload_folder_to_gcs(OUTPUT_FOLDER, "reportes-simbyp", f"reportes_gfw/{fecha_rango}")
+    await uploader.finish(exclude=[METRICS_PATH])
+
+    # Las métricas se escriben al final (incluyen la subida) y se suben aparte
+    metrics.save(METRICS_PATH)
+    upload_file_to_gcs(METRICS_PATH, f"gs://reportes-simbyp/{gcs_prefix}/metricas_pipeline.json")
 
     print("✅ Proceso completo. Archivos guardados en:")
     print(f"   - GCS: gs://reportes-simbyp/reportes_gfw/{fecha_rango}/")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+from pathlib import Path
+import warnings
+
+# Servicio local de reportes a pedido (ver `reporte/report_service.py`).
+# Arma el reporte de cualquier periodo ya procesado por main.py, completo o restringido a
+# un municipio, vereda, bbox o polígono, sin volver a correr el pipeline.
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de reportes de alertas a pedido")
+    parser.add_argument("--raiz", default=None, metavar="RUTA",
+                        help="Carpeta con un subdirectorio por periodo, local o gs:// "
+                             "(por defecto gs://reportes-simbyp/reportes_gfw)")
+    parser.add_argument("--host", default="127.0.0.1", help="Interfaz en la que escucha")
+    parser.add_argument("--puerto", type=int, default=8000, help="Puerto HTTP")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    warnings.filterwarnings("ignore", message="urllib3 v2 only supports OpenSSL 1.1.1+")
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    load_dotenv(Path(__file__).parent.parent / ".env")
+
+    from reporte.report_service import DEFAULT_ROOT, serve
+
+    serve(args.raiz or DEFAULT_ROOT, host=args.host, port=args.puerto)
+
+
+if __name__ == "__main__":
+    main()
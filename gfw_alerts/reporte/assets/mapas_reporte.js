@@ -0,0 +1,129 @@
+/*
+ * Mapas del reporte SIMBYP en una sola página.
+ *
+ * Las vistas (mapa general y un mapa por cluster) llegan como datos en
+ * <script type="application/json" id="vistas-mapas">. Cada contenedor
+ * <div class="mapa-lazy" data-vista="..."> crea su mapa Leaflet solo cuando
+ * entra en pantalla y lo destruye al salir, de modo que la memoria no crece
+ * con el número de clusters. Mientras tanto (o sin JavaScript / sin red)
+ * se muestra la miniatura estática que trae el contenedor.
+ */
+(function () {
+  "use strict";
+
+  var MARGEN = "300px 0px";
+  var datos = document.getElementById("vistas-mapas");
+  if (!datos || !window.L) {
+    return;  // sin datos o sin Leaflet: quedan las miniaturas
+  }
+  var vistas = JSON.parse(datos.textContent);
+  var activos = {};
+
+  function popupAlerta(vista, p) {
+    var texto = function (i) {
+      var codigo = p[2 + i];
+      return codigo >= 0 ? vista.niveles[codigo] : "N/A";
+    };
+    var html = "<b>Alerta</b><br>📍 Lat: " + p[0].toFixed(5) + ", Lon: " + p[1].toFixed(5);
+    for (var i = 0; i < vista.sistemas.length; i++) {
+      html += "<br>" + vista.sistemas[i] + ": " + texto(i);
+    }
+    return html;
+  }
+
+  function agregarLeyenda(mapa, vista) {
+    if (!vista.leyenda) {
+      return;
+    }
+    var control = L.control({ position: "bottomleft" });
+    control.onAdd = function () {
+      var div = L.DomUtil.create("div", "mapa-leyenda");
+      var html = "<b>Leyenda</b>";
+      vista.leyenda.forEach(function (item) {
+        html += '<div><i class="mapa-leyenda__' + item.forma + '" style="--color:' + item.color + '"></i>' + item.texto + "</div>";
+      });
+      div.innerHTML = html;
+      return div;
+    };
+    control.addTo(mapa);
+  }
+
+  function crearMapa(contenedor, vista) {
+    var lienzo = L.DomUtil.create("div", "mapa-lazy__lienzo", contenedor);
+    var mapa = L.map(lienzo, { preferCanvas: true });
+    L.tileLayer(vista.base.url, { attribution: vista.base.attr, maxZoom: 19 }).addTo(mapa);
+    if (vista.teselas) {
+      L.tileLayer(vista.teselas, { attribution: "Sentinel-2 EE", maxZoom: 19 }).addTo(mapa);
+    }
+    if (vista.area) {
+      L.geoJSON(vista.area, {
+        style: { color: "blue", weight: 1, fillColor: "lightblue", fillOpacity: 0.2 }
+      }).addTo(mapa);
+    }
+    if (vista.contorno) {
+      L.geoJSON(vista.contorno, { style: { color: "red", weight: 2, fillOpacity: 0 } }).addTo(mapa);
+    }
+
+    var conNiveles = Boolean(vista.sistemas);
+    var puntos = vista.puntos || [];
+    for (var i = 0; i < puntos.length; i++) {
+      var p = puntos[i];
+      var muyAlto = !conNiveles || vista.niveles[p[2]] === "Muy alto";
+      var marcador = L.circleMarker([p[0], p[1]], {
+        radius: conNiveles ? 4 : 5,
+        color: muyAlto ? "#FF0000" : "orange",
+        fillColor: muyAlto ? "#FF0000" : "orange",
+        fill: true,
+        fillOpacity: conNiveles ? 0.7 : 0.85
+      });
+      if (conNiveles) {
+        // El contenido del popup se arma al abrirlo
+        marcador.bindPopup(popupAlerta.bind(null, vista, p));
+      }
+      marcador.addTo(mapa);
+    }
+
+    agregarLeyenda(mapa, vista);
+    mapa.fitBounds(vista.limites);
+    contenedor.classList.add("mapa-lazy--activo");
+    return { mapa: mapa, lienzo: lienzo };
+  }
+
+  function destruirMapa(contenedor, id) {
+    var activo = activos[id];
+    if (!activo) {
+      return;
+    }
+    activo.mapa.remove();
+    contenedor.removeChild(activo.lienzo);
+    contenedor.classList.remove("mapa-lazy--activo");
+    delete activos[id];
+  }
+
+  var contenedores = document.querySelectorAll(".mapa-lazy[data-vista]");
+
+  function alternar(contenedor, visible) {
+    var id = contenedor.getAttribute("data-vista");
+    if (!vistas[id]) {
+      return;
+    }
+    if (visible && !activos[id]) {
+      activos[id] = crearMapa(contenedor, vistas[id]);
+    } else if (!visible) {
+      destruirMapa(contenedor, id);
+    }
+  }
+
+  if (!("IntersectionObserver" in window)) {
+    Array.prototype.forEach.call(contenedores, function (c) { alternar(c, true); });
+    return;
+  }
+
+  var observador = new IntersectionObserver(function (entradas) {
+    entradas.forEach(function (entrada) {
+      alternar(entrada.target, entrada.isIntersecting);
+    });
+  }, { rootMargin: MARGEN });
+
+  Array.prototype.forEach.call(contenedores, function (c) { observador.observe(c); });
+})();
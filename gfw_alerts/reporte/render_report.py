@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import json, re
 from pathlib import Path
-from google.cloud import storage
 
-SECTION_PAT = re.compile(r"{{#(\w+)}}(.*?){{/\1}}", re.DOTALL)
+from src.gcs_io import read_gcs_bytes, write_gcs_bytes
+from src.map_assets import ASSETS_DIR, write_map_assets
+
+# {{#LISTA}}...{{/LISTA}} repite el bloque por elemento; {{^LISTA}}...{{/LISTA}} lo muestra si está vacía
+SECTION_PAT = re.compile(r"{{([#^])(\w+)}}(.*?){{/\2}}", re.DOTALL)
 TOKEN_PAT   = re.compile(r"{{\s*([\w\.]+)\s*}}")
 
 def build_very_high_sections(sections):
@@ -39,32 +42,36 @@ def build_header(header_dict):
 def _read_text(path):
     p = str(path)
     if p.startswith("gs://"):
-        # parse gs://bucket/path/to/blob
-        _, rest = p.split("gs://", 1)
-        bucket_name, blob_path = rest.split("/", 1)
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        return blob.download_as_bytes().decode("utf-8")
+        return read_gcs_bytes(p).decode("utf-8")
     else:
         return Path(p).read_text(encoding="utf-8")
 
 def _write_text(path, content):
     p = str(path)
     if p.startswith("gs://"):
-        _, rest = p.split("gs://", 1)
-        bucket_name, blob_path = rest.split("/", 1)
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        blob.upload_from_string(content, content_type="text/html; charset=utf-8")
+        write_gcs_bytes(p, content.encode("utf-8"), content_type="text/html; charset=utf-8")
     else:
         Path(p).write_text(content, encoding="utf-8")
 
+def copy_report_assets(out_path, assets_dir: Path = ASSETS_DIR, folder: str = "assets"):
+    """
+    Copia los recursos compartidos de los mapas a `<carpeta del reporte>/assets/`
+    (local o gs://). Cada reporte los descarga una sola vez, sin importar cuántos mapas tenga.
+    """
+    out = str(out_path)
+    if out.startswith("gs://"):
+        target = f"{out.rsplit('/', 1)[0]}/{folder}"
+    else:
+        target = Path(out).parent / folder
+    write_map_assets(target, source_dir=assets_dir)
+
 def render(template_path: Path, data_path: Path, out_path: Path):
     template = _read_text(template_path)
     data = json.loads(_read_text(data_path))
 
+    if data.get("MAPAS_LAZY"):
+        copy_report_assets(out_path)
+
     # Convierte el dict HEADER a HTML antes de renderizar
     data["HEADER"] = build_header(data.get("HEADER"))
 
@@ -74,24 +81,52 @@ def render(template_path: Path, data_path: Path, out_path: Path):
     _write_text(out_path, html)
     return out_path
 
+def compile_template(tpl: str) -> list:
+    """
+    Analiza la plantilla una sola vez: lista de nodos (texto, ("token", clave) o
+    ("seccion", tipo, clave, nodos internos)) que `render_compiled` recorre sin regex.
+    """
+    nodes = []
+    pos = 0
+    for m in SECTION_PAT.finditer(tpl):
+        nodes.extend(_compile_tokens(tpl[pos:m.start()]))
+        nodes.append(("seccion", m.group(1), m.group(2), compile_template(m.group(3))))
+        pos = m.end()
+    nodes.extend(_compile_tokens(tpl[pos:]))
+    return nodes
+
+def _compile_tokens(text: str) -> list:
+    nodes = []
+    pos = 0
+    for m in TOKEN_PAT.finditer(text):
+        if m.start() > pos:
+            nodes.append(text[pos:m.start()])
+        nodes.append(("token", m.group(1)))
+        pos = m.end()
+    if pos < len(text):
+        nodes.append(text[pos:])
+    return nodes
+
+def render_compiled(nodes: list, root: dict) -> str:
+    def _render_nodes(nodes, ctx, out):
+        for node in nodes:
+            if isinstance(node, str):
+                out.append(node)
+            elif node[0] == "token":
+                out.append(str(ctx.get(node[1], root.get(node[1], ""))))
+            else:
+                _, kind, key, inner = node
+                arr = ctx.get(key, [])
+                if kind == "^":
+                    if not arr:
+                        _render_nodes(inner, ctx, out)
+                elif isinstance(arr, list):
+                    for item in arr:
+                        _render_nodes(inner, {**ctx, **(item if isinstance(item, dict) else {".": item})}, out)
+
+    out = []
+    _render_nodes(nodes, root, out)
+    return "".join(out)
+
 def render_template(tpl: str, root: dict) -> str:
-    def _render_block(block: str, ctx: dict) -> str:
-        def _section(m):
-            key, inner = m.group(1), m.group(2)
-            arr = ctx.get(key, [])
-            if not isinstance(arr, list):
-                return ""
-            out = []
-            for item in arr:
-                local = {**ctx, **(item if isinstance(item, dict) else {".": item})}
-                out.append(_render_block(inner, local))
-            return "".join(out)
-
-        out = SECTION_PAT.sub(_section, block)
-
-        def _token(m):
-            k = m.group(1)
-            return str(ctx.get(k, root.get(k, "")))
-        return TOKEN_PAT.sub(_token, out)
-
-    return _render_block(tpl, root)
+    return render_compiled(compile_template(tpl), root)
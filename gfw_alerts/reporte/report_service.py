@@ -0,0 +1,556 @@
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from reporte.render_report import _read_text, build_header, compile_template, render_compiled
+
+# Servicio HTTP que arma reportes a pedido (cualquier periodo, municipio, vereda, bbox o
+# polígono) a partir de lo que el pipeline ya dejó en cada carpeta de periodo: reporte_final.json
+# (clusters, mapas, seguimiento), el cubo de alertas, las alertas en FlatGeobuf, el GeoParquet
+# particionado de alertas con cluster y los mapas Sentinel-2. No consulta GFW ni Earth Engine.
+
+# Raíz de los periodos (una carpeta <trimestre>_trim_<año> por periodo, local o gs://)
+DEFAULT_ROOT = "gs://reportes-simbyp/reportes_gfw"
+TEMPLATE_PATH = Path(__file__).resolve().parent / "report_template.html"
+PERIOD_PAT = re.compile(r"^(I|II|III|IV)_trim_\d{4}$")
+
+# Artefactos de la carpeta del periodo (mismos nombres que en main.py)
+CUBE_NAME = "cubo_alertas_{periodo}.parquet"
+ALERTS_FGB_NAME = "alertas_gfw_{periodo}.fgb"
+CLUSTER_STORE_NAME = "alertas_gfw_analisis_{periodo}"
+TRACKING_NAME = "seguimiento_clusters_{periodo}.csv"
+ALERTS_MAP_NAME = "alertas_mapa_{periodo}.html"
+HEADER_NAMES = ("asi_4.png", "bogota_4.png", "secre_5.png")
+
+# Tamaños de las cachés LRU
+TEMPLATE_CACHE_SIZE = 4
+PERIOD_CACHE_SIZE = 8
+REPORT_CACHE_SIZE = 64
+ARTIFACT_CACHE_BYTES = 256 * 1024 * 1024
+# Los datos de un periodo se vuelven a leer pasado este tiempo (una nueva corrida los reemplaza)
+PERIOD_TTL_SECONDS = 300
+
+
+class LRUCache:
+    """
+    Caché LRU segura entre hilos. Con `weigh` el límite es la suma de los pesos
+    (p. ej. bytes) en lugar del número de entradas.
+    """
+
+    def __init__(self, maxsize: int, weigh=None):
+        self.maxsize = maxsize
+        self.weigh = weigh or (lambda value: 1)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        weight = self.weigh(value)
+        if weight > self.maxsize:
+            return value
+        with self._lock:
+            if key in self._items:
+                self.size -= self.weigh(self._items.pop(key))
+            self._items[key] = value
+            self.size += weight
+            while self.size > self.maxsize:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= self.weigh(evicted)
+        return value
+
+    def get_or_create(self, key, factory):
+        """
+        Valor en caché o `factory()`. Dos hilos con la misma clave ausente pueden
+        calcularlo a la vez; se guarda el último.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.put(key, factory())
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entradas": len(self._items), "tamano": self.size, "aciertos": self.hits, "fallos": self.misses}
+
+
+_MISSING = object()
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _match_name(values, name: str):
+    """
+    Valor de `values` igual a `name` sin distinguir mayúsculas (None si no está).
+    """
+    wanted = name.strip().casefold()
+    for value in values:
+        if isinstance(value, str) and value.casefold() == wanted:
+            return value
+    return None
+
+
+def parse_aoi(bbox: str = None, geojson: str = None):
+    """
+    AOI de una consulta, en EPSG:4326.
+
+    Parámetros:
+    - bbox (str, opcional): "minx,miny,maxx,maxy".
+    - geojson (str, opcional): Geometría GeoJSON (o Feature / FeatureCollection).
+
+    Retorna:
+    - Geometría shapely (la intersección de ambos si se indican los dos) o None sin ninguno.
+      Un bbox o GeoJSON inválido, o un AOI sin área, es un ValueError.
+    """
+    import shapely
+    from shapely.errors import ShapelyError
+    from shapely.geometry import box, shape
+
+    geoms = []
+    if bbox:
+        try:
+            minx, miny, maxx, maxy = (float(value) for value in bbox.split(","))
+        except ValueError:
+            raise ValueError(f"bbox inválido: {bbox}. Usa minx,miny,maxx,maxy (EPSG:4326).") from None
+        if not (minx < maxx and miny < maxy):
+            raise ValueError(f"bbox inválido: {bbox}. Se espera minx < maxx y miny < maxy.")
+        geoms.append(box(minx, miny, maxx, maxy))
+    if geojson:
+        try:
+            obj = json.loads(geojson)
+            if obj.get("type") == "FeatureCollection":
+                geom = shapely.union_all([shape(feature["geometry"]) for feature in obj["features"]])
+            elif obj.get("type") == "Feature":
+                geom = shape(obj["geometry"])
+            else:
+                geom = shape(obj)
+        except (ValueError, KeyError, TypeError, AttributeError, ShapelyError) as exc:
+            raise ValueError(f"AOI GeoJSON inválido: {exc}") from None
+        geoms.append(shapely.make_valid(geom))
+    if not geoms:
+        return None
+
+    aoi = shapely.intersection_all(geoms)
+    if aoi.is_empty or aoi.area == 0:
+        raise ValueError("El AOI consultado no tiene área.")
+    return aoi
+
+
+def _aoi_label(aoi) -> str:
+    minx, miny, maxx, maxy = aoi.bounds
+    kind = "bbox" if aoi.equals(aoi.envelope) else "polígono"
+    return f"Área consultada ({kind} {minx:.4f}, {miny:.4f}, {maxx:.4f}, {maxy:.4f})"
+
+
+def _keep_sections(data: dict, sections: list):
+    """
+    Deja en `data` solo las secciones indicadas y sus vistas de mapa (más la general).
+    """
+    from src.create_final_json import encode_map_views
+
+    data["SECCIONES_MUY_ALTO"] = sections
+    if data.get("VISTAS_MAPAS"):
+        views = json.loads(data["VISTAS_MAPAS"])
+        keep = {"general"} | {section.get("vista") for section in sections}
+        data["VISTAS_MAPAS"] = encode_map_views({k: v for k, v in views.items() if k in keep})
+
+
+class ReportService:
+    """
+    Arma reportes HTML/JSON a partir de los artefactos de cada periodo.
+
+    - Periodo: `reporte_final.json` y `cubo_alertas_<periodo>.parquet` se leen una vez y
+      quedan en memoria (LRU, renovados cada PERIOD_TTL_SECONDS). Si el pipeline no dejó
+      `reporte_final.json`, el reporte base se arma desde el cubo (conteos), el GeoParquet de
+      alertas con cluster (clusters) y el seguimiento si existe, sin mapas Sentinel-2.
+    - Área: `municipio` (y opcionalmente `vereda` dentro de él; hay veredas homónimas en
+      distintos municipios) recalcula los conteos desde el cubo y deja solo los clusters
+      (y sus vistas de mapa) de esa área.
+    - AOI (bbox o polígono, de `parse_aoi`): los conteos salen de las alertas del FlatGeobuf
+      y los clusters de los del GeoParquet con alertas dentro del AOI; ambos se leen solo
+      en el bbox del AOI y se recortan exacto.
+    - Plantilla: se compila una vez por versión del archivo.
+    - Reportes calientes: el HTML ya renderizado y su ETag quedan en una LRU por
+      (periodo, versión de sus datos, área, formato).
+    - Artefactos (mapas, miniaturas): LRU por (ruta, versión del periodo), así que una
+      nueva corrida del periodo no deja mapas viejos en memoria.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT, template_path=TEMPLATE_PATH):
+        self.root = str(root).rstrip("/")
+        self.template_path = str(template_path)
+        self.templates = LRUCache(TEMPLATE_CACHE_SIZE)
+        self.periods = LRUCache(PERIOD_CACHE_SIZE)
+        self.reports = LRUCache(REPORT_CACHE_SIZE)
+        self.artifacts = LRUCache(ARTIFACT_CACHE_BYTES, weigh=lambda item: len(item[1]))
+
+    # === Artefactos ===
+    def _path(self, periodo: str, relative_path: str = "") -> str:
+        if not PERIOD_PAT.match(periodo):
+            raise LookupError(f"Periodo inválido: {periodo}. Usa <I|II|III|IV>_trim_<año>.")
+        path = f"{self.root}/{periodo}"
+        return f"{path}/{relative_path}" if relative_path else path
+
+    def _read_bytes(self, path: str) -> bytes:
+        if path.startswith("gs://"):
+            from src.gcs_io import gcs_exists, read_gcs_bytes
+
+            if not gcs_exists(path):
+                raise LookupError(f"No existe: {path}")
+            return read_gcs_bytes(path)
+        if not os.path.isfile(path):
+            raise LookupError(f"No existe: {path}")
+        return Path(path).read_bytes()
+
+    def artifact(self, periodo: str, relative_path: str):
+        """
+        Archivo de la carpeta del periodo (mapas, miniaturas, imágenes, assets).
+
+        Retorna:
+        - (etag, bytes, content_type)
+        """
+        relative_path = posixpath.normpath(relative_path.replace("\\", "/"))
+        if relative_path.startswith(("../", "/")) or relative_path in ("..", "."):
+            raise LookupError(f"Ruta inválida: {relative_path}")
+        path = self._path(periodo, relative_path)
+        version = self.period(periodo)["version"]
+
+        def load():
+            body = self._read_bytes(path)
+            content_type = mimetypes.guess_type(relative_path)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type.endswith(("javascript", "json")):
+                content_type += "; charset=utf-8"
+            return make_etag(body), body, content_type
+
+        return self.artifacts.get_or_create((path, version), load)
+
+    def _load_alerts(self, periodo: str, bbox=None):
+        """
+        Alertas del periodo (FlatGeobuf) que intersectan `bbox`. Desde GCS se leen los bytes
+        del archivo (cacheados como artefacto); en local, solo lo que toca el índice espacial.
+        """
+        import geopandas as gpd
+
+        name = ALERTS_FGB_NAME.format(periodo=periodo)
+        path = self._path(periodo, name)
+        if path.startswith("gs://"):
+            return gpd.read_file(io.BytesIO(self.artifact(periodo, name)[1]), bbox=bbox)
+        if not os.path.isfile(path):
+            raise LookupError(f"No existe: {path}")
+        return gpd.read_file(path, bbox=bbox)
+
+    def _load_clustered(self, periodo: str, bbox=None, columns=None):
+        """
+        Alertas con cluster del periodo (GeoParquet particionado) que intersectan `bbox`.
+        """
+        from src.spatial_store import load_partitioned_geoparquet
+
+        path = self._path(periodo, CLUSTER_STORE_NAME.format(periodo=periodo))
+        try:
+            return load_partitioned_geoparquet(path, bbox=bbox, columns=columns)
+        except FileNotFoundError as exc:
+            raise LookupError(f"No existe: {path}") from exc
+
+    def _data_from_stores(self, periodo: str, cube, tracking_bytes: bytes) -> dict:
+        """
+        Datos del reporte de un periodo sin `reporte_final.json`: conteos del cubo, clusters
+        del GeoParquet de alertas con cluster y seguimiento del CSV (si existe). Sin mapas
+        Sentinel-2; el mapa general se enlaza si el pipeline lo dejó.
+        """
+        import pandas as pd
+        from src.alert_cube import summary_from_cube
+        from src.create_final_json import build_report_json
+
+        trimestre, _, anio = periodo.split("_")
+        seguimiento = pd.read_csv(io.BytesIO(tracking_bytes), index_col="cluster_id") if tracking_bytes else None
+        map_path = self._path(periodo, ALERTS_MAP_NAME.format(periodo=periodo))
+        try:
+            self._read_bytes(map_path)
+        except LookupError:
+            map_path = None
+        headers = [self._path(periodo, name) for name in HEADER_NAMES]
+        return build_report_json(
+            summary_from_cube(cube),
+            self._load_clustered(periodo),
+            trimestre=trimestre,
+            anio=int(anio),
+            ruta_header_img1=headers[0],
+            ruta_header_img2=headers[1],
+            ruta_footer_img=headers[2],
+            ruta_mapa_alertas=map_path,
+            output_path=None,
+            seguimiento=seguimiento,
+            base_folder=self._path(periodo),
+        )
+
+    def template(self):
+        path = self.template_path
+        version = None if path.startswith("gs://") else os.stat(path).st_mtime_ns
+        return self.templates.get_or_create((path, version), lambda: compile_template(_read_text(path)))
+
+    def period(self, periodo: str) -> dict:
+        """
+        Datos de un periodo: JSON del reporte, cubo (None si no existe) y una versión
+        (hash de ambos) que identifica los reportes calientes derivados.
+
+        Sin `reporte_final.json` los datos se arman con `_data_from_stores` (requiere el cubo)
+        y la versión se calcula sobre el cubo y el seguimiento.
+        """
+        entry = self.periods.get(periodo)
+        if entry is not None and time.monotonic() - entry["leido"] < PERIOD_TTL_SECONDS:
+            return entry
+
+        from src.alert_cube import load_alert_cube
+
+        def optional_bytes(name):
+            try:
+                return self._read_bytes(self._path(periodo, name))
+            except LookupError:
+                return b""
+
+        report_bytes = optional_bytes("reporte_final.json")
+        cube_bytes = optional_bytes(CUBE_NAME.format(periodo=periodo))
+        cube = load_alert_cube(io.BytesIO(cube_bytes)) if cube_bytes else None
+        if report_bytes:
+            datos, source = json.loads(report_bytes), report_bytes
+        elif cube is not None:
+            tracking_bytes = optional_bytes(TRACKING_NAME.format(periodo=periodo))
+            datos = self._data_from_stores(periodo, cube, tracking_bytes)
+            source = b"almacenes" + tracking_bytes
+        else:
+            raise LookupError(f"El periodo {periodo} no tiene reporte_final.json ni cubo de alertas.")
+        entry = {
+            "datos": datos,
+            "cubo": cube,
+            "version": hashlib.sha256(source + cube_bytes).hexdigest()[:16],
+            "leido": time.monotonic(),
+        }
+        origin = "reporte_final.json" if report_bytes else "cubo y almacén de alertas"
+        print(f"📂 Periodo {periodo} cargado desde {origin} (versión {entry['version']})")
+        return self.periods.put(periodo, entry)
+
+    # === Reportes ===
+    def report_data(self, periodo: str, municipio: str = None, vereda: str = None, aoi=None) -> dict:
+        """
+        JSON del reporte del periodo, restringido a un municipio o a una vereda de un
+        municipio si se indican. Una vereda sin municipio es ambigua (ValueError).
+
+        Con `aoi` (geometría de `parse_aoi`) se restringe a ese bbox o polígono; no se
+        combina con municipio ni vereda (ValueError).
+        """
+        from src.alert_cube import summary_from_cube
+        from src.create_final_json import summary_fields
+
+        entry = self.period(periodo)
+        data = dict(entry["datos"])
+        data["AREA_CONSULTA"] = []
+        if aoi is not None:
+            if municipio or vereda:
+                raise ValueError("Filtra por municipio/vereda o por bbox/aoi, no por ambos.")
+            return self._aoi_report_data(periodo, data, aoi)
+        if not (municipio or vereda):
+            return data
+        if vereda and not municipio:
+            raise ValueError("Para filtrar por vereda indica también el municipio (hay veredas homónimas).")
+
+        cube = entry["cubo"]
+        if cube is None:
+            raise LookupError(f"El periodo {periodo} no tiene cubo de alertas: no se puede filtrar por área.")
+        filters = {}
+        for dim, name in (("municipio", municipio), ("vereda", vereda)):
+            if name:
+                # La vereda se busca solo entre las del municipio elegido
+                rows = cube[cube["municipio"] == filters["municipio"]] if filters else cube
+                value = _match_name(rows[dim].dropna().unique(), name)
+                if value is None:
+                    where = f" ({filters['municipio']})" if filters else ""
+                    raise LookupError(f"No hay alertas para {dim} = {name}{where} en {periodo}.")
+                filters[dim] = value
+
+        data.update(summary_fields(summary_from_cube(cube, **filters)))
+        sections = [
+            section for section in data.get("SECCIONES_MUY_ALTO", [])
+            if all(section.get(dim) == value for dim, value in filters.items())
+        ]
+        _keep_sections(data, sections)
+        label = filters.get("vereda", "")
+        if "municipio" in filters:
+            label = f"{label} ({filters['municipio']})" if label else filters["municipio"]
+        data["AREA_CONSULTA"] = [{"nombre": label}]
+        return data
+
+    def _aoi_report_data(self, periodo: str, data: dict, aoi) -> dict:
+        """
+        Conteos de las alertas dentro del AOI (FlatGeobuf) y clusters con alguna alerta
+        dentro de él (GeoParquet de alertas con cluster).
+        """
+        from src.aoi import clip_alerts_to_aoi
+        from src.create_final_json import summary_fields
+        from src.download_gfw_data import summarize_alert_confidences
+
+        bbox = tuple(aoi.bounds)
+        alerts = clip_alerts_to_aoi(self._load_alerts(periodo, bbox=bbox), aoi)
+        data.update(summary_fields(summarize_alert_confidences(alerts)))
+
+        clustered = clip_alerts_to_aoi(self._load_clustered(periodo, bbox=bbox, columns=["cluster_id", "geometry"]), aoi)
+        cluster_ids = set(clustered["cluster_id"].dropna().astype(int))
+        _keep_sections(data, [
+            section for section in data.get("SECCIONES_MUY_ALTO", []) if section.get("cluster_id") in cluster_ids
+        ])
+        data["AREA_CONSULTA"] = [{"nombre": _aoi_label(aoi)}]
+        return data
+
+    def report(self, periodo: str, municipio: str = None, vereda: str = None, fmt: str = "html", aoi=None):
+        """
+        Reporte renderizado (o su JSON con `fmt="json"`).
+
+        Retorna:
+        - (etag, bytes, content_type)
+        """
+        version = self.period(periodo)["version"]
+        aoi_key = hashlib.sha256(aoi.wkb).hexdigest()[:16] if aoi is not None else ""
+        key = (periodo, version, (municipio or "").strip().casefold(), (vereda or "").strip().casefold(), aoi_key, fmt)
+
+        def build():
+            data = self.report_data(periodo, municipio, vereda, aoi=aoi)
+            if fmt == "json":
+                body = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+                return make_etag(body), body, "application/json; charset=utf-8"
+            data["HEADER"] = build_header(data.get("HEADER"))
+            body = render_compiled(self.template(), data).encode("utf-8")
+            return make_etag(body), body, "text/html; charset=utf-8"
+
+        return self.reports.get_or_create(key, build)
+
+    def stats(self) -> dict:
+        return {
+            "plantillas": self.templates.stats(),
+            "periodos": self.periods.stats(),
+            "reportes": self.reports.stats(),
+            "artefactos": self.artifacts.stats(),
+        }
+
+
+def make_handler(service: ReportService):
+    """
+    Manejador HTTP del servicio:
+
+    - GET /reportes/<periodo>/[reporte.html][?municipio=...[&vereda=...]]: reporte HTML
+      (la vereda requiere el municipio: 400 sin él).
+    - GET /reportes/<periodo>/[reporte.html]?bbox=minx,miny,maxx,maxy y/o ?aoi=<GeoJSON>:
+      reporte de ese bbox o polígono en EPSG:4326 (400 si es inválido).
+    - GET /reportes/<periodo>/reporte.json[?...]: datos del reporte.
+    - GET /reportes/<periodo>/<ruta>: mapas, miniaturas e imágenes del periodo (rutas
+      relativas del reporte).
+    - GET /estado: estadísticas de las cachés.
+
+    Todas las respuestas llevan ETag; con If-None-Match igual se responde 304 sin cuerpo.
+    """
+
+    class ReportHandler(BaseHTTPRequestHandler):
+        server_version = "SimbypReportes/1.0"
+
+        def do_GET(self):
+            self._handle(send_body=True)
+
+        def do_HEAD(self):
+            self._handle(send_body=False)
+
+        def _handle(self, send_body):
+            url = urlsplit(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            parts = [unquote(part) for part in url.path.split("/") if part]
+
+            try:
+                if parts == ["estado"]:
+                    body = json.dumps(service.stats(), indent=2).encode("utf-8")
+                    result = (make_etag(body), body, "application/json; charset=utf-8")
+                elif len(parts) >= 2 and parts[0] == "reportes":
+                    periodo, relative_path = parts[1], "/".join(parts[2:])
+                    if len(parts) == 2 and not url.path.endswith("/"):
+                        # Las rutas del reporte son relativas a la carpeta del periodo
+                        return self._redirect(f"/reportes/{quote(periodo)}/" + (f"?{url.query}" if url.query else ""))
+                    if relative_path in ("", "reporte.html", "reporte.json"):
+                        fmt = "json" if relative_path == "reporte.json" else "html"
+                        aoi = parse_aoi(params.get("bbox"), params.get("aoi"))
+                        result = service.report(periodo, params.get("municipio"), params.get("vereda"),
+                                                fmt=fmt, aoi=aoi)
+                    else:
+                        result = service.artifact(periodo, relative_path)
+                else:
+                    raise LookupError(f"Ruta no encontrada: {url.path}")
+            except LookupError as exc:
+                return self.send_error(HTTPStatus.NOT_FOUND, explain=str(exc))
+            except ValueError as exc:
+                return self.send_error(HTTPStatus.BAD_REQUEST, explain=str(exc))
+            except Exception as exc:
+                print(f"❌ Error al atender {self.path}: {exc}")
+                return self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, explain=str(exc))
+
+            self._send(*result, send_body=send_body)
+
+        def _send(self, etag, body, content_type, send_body=True):
+            if_none_match = self.headers.get("If-None-Match", "")
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if etag in tags or "*" in tags:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                return
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            # El navegador guarda la respuesta pero la revalida (304) en cada visita
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def _redirect(self, location):
+            self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    return ReportHandler
+
+
+def serve(root: str = DEFAULT_ROOT, host: str = "127.0.0.1", port: int = 8000, template_path=TEMPLATE_PATH):
+    """
+    Inicia el servicio (un hilo por solicitud) hasta Ctrl+C.
+    """
+    service = ReportService(root, template_path)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"🌐 Reportes a pedido en http://{host}:{server.server_port}/reportes/<periodo>/ (raíz: {service.root})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return service
@@ -0,0 +1,45 @@
+import argparse
+from pathlib import Path
+import warnings
+
+# Trabajador de la cola de mapas Sentinel-2 (ver `main.py --cola-sentinel`).
+# Se puede lanzar en varios procesos o nodos que vean la misma cola; cada uno sube sus
+# mapas a GCS y el pipeline los recoge cuando la cola se vacía.
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Trabajador de mapas Sentinel-2 por cluster")
+    parser.add_argument("--cola", required=True, metavar="URL",
+                        help="Cola de trabajos: sqlite:///ruta.db o file:///carpeta (la misma de main.py)")
+    parser.add_argument("--trimestre", type=str, required=True, help="Trimestre: I, II, III o IV")
+    parser.add_argument("--anio", type=str, required=True, help="Año en formato YYYY")
+    parser.add_argument("--id", default=None, help="Identificador del trabajador (por defecto host-pid)")
+    parser.add_argument("--lease", type=float, default=None, help="Duración del lease en segundos")
+    parser.add_argument("--esperar", action="store_true",
+                        help="Sigue esperando trabajos nuevos aunque la cola se vacíe")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    warnings.filterwarnings("ignore", message="urllib3 v2 only supports OpenSSL 1.1.1+")
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    load_dotenv(Path(__file__).parent.parent / ".env")
+
+    from src.sentinel_jobs import run_cluster_job
+    from src.work_queue import LEASE_SECONDS, open_queue, run_worker
+
+    queue = open_queue(args.cola, f"sentinel_{args.trimestre}_trim_{args.anio}")
+    print(f"🛰️ Trabajador de la cola {queue.name} ({args.cola})")
+    completed = run_worker(
+        queue, run_cluster_job, worker_id=args.id, lease_seconds=args.lease or LEASE_SECONDS,
+        until_drained=not args.esperar
+    )
+    print(f"✅ {completed} trabajos completados. Estado de la cola: {queue.counts()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from src.download_gfw_data import ALERT_COLUMNS
+
+
+DATE_COLUMN = "gfw_integrated_alerts__date"
+
+# Columna de las alertas enriquecidas → dimensión del cubo
+TERRITORY_DIMENSIONS = {
+    "NOMB_MPIO": "municipio",
+    "NOMBRE_VER": "vereda",
+    "SECR_CCNCT": "seccion",
+}
+CUBE_DIMENSIONS = ["fecha", "sistema", "nivel"] + list(TERRITORY_DIMENSIONS.values())
+
+# Granularidades temporales soportadas (alias de pandas para to_period)
+FREQUENCIES = {"D": "D", "W": "W-SUN", "M": "M"}
+
+
+def build_alert_cube(alerts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Construye el cubo de alertas en una sola pasada de groupby.
+
+    Dimensiones: fecha (diaria) × sistema de confianza × nivel × municipio × vereda × sección.
+    Las dimensiones territoriales que no existan en `alerts` quedan vacías (NA).
+
+    El cruce espacial (left join) repite una alerta que cae en el borde de dos polígonos o
+    en polígonos traslapados, con el mismo índice: se cuenta una vez, con su primer cruce.
+
+    Parámetros:
+    - alerts (pd.DataFrame): Alertas (crudas o enriquecidas por `process_alerts`).
+
+    Retorna:
+    - pd.DataFrame: Una fila por combinación observada, con la columna `n_alertas`.
+    """
+    alerts = alerts[~alerts.index.duplicated(keep="first")]
+    systems = [c for c in ALERT_COLUMNS if c in alerts.columns]
+    n_rows = len(alerts)
+
+    base = pd.DataFrame({"fecha": pd.to_datetime(alerts[DATE_COLUMN], errors="coerce").dt.normalize().to_numpy()})
+    for column, dim in TERRITORY_DIMENSIONS.items():
+        if column in alerts.columns:
+            base[dim] = alerts[column].astype("string").array
+        else:
+            base[dim] = pd.array([pd.NA] * n_rows, dtype="string")
+
+    # Formato largo: una fila por (alerta, sistema) → un único groupby
+    long = pd.concat([base] * len(systems), ignore_index=True)
+    long["sistema"] = pd.Categorical.from_codes(np.repeat(np.arange(len(systems)), n_rows), categories=systems)
+    # con el esquema tipado las confianzas ya son categóricas y el concat las conserva
+    long["nivel"] = pd.concat([alerts[c] for c in systems], ignore_index=True).astype("category")
+
+    cube = (
+        long.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=True)
+        .size()
+        .reset_index(name="n_alertas")
+    )
+    cube["n_alertas"] = cube["n_alertas"].astype("int32")
+    return cube
+
+
+def rollup_cube(cube: pd.DataFrame, freq: str = "D", dims: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Re-agrega el cubo diario a otra granularidad temporal y/o a un subconjunto de dimensiones.
+
+    Parámetros:
+    - cube (pd.DataFrame): Cubo generado por `build_alert_cube` o leído con `load_alert_cube`.
+    - freq (str): 'D' (día), 'W' (semana, inicia el lunes) o 'M' (mes).
+    - dims (List[str], opcional): Dimensiones a conservar. Por defecto, todas.
+
+    Retorna:
+    - pd.DataFrame: Cubo agregado con la columna `n_alertas`.
+    """
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Frecuencia inválida: {freq}. Usa 'D', 'W' o 'M'.")
+    dims = list(CUBE_DIMENSIONS if dims is None else dims)
+
+    cube = cube.copy()
+    if "fecha" in dims and freq != "D":
+        cube["fecha"] = cube["fecha"].dt.to_period(FREQUENCIES[freq]).dt.start_time
+
+    return (
+        cube.groupby(dims, observed=True, dropna=False, sort=True)["n_alertas"]
+        .sum()
+        .reset_index()
+    )
+
+
+def summary_from_cube(cube: pd.DataFrame, **filters) -> Dict[str, Dict[str, int]]:
+    """
+    Resume los niveles de confianza por sistema a partir del cubo.
+    Devuelve la misma estructura que `summarize_alert_confidences`.
+
+    Los argumentos con nombre filtran dimensiones, p. ej. `municipio="Bogotá"`.
+    """
+    mask = pd.Series(True, index=cube.index)
+    for dim, value in filters.items():
+        mask &= cube[dim] == value
+
+    counts = cube[mask].groupby(["sistema", "nivel"], observed=True)["n_alertas"].sum()
+
+    summary = {}
+    for system in counts.index.get_level_values("sistema").unique():
+        levels = counts.loc[system]
+        column_summary = {str(level): int(count) for level, count in levels.items()}
+        column_summary["total"] = int(levels.sum())
+        summary[str(system)] = column_summary
+    return summary
+
+
+def check_cube_total(cube: pd.DataFrame, n_alerts: int):
+    """
+    Verifica que el cubo cuente cada alerta una sola vez por sistema (total = `n_alerts`,
+    el número de alertas descargadas). Lanza ValueError si no.
+    """
+    totals = cube.groupby("sistema", observed=True)["n_alertas"].sum()
+    wrong = totals[totals != n_alerts]
+    if len(wrong):
+        raise ValueError(
+            f"El cubo no cuadra con las {n_alerts} alertas descargadas: {wrong.astype(int).to_dict()}"
+        )
+
+
+def save_alert_cube(cube: pd.DataFrame, output_path: str):
+    """
+    Guarda el cubo en formato Parquet (columnar). Acepta rutas locales o gs://.
+    """
+    cube.to_parquet(output_path, index=False)
+
+
+def load_alert_cube(path: str, filters=None) -> pd.DataFrame:
+    """
+    Lee un cubo guardado con `save_alert_cube`.
+
+    Parámetros:
+    - path (str): Ruta local o gs:// del archivo Parquet.
+    - filters (opcional): Filtros de pyarrow, p. ej. [("municipio", "==", "Bogotá")],
+      aplicados durante la lectura.
+    """
+    return pd.read_parquet(path, filters=filters)
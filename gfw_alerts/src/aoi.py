@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+import shapely
+from shapely.geometry import mapping, shape
+
+
+# Tolerancia de simplificación del área de interés (metros, en UTM)
+AOI_TOLERANCE_M = 25
+# Decimales de las coordenadas enviadas a GFW (6 ≈ 0.1 m)
+AOI_COORD_DECIMALS = 6
+# Geometrías preparadas (una por archivo de AOI y tolerancia); la variable de entorno
+# AOI_CACHE_DIR las reubica (se lee al preparar el AOI, no al importar)
+AOI_CACHE_ENV = "AOI_CACHE_DIR"
+AOI_DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "simbyp", "aoi")
+
+
+def load_aoi_geometry(filepath: str):
+    """
+    Une todos los polígonos de un archivo GeoJSON o Shapefile (partes y huecos incluidos)
+    en una sola geometría en EPSG:4326.
+    """
+    gdf = gpd.read_file(filepath)
+    if gdf.crs is not None:
+        gdf = gdf.to_crs(4326)
+    return shapely.make_valid(gdf.geometry.union_all())
+
+
+def _count_vertices(geom) -> int:
+    return int(shapely.get_num_coordinates(geom))
+
+
+def simplify_aoi(exact_geom, tolerance_m: float = AOI_TOLERANCE_M, decimals: int = AOI_COORD_DECIMALS):
+    """
+    Simplifica el AOI conservando la topología y lo amplía lo justo para que cubra
+    el original, de modo que la consulta a GFW no pierda alertas en los bordes.
+
+    Parámetros:
+    - exact_geom: Geometría original en EPSG:4326.
+    - tolerance_m (float): Desviación máxima permitida de los bordes simplificados, en metros.
+    - decimals (int): Decimales a los que se redondean las coordenadas.
+
+    Retorna:
+    - Geometría simplificada (EPSG:4326) que cubre `exact_geom`.
+    """
+    series = gpd.GeoSeries([exact_geom], crs=4326)
+    utm_crs = series.estimate_utm_crs()
+    projected = series.to_crs(utm_crs).iloc[0]
+
+    simplified = shapely.simplify(projected, tolerance_m, preserve_topology=True)
+    margin = tolerance_m
+    for _ in range(5):
+        # Cada vértice original queda a menos de `tolerance_m` del borde simplificado,
+        # así que el buffer de esa distancia lo cubre; el redondeo puede requerir algo más.
+        candidate = shapely.buffer(simplified, margin, join_style="mitre", mitre_limit=2.0)
+        candidate = gpd.GeoSeries([candidate], crs=utm_crs).to_crs(4326).iloc[0]
+        candidate = shapely.set_precision(candidate, 10 ** -decimals)
+        if candidate.covers(exact_geom):
+            return candidate
+        margin *= 2
+
+    # No debería ocurrir: se envía el original redondeado hacia afuera
+    return shapely.set_precision(exact_geom.buffer(10 ** -decimals), 10 ** -decimals)
+
+
+def default_aoi_cache_dir() -> str:
+    return os.path.expanduser(os.getenv(AOI_CACHE_ENV) or AOI_DEFAULT_CACHE_DIR)
+
+
+def prepare_aoi(filepath: str, tolerance_m: float = AOI_TOLERANCE_M, cache_dir: str = None):
+    """
+    Prepara el área de interés para la descarga de alertas.
+
+    Parámetros:
+    - filepath (str): Ruta al archivo .geojson o .shp del área.
+    - tolerance_m (float): Tolerancia de simplificación en metros (0 desactiva la simplificación).
+    - cache_dir (str, opcional): Carpeta donde se guarda la geometría preparada. Por defecto,
+      `AOI_CACHE_DIR` o `~/.cache/simbyp/aoi`; una cadena vacía desactiva la caché.
+
+    Retorna:
+    - (dict, geometry): Geometría GeoJSON simplificada para la solicitud a GFW y la
+      geometría exacta (para recortar localmente las alertas con `clip_alerts_to_aoi`).
+    """
+    exact_geom = load_aoi_geometry(filepath)
+    if tolerance_m <= 0:
+        return mapping(exact_geom), exact_geom
+
+    if cache_dir is None:
+        cache_dir = default_aoi_cache_dir()
+    key = hashlib.sha256(shapely.to_wkb(exact_geom) + f"|{tolerance_m}|{AOI_COORD_DECIMALS}".encode()).hexdigest()[:32]
+    cache_path = os.path.join(cache_dir, f"{key}.geojson") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f), exact_geom
+
+    prepared = simplify_aoi(exact_geom, tolerance_m)
+    geometry = mapping(prepared)
+    print(
+        f"🗺️ AOI simplificado: {_count_vertices(exact_geom)} → {_count_vertices(prepared)} vértices "
+        f"(tolerancia {tolerance_m} m)"
+    )
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(geometry, f)
+        os.replace(tmp_path, cache_path)
+    # Vuelta por JSON para que la geometría sea idéntica con y sin caché (tuplas → listas)
+    return json.loads(json.dumps(geometry)), exact_geom
+
+
+def clip_alerts_to_aoi(alerts_gdf: gpd.GeoDataFrame, aoi_geom) -> gpd.GeoDataFrame:
+    """
+    Recorte exacto de las alertas al AOI original (la descarga usa el AOI ampliado).
+    """
+    if isinstance(aoi_geom, dict):
+        aoi_geom = shape(aoi_geom)
+    shapely.prepare(aoi_geom)
+    inside = shapely.intersects(aoi_geom, alerts_gdf.geometry.values)
+    return alerts_gdf[inside]
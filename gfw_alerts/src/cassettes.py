@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+# Modo de grabación/reproducción de servicios externos (GFW, Earth Engine, GCS):
+#   off     → llamadas reales (por defecto)
+#   record  → llamadas reales, guardando cada respuesta en el almacén de cassettes
+#   replay  → sin red: las respuestas se leen del almacén (error si falta alguna)
+MODE_ENV = "SIMBYP_CASSETTE_MODE"
+DIR_ENV = "SIMBYP_CASSETTE_DIR"
+DEFAULT_DIR = ".cassettes"
+MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """
+    No existe una respuesta grabada para la llamada solicitada en modo replay.
+    """
+
+
+def cassette_mode() -> str:
+    mode = os.getenv(MODE_ENV, "off").lower()
+    if mode not in MODES:
+        raise ValueError(f"{MODE_ENV} inválido: {mode}. Usa 'off', 'record' o 'replay'.")
+    return mode
+
+
+def is_replay() -> bool:
+    return cassette_mode() == "replay"
+
+
+def cassette_dir() -> Path:
+    return Path(os.getenv(DIR_ENV, DEFAULT_DIR))
+
+
+def _cassette_path(service, operation, key, kind) -> Path:
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+    suffix = ".bin" if kind == "bytes" else ".json"
+    return cassette_dir() / service / operation / f"{digest}{suffix}"
+
+
+def cassette(service, operation, key, fetch, kind="json"):
+    """
+    Ejecuta `fetch()` según el modo de cassettes.
+
+    Parámetros:
+    - service (str): Servicio externo ('gfw', 'ee', 'gcs').
+    - operation (str): Operación dentro del servicio (define la subcarpeta).
+    - key: Valor serializable que identifica la llamada (sin secretos: se guarda solo su hash).
+    - fetch (callable): Función sin argumentos que hace la llamada real.
+    - kind (str): 'json' para respuestas serializables en JSON o 'bytes' para contenido binario.
+
+    Retorna:
+    - La respuesta real (off/record) o la grabada (replay).
+    """
+    mode = cassette_mode()
+    if mode == "off":
+        return fetch()
+
+    path = _cassette_path(service, operation, key, kind)
+    if mode == "replay":
+        if not path.exists():
+            raise CassetteMissError(f"Sin respuesta grabada para {service}/{operation} ({path})")
+        if kind == "bytes":
+            return path.read_bytes()
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    result = fetch()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    if kind == "bytes":
+        tmp_path.write_bytes(result)
+    else:
+        tmp_path.write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return result
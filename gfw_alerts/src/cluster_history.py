@@ -0,0 +1,251 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from src.spatial_store import hilbert_sort
+
+
+# Historial de clusters de todos los periodos (una fila por cluster y periodo)
+HISTORY_FILENAME = "historial_clusters.parquet"
+# Huella de un cluster: envolvente convexa de sus alertas con este margen (metros)
+FOOTPRINT_BUFFER_M = 250
+# Traslape mínimo (fracción de la huella más pequeña) para considerar dos clusters el mismo
+MIN_OVERLAP = 0.1
+# Crecimiento relativo del área a partir del cual un cluster se considera "creciente"
+GROWTH_THRESHOLD = 0.1
+TRIMESTRES = ("I", "II", "III", "IV")
+
+# Estados de un cluster respecto a los periodos anteriores
+NEW = "nuevo"                # sin clusters previos en la zona
+GROWING = "creciente"        # estaba en el periodo anterior y su huella creció
+PERSISTENT = "persistente"   # estaba en el periodo anterior, sin crecer
+RECURRENT = "recurrente"     # hubo clusters en la zona, pero no en el periodo anterior
+
+HISTORY_COLUMNS = ["id_estable", "periodo", "orden_periodo", "cluster_id", "n_alertas", "area_ha"]
+
+
+def period_order(trimestre: str, anio) -> int:
+    """
+    Número consecutivo del trimestre (para ordenar periodos y reconocer el anterior).
+    """
+    return int(anio) * 4 + TRIMESTRES.index(trimestre)
+
+
+def empty_history(crs="EPSG:4326") -> gpd.GeoDataFrame:
+    history = gpd.GeoDataFrame({col: pd.Series(dtype="int64") for col in HISTORY_COLUMNS}, geometry=[], crs=crs)
+    history["periodo"] = history["periodo"].astype("string")
+    history["area_ha"] = history["area_ha"].astype("float64")
+    return history
+
+
+def cluster_footprints(alerts_with_clusters: gpd.GeoDataFrame, buffer_m: float = FOOTPRINT_BUFFER_M) -> gpd.GeoDataFrame:
+    """
+    Huella de cada cluster: envolvente convexa de sus alertas ampliada `buffer_m` metros.
+
+    Retorna:
+    - GeoDataFrame (EPSG:4326) indexado por cluster_id con `n_alertas` y `area_ha`.
+    """
+    if alerts_with_clusters.empty:
+        return gpd.GeoDataFrame({"n_alertas": [], "area_ha": []}, geometry=[], crs="EPSG:4326")
+
+    utm_crs = alerts_with_clusters.estimate_utm_crs()
+    points = alerts_with_clusters.to_crs(utm_crs)
+    codes, cluster_ids = pd.factorize(points["cluster_id"], sort=True)
+    hulls = shapely.convex_hull(shapely.multipoints(points.geometry.values, indices=codes))
+    footprints = shapely.buffer(hulls, buffer_m)
+
+    result = gpd.GeoDataFrame(
+        {
+            "n_alertas": np.bincount(codes, minlength=len(cluster_ids)),
+            "area_ha": shapely.area(footprints) / 10_000,
+        },
+        geometry=footprints,
+        index=pd.Index(cluster_ids.astype("int64"), name="cluster_id"),
+        crs=utm_crs,
+    )
+    return result.to_crs(epsg=4326)
+
+
+def load_cluster_history(path: str, bbox=None) -> gpd.GeoDataFrame:
+    """
+    Lee el historial (GeoParquet). Si no existe, retorna un historial vacío.
+    Con `bbox` solo se leen los grupos de filas que lo intersectan.
+    """
+    if not os.path.exists(path):
+        return empty_history()
+    return gpd.read_parquet(path, bbox=bbox)
+
+
+def save_cluster_history(history: gpd.GeoDataFrame, path: str):
+    """
+    Guarda el historial ordenado por la curva de Hilbert y con columna `bbox` (consultas por extensión).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    hilbert_sort(history).to_parquet(tmp_path, index=False, write_covering_bbox=True)
+    os.replace(tmp_path, path)
+    print(f"✅ Historial de clusters ({len(history)} huellas) guardado en: {path}")
+
+
+def _match_predecessors(footprints, previous, min_overlap):
+    """
+    Pares (cluster actual, huella previa) que se traslapan, con consultas al STRtree de
+    las huellas previas (sin comparar todos contra todos).
+    """
+    utm_crs = footprints.estimate_utm_crs()
+    current = footprints.to_crs(utm_crs).geometry.values
+    past = previous.to_crs(utm_crs).geometry.values
+
+    tree = shapely.STRtree(past)
+    cur_idx, past_idx = tree.query(current, predicate="intersects")
+    overlap = shapely.area(shapely.intersection(current[cur_idx], past[past_idx]))
+    smaller = np.minimum(shapely.area(current[cur_idx]), shapely.area(past[past_idx]))
+    keep = overlap >= min_overlap * smaller
+
+    pairs = pd.DataFrame({
+        "cluster_id": footprints.index.to_numpy()[cur_idx[keep]],
+        "traslape": overlap[keep],
+    })
+    for column in HISTORY_COLUMNS:
+        if column == "cluster_id":
+            continue
+        pairs[f"{column}_previo"] = previous[column].to_numpy()[past_idx[keep]]
+    return pairs
+
+
+def track_clusters(footprints: gpd.GeoDataFrame, history: gpd.GeoDataFrame, trimestre: str, anio,
+                   min_overlap: float = MIN_OVERLAP, growth_threshold: float = GROWTH_THRESHOLD):
+    """
+    Relaciona los clusters del periodo con los de periodos anteriores y les asigna un id estable.
+
+    Cada cluster hereda el id del cluster previo con el que más se traslapa (cada id se
+    hereda una sola vez: si un cluster se divide, las otras partes reciben ids nuevos pero
+    conservan sus predecesores). Volver a procesar un periodo reemplaza sus filas: los
+    clusters que se traslapan con las huellas reemplazadas conservan su id estable, así
+    que los periodos posteriores ya registrados siguen enlazados.
+
+    Parámetros:
+    - footprints (GeoDataFrame): Salida de `cluster_footprints`.
+    - history (GeoDataFrame): Historial de `load_cluster_history`.
+
+    Retorna:
+    - (DataFrame, GeoDataFrame): Seguimiento por cluster_id (id_estable, estado, predecesor,
+      crecimiento de alertas y área, periodos activos) e historial actualizado.
+    """
+    periodo = f"{trimestre}_trim_{anio}"
+    orden = period_order(trimestre, anio)
+    next_id = int(history["id_estable"].max()) + 1 if not history.empty else 1
+    replaced = history[history["orden_periodo"] == orden]
+    history = history[history["orden_periodo"] != orden]
+    previous = history[history["orden_periodo"] < orden]
+
+    if previous.empty or footprints.empty:
+        pairs = pd.DataFrame({
+            "cluster_id": pd.Series(dtype="int64"), "traslape": pd.Series(dtype="float64"),
+            **{f"{col}_previo": previous[col].iloc[:0] for col in HISTORY_COLUMNS if col != "cluster_id"},
+        })
+    else:
+        pairs = _match_predecessors(footprints, previous, min_overlap)
+
+    # Traslape por id estable (un id puede tener huellas en varios periodos): se usa la más reciente
+    pairs = pairs.sort_values(
+        ["cluster_id", "id_estable_previo", "orden_periodo_previo"], ascending=[True, True, False], kind="stable"
+    ).drop_duplicates(["cluster_id", "id_estable_previo"])
+
+    # Asignación voraz por traslape decreciente: cada id se hereda una vez. Primero los ids
+    # de las huellas reemplazadas del mismo periodo, luego los de periodos anteriores
+    ranked = pairs.sort_values(
+        ["traslape", "orden_periodo_previo", "id_estable_previo", "cluster_id"],
+        ascending=[False, False, True, True], kind="stable"
+    )
+    inherited = {}
+    taken = set()
+    candidates = [ranked]
+    if not replaced.empty and not footprints.empty:
+        candidates.insert(0, _match_predecessors(footprints, replaced, min_overlap).sort_values(
+            ["traslape", "id_estable_previo", "cluster_id"], ascending=[False, True, True], kind="stable"
+        ))
+    for candidate in candidates:
+        for cluster_id, stable_id in zip(candidate["cluster_id"], candidate["id_estable_previo"]):
+            if cluster_id not in inherited and stable_id not in taken:
+                inherited[cluster_id] = stable_id
+                taken.add(stable_id)
+
+    tracking = pd.DataFrame(index=footprints.index)
+    stable_ids = []
+    for cluster_id in footprints.index:
+        if cluster_id in inherited:
+            stable_ids.append(inherited[cluster_id])
+        else:
+            stable_ids.append(next_id)
+            next_id += 1
+    tracking["id_estable"] = np.array(stable_ids, dtype="int64")
+
+    # Predecesor principal: el del id heredado o, si no está entre los previos, el de mayor traslape
+    same_id = ranked["id_estable_previo"] == ranked["cluster_id"].map(inherited)
+    chosen = pd.concat([ranked[same_id], ranked])
+    predecessor = chosen.drop_duplicates("cluster_id").set_index("cluster_id").reindex(footprints.index)
+
+    tracking["id_predecesor"] = predecessor["id_estable_previo"].astype("Int64")
+    tracking["periodo_predecesor"] = predecessor["periodo_previo"].astype("string")
+    tracking["predecesores"] = (
+        pairs.groupby("cluster_id")["id_estable_previo"]
+        .agg(lambda ids: ",".join(str(int(i)) for i in sorted(ids)))
+        .reindex(footprints.index)
+        .astype("string")
+    )
+    tracking["n_alertas"] = footprints["n_alertas"].astype("int64")
+    tracking["area_ha"] = footprints["area_ha"].round(2)
+    tracking["crecimiento_alertas"] = (footprints["n_alertas"] - predecessor["n_alertas_previo"]).astype("Int64")
+    tracking["crecimiento_area_ha"] = (footprints["area_ha"] - predecessor["area_ha_previo"]).astype("float64").round(2)
+
+    has_predecessor = predecessor["orden_periodo_previo"].notna()
+    consecutive = predecessor["orden_periodo_previo"] == orden - 1
+    grew = footprints["area_ha"] > predecessor["area_ha_previo"] * (1 + growth_threshold)
+    tracking["estado"] = np.select(
+        [~has_predecessor, consecutive & grew, consecutive], [NEW, GROWING, PERSISTENT], default=RECURRENT
+    )
+
+    past_periods = previous.groupby("id_estable")["orden_periodo"].nunique()
+    first_period = (
+        previous.sort_values("orden_periodo", kind="stable").drop_duplicates("id_estable")
+        .set_index("id_estable")["periodo"]
+    )
+    tracking["periodos_activos"] = (
+        tracking["id_estable"].map(past_periods).fillna(0).astype("int64") + 1
+    )
+    tracking["primer_periodo"] = tracking["id_estable"].map(first_period).fillna(periodo).astype("string")
+
+    rows = gpd.GeoDataFrame(
+        {
+            "id_estable": tracking["id_estable"].to_numpy(),
+            "periodo": pd.array([periodo] * len(footprints), dtype="string"),
+            "orden_periodo": np.full(len(footprints), orden, dtype="int64"),
+            "cluster_id": footprints.index.to_numpy().astype("int64"),
+            "n_alertas": tracking["n_alertas"].to_numpy(),
+            "area_ha": footprints["area_ha"].to_numpy(),
+        },
+        geometry=footprints.geometry.to_crs(history.crs or "EPSG:4326").values,
+        crs=history.crs or "EPSG:4326",
+    )
+    updated = pd.concat([history, rows], ignore_index=True) if not history.empty else rows
+    updated = updated.sort_values(["orden_periodo", "cluster_id"], kind="stable").reset_index(drop=True)
+    return tracking, updated
+
+
+def update_cluster_history(alerts_with_clusters: gpd.GeoDataFrame, history_path: str, trimestre: str, anio):
+    """
+    Calcula las huellas del periodo, las relaciona con el historial y guarda el historial actualizado.
+
+    Retorna:
+    - DataFrame: Seguimiento por cluster_id (ver `track_clusters`).
+    """
+    footprints = cluster_footprints(alerts_with_clusters)
+    tracking, history = track_clusters(footprints, load_cluster_history(history_path), trimestre, anio)
+    save_cluster_history(history, history_path)
+    counts = tracking["estado"].value_counts().to_dict()
+    print(f"🧭 Clusters del periodo: {counts}")
+    return tracking
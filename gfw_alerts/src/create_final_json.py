@@ -1,15 +1,97 @@
 import json
 import os
-import locale
-from google.cloud import storage
+import pandas as pd
+
+from src.gcs_io import write_gcs_bytes
+from src.process_gfw_alerts import summarize_clusters
 
 def make_relative(path, base):
     if path and os.path.isabs(path):
         return os.path.relpath(path, base)
     return path
 
-# Establecer formato numérico español
-locale.setlocale(locale.LC_ALL, "es_ES.UTF-8")
+_SWAP_SEPARATORS = str.maketrans({",": ".", ".": ","})
+
+# Campos numéricos del reporte → columna del resumen de clusters
+CLUSTER_FIELDS = {
+    "densidad_poblacional": "pobdens20",
+    "pib_m2": "gdp_20_m2p",
+    "mercado_acceso": "acss_mrkt",
+    "elevacion": "elevation",
+    "ind_priv": "dprivt",
+    "energia_pct": "ENRG_PERC",
+    "acueducto_pct": "ACUED_PERC",
+    "alcantarillado_pct": "ALCLT_PERC",
+    "gas_pct": "GAS_PERC",
+    "basura_pct": "BASUR_PERC",
+    "internet_pct": "INTER_PERC",
+}
+
+# Modos de mapas del reporte: una página folium por mapa (iframe) o vistas como datos
+# dibujadas por un solo Leaflet al entrar en pantalla (lazy)
+RENDER_MODES = ("iframe", "lazy")
+
+def fmt_series(values: pd.Series) -> pd.Series:
+    """
+    Formatea una columna numérica con coma decimal y punto de miles (1 decimal).
+    Los valores no numéricos o NaN se devuelven como None.
+    """
+    numeric = pd.to_numeric(values, errors="coerce").round(1)
+    formatted = numeric.map("{:,.1f}".format, na_action="ignore").astype("string")
+    formatted = formatted.str.translate(_SWAP_SEPARATORS)
+    return formatted.astype(object).where(numeric.notna(), None)
+
+def _period_label(periodo) -> str:
+    """
+    'II_trim_2024' → 'trimestre II de 2024'.
+    """
+    trimestre, _, anio = str(periodo).partition("_trim_")
+    return f"trimestre {trimestre} de {anio}"
+
+def tracking_detail(row) -> str:
+    """
+    Frase del reporte con el estado de un cluster respecto a periodos anteriores
+    (una fila del seguimiento de `src.cluster_history.track_clusters`).
+    """
+    estado = row["estado"]
+    if estado == "nuevo":
+        return "nuevo, sin clusters previos en la zona"
+    previous = _period_label(row["periodo_predecesor"])
+    if estado == "creciente":
+        area = fmt_series(pd.Series([row["crecimiento_area_ha"]])).iloc[0]
+        return (f"en crecimiento respecto al {previous} "
+                f"({int(row['crecimiento_alertas']):+d} alertas, +{area} ha de extensión)")
+    if estado == "persistente":
+        return f"presente también en el {previous}, sin crecimiento relevante"
+    return f"reaparece en una zona con clusters en el {previous}"
+
+# Sistema de confianza → prefijo de los conteos del reporte y niveles que se muestran
+SUMMARY_FIELDS = {
+    "gfw_integrated_alerts__confidence": ("GFW", {"NOMINAL": "nominal", "ALTO": "high", "MUY_ALTO": "highest"}),
+    "umd_glad_landsat_alerts__confidence": ("GLADL", {"NOMINAL": "nominal", "ALTO": "high", "NO_DET": "not_detected"}),
+    "umd_glad_sentinel2_alerts__confidence": ("GLADS", {"NOMINAL": "nominal", "ALTO": "high", "NO_DET": "not_detected"}),
+    "wur_radd_alerts__confidence": ("RADD", {"NOMINAL": "nominal", "ALTO": "high", "NO_DET": "not_detected"}),
+}
+
+def summary_fields(summary) -> dict:
+    """
+    Conteos por sistema y nivel del reporte (GFW_NOMINAL, ..., RADD_TOTAL) a partir del
+    resumen de `summary_from_cube`. Los sistemas o niveles ausentes cuentan 0.
+    """
+    fields = {}
+    for system, (prefix, levels) in SUMMARY_FIELDS.items():
+        counts = summary.get(system, {})
+        for suffix, level in levels.items():
+            fields[f"{prefix}_{suffix}"] = counts.get(level, 0)
+        fields[f"{prefix}_TOTAL"] = counts.get("total", 0)
+    return fields
+
+def encode_map_views(views: dict) -> str:
+    """
+    Vistas de mapas del modo lazy como JSON para incrustar en <script>
+    ("</" se escapa para no cerrar la etiqueta).
+    """
+    return json.dumps(views, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
 
 def build_report_json(
     summary,
@@ -21,32 +103,31 @@ def build_report_json(
     ruta_footer_img,
     ruta_mapa_alertas,
     output_path,
-    sentinel_results=None
+    sentinel_results=None,
+    render_mode="iframe",
+    vista_general=None,
+    seguimiento=None,
+    base_folder=None
 ):
     """
     Construye un JSON consolidado con alertas, clusters y mapas enriquecidos.
     Formatea los valores numéricos con coma decimal y punto de miles (estilo español),
     elimina el doble %, y omite valores vacíos (None).
+
+    Con `render_mode="lazy"` los mapas no son páginas folium: `vista_general` (de
+    `alerts_map_view`) y la "vista" de cada elemento de `sentinel_results` (de
+    `cluster_map_view`, con su "miniatura" opcional) se guardan en VISTAS_MAPAS.
+
+    `seguimiento` (DataFrame por cluster_id, de `src.cluster_history.update_cluster_history`)
+    agrega a cada cluster su id estable y su estado respecto a periodos anteriores.
+
+    Las rutas se guardan relativas a `base_folder` (por defecto, la carpeta de `output_path`).
+    Con `output_path=None` solo se retorna el diccionario, sin guardarlo.
     """
-    base_folder = os.path.dirname(output_path)
-
-    # === Función auxiliar para formatear números ===
-    def fmt(value):
-        """
-        Formatea números con coma decimal y punto de miles.
-        Si el valor no es numérico o es NaN, devuelve None.
-        """
-        if value is None:
-            return None
-        try:
-            if isinstance(value, (float, int)):
-                val = round(float(value), 1)
-                formatted = f"{val:,.1f}".replace(",", "X").replace(".", ",").replace("X", ".")
-                return formatted
-            else:
-                return None
-        except Exception:
-            return None
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"render_mode inválido: {render_mode}. Usa {RENDER_MODES}.")
+    lazy = render_mode == "lazy"
+    base_folder = base_folder or os.path.dirname(output_path)
 
     # === Base del reporte ===
     report_data = {
@@ -55,27 +136,8 @@ def build_report_json(
         "HEADER_IMG1": os.path.relpath(ruta_header_img1, base_folder),
         "HEADER_IMG2": os.path.relpath(ruta_header_img2, base_folder),
         "FOOTER_IMG": os.path.relpath(ruta_footer_img, base_folder),
-        "MAPA_ALERTAS": os.path.relpath(ruta_mapa_alertas, base_folder),
-        # GFW
-        "GFW_NOMINAL": summary["gfw_integrated_alerts__confidence"].get("nominal", 0),
-        "GFW_ALTO": summary["gfw_integrated_alerts__confidence"].get("high", 0),
-        "GFW_MUY_ALTO": summary["gfw_integrated_alerts__confidence"].get("highest", 0),
-        "GFW_TOTAL": summary["gfw_integrated_alerts__confidence"].get("total", 0),
-        # GLAD Landsat
-        "GLADL_NOMINAL": summary["umd_glad_landsat_alerts__confidence"].get("nominal", 0),
-        "GLADL_ALTO": summary["umd_glad_landsat_alerts__confidence"].get("high", 0),
-        "GLADL_NO_DET": summary["umd_glad_landsat_alerts__confidence"].get("not_detected", 0),
-        "GLADL_TOTAL": summary["umd_glad_landsat_alerts__confidence"].get("total", 0),
-        # GLAD Sentinel
-        "GLADS_NOMINAL": summary["umd_glad_sentinel2_alerts__confidence"].get("nominal", 0),
-        "GLADS_ALTO": summary["umd_glad_sentinel2_alerts__confidence"].get("high", 0),
-        "GLADS_NO_DET": summary["umd_glad_sentinel2_alerts__confidence"].get("not_detected", 0),
-        "GLADS_TOTAL": summary["umd_glad_sentinel2_alerts__confidence"].get("total", 0),
-        # WUR RADD
-        "RADD_NOMINAL": summary["wur_radd_alerts__confidence"].get("nominal", 0),
-        "RADD_ALTO": summary["wur_radd_alerts__confidence"].get("high", 0),
-        "RADD_NO_DET": summary["wur_radd_alerts__confidence"].get("not_detected", 0),
-        "RADD_TOTAL": summary["wur_radd_alerts__confidence"].get("total", 0),
+        "MAPA_ALERTAS": os.path.relpath(ruta_mapa_alertas, base_folder) if ruta_mapa_alertas else "",
+        **summary_fields(summary),
         "METODOLOGIA": """
         <section class="metodologia">
             <h2>Metodología</h2>
@@ -90,33 +152,35 @@ def build_report_json(
     # === Relación entre clusters y observaciones ===
     obs_lookup = {}
     map_lookup = {}
+    view_lookup = {}
+    thumb_lookup = {}
     if sentinel_results:
         obs_lookup = {res["cluster_id"]: res.get("obs", None) for res in sentinel_results}
-        map_lookup = {res["cluster_id"]: res["map_html"] for res in sentinel_results}
-
-    # === Construir secciones ===
-    for _, row in alerts_with_clusters.drop_duplicates("cluster_id").iterrows():
-        cid = int(row["cluster_id"])
-        centroid = row.geometry.centroid
-
-        cluster_info = {
-            "cluster_id": cid,
-            "municipio": row.get("NOMB_MPIO", ""),
-            "vereda": row.get("NOMBRE_VER", ""),
-            "densidad_poblacional": fmt(row.get("pobdens20")),
-            "pib_m2": fmt(row.get("gdp_20_m2p")),
-            "mercado_acceso": fmt(row.get("acss_mrkt")),
-            "elevacion": fmt(row.get("elevation")),
-            "ind_priv": fmt(row.get("dprivt")),
-            "energia_pct": fmt(row.get("ENRG_PERC")),
-            "acueducto_pct": fmt(row.get("ACUED_PERC")),
-            "alcantarillado_pct": fmt(row.get("ALCLT_PERC")),
-            "gas_pct": fmt(row.get("GAS_PERC")),
-            "basura_pct": fmt(row.get("BASUR_PERC")),
-            "internet_pct": fmt(row.get("INTER_PERC")),
-            "lat": round(centroid.y, 6),
-            "lon": round(centroid.x, 6),
-        }
+        map_lookup = {res["cluster_id"]: res["map_html"] for res in sentinel_results if res.get("map_html")}
+        view_lookup = {res["cluster_id"]: res["vista"] for res in sentinel_results if res.get("vista")}
+        thumb_lookup = {res["cluster_id"]: res["miniatura"] for res in sentinel_results if res.get("miniatura")}
+
+    # === Construir secciones (un resumen por cluster) ===
+    clusters = summarize_clusters(alerts_with_clusters)
+    sections = pd.DataFrame(index=clusters.index)
+    sections["cluster_id"] = clusters.index.astype(int)
+    sections["municipio"] = clusters.get("NOMB_MPIO", pd.Series("", index=clusters.index)).fillna("")
+    sections["vereda"] = clusters.get("NOMBRE_VER", pd.Series("", index=clusters.index)).fillna("")
+    sections["n_alertas"] = clusters["n_alertas"].astype(int)
+    if "fecha_inicio" in clusters.columns:
+        sections["fecha_inicio"] = clusters["fecha_inicio"].dt.strftime("%Y-%m-%d")
+        sections["fecha_fin"] = clusters["fecha_fin"].dt.strftime("%Y-%m-%d")
+    for field, column in CLUSTER_FIELDS.items():
+        sections[field] = fmt_series(clusters[column]) if column in clusters.columns else None
+    sections["lat"] = clusters["lat"]
+    sections["lon"] = clusters["lon"]
+
+    for cluster_info in sections.astype(object).where(sections.notna(), None).to_dict("records"):
+        cid = cluster_info["cluster_id"]
+
+        # El rango solo se muestra si hay fechas (sin columna de fecha quedaría "(del  al )")
+        start, end = cluster_info.get("fecha_inicio"), cluster_info.get("fecha_fin")
+        cluster_info["RANGO_FECHAS"] = [{"fecha_inicio": start, "fecha_fin": end}] if start and end else []
 
         obs = obs_lookup.get(cid)
         if obs:
@@ -126,27 +190,40 @@ def build_report_json(
         if map_path:
             cluster_info["mapa_sentinel"] = os.path.relpath(map_path, base_folder)
 
+        if lazy:
+            cluster_info["vista"] = f"cluster-{cid}"
+            thumb_path = thumb_lookup.get(cid)
+            cluster_info["MINIATURA"] = [{"src": os.path.relpath(thumb_path, base_folder)}] if thumb_path else []
+
+        cluster_info["SEGUIMIENTO"] = []
+        if seguimiento is not None and cid in seguimiento.index:
+            row = seguimiento.loc[cid]
+            cluster_info["SEGUIMIENTO"] = [{
+                "id_estable": int(row["id_estable"]),
+                "estado": row["estado"],
+                "detalle": tracking_detail(row),
+            }]
+
         report_data["SECCIONES_MUY_ALTO"].append(cluster_info)
 
+    if lazy:
+        views = {f"cluster-{cid}": view for cid, view in view_lookup.items()}
+        if vista_general is not None:
+            views["general"] = vista_general
+        report_data["MAPAS_LAZY"] = [{}]
+        report_data["VISTAS_MAPAS"] = encode_map_views(views)
+
     # === Guardar JSON ===
+    if output_path is None:
+        return report_data
     # If output_path is a GCS URI (gs://bucket/path/to/file.json) upload to the bucket,
     # otherwise save locally as before.
     if isinstance(output_path, str) and output_path.startswith("gs://"):
         # prepare JSON string (preserve utf-8)
         json_str = json.dumps(report_data, indent=2, ensure_ascii=False)
 
-        # parse bucket and blob path
-        _prefix, rest = output_path.split("gs://", 1)
-        parts = rest.split("/", 1)
-        bucket_name = parts[0]
-        blob_path = parts[1] if len(parts) > 1 else ""
-
         # upload using google-cloud-storage client (uses GOOGLE_APPLICATION_CREDENTIALS)
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-
-        blob.upload_from_string(json_str.encode("utf-8"), content_type="application/json")
+        write_gcs_bytes(output_path, json_str.encode("utf-8"), content_type="application/json")
         print(f"✅ JSON final subido a: {output_path}")
     else:
         with open(output_path, "w", encoding="utf-8") as f:
@@ -1,11 +1,20 @@
-import requests
+import base64
 import json
-from typing import List, Dict
+import os
+import time
+import warnings
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
 import geopandas as gpd
 import pandas as pd
 from shapely.geometry import box
-import matplotlib.pyplot as plt
-import contextily as ctx
+
+from src.cassettes import cassette
+from src.instrumentation import external_call
 
 
 ALERT_COLUMNS = [
@@ -15,6 +24,36 @@ ALERT_COLUMNS = [
     "wur_radd_alerts__confidence"
 ]
 
+DATE_COLUMN = "gfw_integrated_alerts__date"
+# Niveles de confianza en orden creciente (permite filtros como `>= "high"`)
+CONFIDENCE_LEVELS = ["not_detected", "nominal", "high", "highest"]
+CONFIDENCE_DTYPE = pd.CategoricalDtype(CONFIDENCE_LEVELS, ordered=True)
+# Esquema de carga del CSV: confianzas categóricas (1 byte por valor en lugar de un str)
+ALERT_DTYPES = {
+    "longitude": "float64",
+    "latitude": "float64",
+    **{column: CONFIDENCE_DTYPE for column in ALERT_COLUMNS},
+}
+# Filas por bloque al cargar el CSV (`csv_to_geodataframe(chunksize=...)` en main.py)
+CSV_CHUNK_ROWS = 500_000
+# Columnas que siempre se piden a la API (ubicación y fecha de cada alerta)
+BASE_DOWNLOAD_COLUMNS = ["longitude", "latitude", DATE_COLUMN]
+
+GFW_API_URL = "https://data-api.globalforestwatch.org"
+# Caché local de token y API key (archivo con permisos 0600); la variable de entorno
+# GFW_CACHE_PATH la reubica (se lee al crear el cliente, no al importar)
+GFW_CACHE_ENV = "GFW_CACHE_PATH"
+GFW_DEFAULT_CACHE_PATH = os.path.join("~", ".cache", "simbyp", "gfw_credenciales.json")
+GFW_TIMEOUT = (10, 300)  # (conexión, lectura) en segundos; la descarga CSV puede tardar
+GFW_MAX_ATTEMPTS = 5
+GFW_RETRY_STATUS = {429, 500, 502, 503, 504}
+GFW_AUTH_STATUS = {401, 403}  # credencial rechazada: se descarta de la caché y se renueva una vez
+GFW_MAX_RETRY_AFTER_S = 120  # tope para esperar lo que pida un Retry-After
+GFW_EXPIRY_MARGIN_S = 300  # se renuevan las credenciales 5 minutos antes de expirar
+GFW_API_KEY_TTL_S = 30 * 24 * 3600  # vigencia asumida de una API key sin `expires_on`
+
+_DEFAULT_CACHE = object()
+
 def get_start_end_dates(trimestre: str, anio: str):
     """Devuelve start_date y end_date a partir del trimestre (I–IV) y el año"""
     if trimestre == "I":
@@ -29,6 +68,325 @@ def get_start_end_dates(trimestre: str, anio: str):
         raise ValueError("Trimestre inválido. Usa 'I', 'II', 'III' o 'IV'.")
     return start, end
 
+class _RetryableStatus(requests.HTTPError):
+    """
+    Respuesta HTTP transitoria (429 / 5xx) que se debe reintentar.
+    """
+
+
+def default_cache_path() -> str:
+    return os.path.expanduser(os.getenv(GFW_CACHE_ENV) or GFW_DEFAULT_CACHE_PATH)
+
+
+def _retry_after_seconds(response) -> Optional[float]:
+    """
+    Segundos pedidos por el encabezado Retry-After (número o fecha HTTP), con tope
+    GFW_MAX_RETRY_AFTER_S; None si no viene o no se puede leer.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), GFW_MAX_RETRY_AFTER_S)
+
+
+def _not_sent(exc: BaseException) -> bool:
+    """
+    True si la solicitud falló antes de enviarse (no se pudo conectar): reintentarla es
+    seguro aunque la operación no sea idempotente.
+    """
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if isinstance(exc, requests.ConnectionError) and exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class GFWClient:
+    """
+    Cliente de la API de datos de GFW.
+
+    - Reutiliza una sesión HTTP con pool de conexiones y aplica timeouts a cada solicitud.
+    - Reintenta fallas transitorias (conexión, timeout, 429, 5xx) con backoff exponencial y jitter,
+      o lo que indique Retry-After. La creación de la API key no es idempotente: solo se
+      reintenta si la solicitud no llegó a enviarse (o con 429).
+    - Guarda el token y la API key en disco (`cache_path`) y los reutiliza mientras no expiren,
+      evitando autenticarse y crear una API key nueva en cada corrida. Si GFW rechaza una
+      credencial (401/403), se descarta de la caché y se pide otra una vez.
+    - Registra la latencia de cada solicitud (`latency_metrics`).
+
+    Parámetros:
+    - username, password (str, opcional): Credenciales GFW (solo si hay que pedir un token).
+    - alias, email, organization (str, opcional): Datos para solicitar la API key.
+    - token, api_key (str, opcional): Credenciales ya obtenidas; se usan sin consultar la caché.
+    - cache_path (str, opcional): Archivo JSON de caché de credenciales. Por defecto
+      `$GFW_CACHE_PATH` o ~/.cache/simbyp/gfw_credenciales.json; None desactiva la caché.
+    """
+
+    def __init__(
+        self,
+        username: str = None,
+        password: str = None,
+        alias: str = None,
+        email: str = None,
+        organization: str = "",
+        token: str = None,
+        api_key: str = None,
+        cache_path: Optional[str] = _DEFAULT_CACHE,
+        timeout=GFW_TIMEOUT,
+        max_attempts: int = GFW_MAX_ATTEMPTS,
+    ):
+        self.username = username
+        self.password = password
+        self.alias = alias
+        self.email = email
+        self.organization = organization
+        self.token = token
+        self.api_key = api_key
+        self.cache_path = default_cache_path() if cache_path is _DEFAULT_CACHE else cache_path
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.latencies = []
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # === HTTP ===
+    def _post(self, operation: str, path: str, idempotent: bool = True, **kwargs) -> requests.Response:
+        from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+        backoff = wait_random_exponential(multiplier=1, max=30)
+
+        def should_retry(exc):
+            if isinstance(exc, _RetryableStatus):
+                return idempotent or exc.response.status_code == 429
+            if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+                return idempotent or _not_sent(exc)
+            return False
+
+        def wait(retry_state):
+            exc = retry_state.outcome.exception()
+            delay = _retry_after_seconds(exc.response) if isinstance(exc, _RetryableStatus) else None
+            return backoff(retry_state) if delay is None else delay
+
+        @retry(
+            retry=retry_if_exception(should_retry),
+            wait=wait,
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=True,
+        )
+        def attempt():
+            t0 = time.perf_counter()
+            with external_call("gfw", operation) as call:
+                response = self.session.post(f"{GFW_API_URL}{path}", timeout=self.timeout, **kwargs)
+                call["bytes"] = len(response.content)
+            self.latencies.append({
+                "operacion": operation,
+                "latencia_s": round(time.perf_counter() - t0, 4),
+                "status": response.status_code,
+            })
+            if response.status_code in GFW_RETRY_STATUS:
+                raise _RetryableStatus(f"{response.status_code} en {path}", response=response)
+            response.raise_for_status()
+            return response
+
+        return attempt()
+
+    def _authorized(self, request, forget):
+        """
+        Ejecuta `request()`; si GFW rechaza la credencial (401/403), `forget()` la descarta
+        (memoria y caché) y se repite una vez con una credencial nueva.
+        """
+        try:
+            return request()
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in GFW_AUTH_STATUS:
+                raise
+            print(f"🔑 GFW rechazó la credencial ({status}): se descarta de la caché y se renueva")
+            forget()
+            return request()
+
+    def latency_metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Resumen de latencias por operación: solicitudes, media, máxima y total (segundos).
+        """
+        summary = {}
+        for item in self.latencies:
+            op = summary.setdefault(item["operacion"], {"solicitudes": 0, "total_s": 0.0, "max_s": 0.0})
+            op["solicitudes"] += 1
+            op["total_s"] = round(op["total_s"] + item["latencia_s"], 4)
+            op["max_s"] = max(op["max_s"], item["latencia_s"])
+        for op in summary.values():
+            op["media_s"] = round(op["total_s"] / op["solicitudes"], 4)
+        return summary
+
+    # === Caché de credenciales ===
+    def _load_cache(self) -> dict:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update_cache(self, key: str, value: Optional[str], expires_at: Optional[float]):
+        # Sin fecha de expiración conocida no se guarda nada; value=None borra la entrada
+        if not self.cache_path or (value is not None and not expires_at):
+            return
+        cache = self._load_cache()
+        if value is None:
+            if cache.pop(key, None) is None:
+                return
+        else:
+            cache[key] = {"value": value, "expires_at": expires_at}
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _cached(self, key: str) -> Optional[str]:
+        entry = self._load_cache().get(key)
+        if entry and entry.get("expires_at", 0) - GFW_EXPIRY_MARGIN_S > time.time():
+            return entry["value"]
+        return None
+
+    # === Autenticación ===
+    def _token_cache_key(self):
+        return f"token:{self.username}"
+
+    def _api_key_cache_key(self):
+        return f"api_key:{self.username}:{self.alias}"
+
+    def forget_token(self):
+        self.token = None
+        self._update_cache(self._token_cache_key(), None, None)
+
+    def forget_api_key(self):
+        self.api_key = None
+        self._update_cache(self._api_key_cache_key(), None, None)
+
+    def get_token(self) -> str:
+        """
+        Token Bearer vigente: en memoria, en caché o solicitado a /auth/token.
+        """
+        if self.token:
+            return self.token
+        cache_key = self._token_cache_key()
+        self.token = self._cached(cache_key)
+        if self.token:
+            return self.token
+
+        def fetch():
+            response = self._post(
+                "auth_token", "/auth/token",
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                data={"username": self.username, "password": self.password},
+            )
+            return response.json()['data']['access_token']
+
+        self.token = cassette("gfw", "auth_token", {"username": self.username}, fetch)
+        self._update_cache(cache_key, self.token, _jwt_expiry(self.token))
+        return self.token
+
+    def get_api_key(self) -> str:
+        """
+        API key vigente: en memoria, en caché o creada en /auth/apikey (requiere token).
+        """
+        if self.api_key:
+            return self.api_key
+        cache_key = self._api_key_cache_key()
+        self.api_key = self._cached(cache_key)
+        if self.api_key:
+            return self.api_key
+
+        payload = {
+            "alias": self.alias,
+            "email": self.email,
+            "organization": self.organization,
+            "domains": []
+        }
+
+        def fetch():
+            response = self._authorized(
+                lambda: self._post(
+                    "auth_apikey", "/auth/apikey", idempotent=False,
+                    headers={"Authorization": f"Bearer {self.get_token()}", "Content-Type": "application/json"},
+                    data=json.dumps(payload),
+                ),
+                forget=self.forget_token,
+            )
+            body = response.json()
+            data = body.get("data") if isinstance(body.get("data"), dict) else body
+            return {
+                "key": body.get("key") or data.get("api_key") or data.get("key"),
+                "expires_on": data.get("expires_on"),
+            }
+
+        result = cassette("gfw", "auth_apikey", payload, fetch)
+        self.api_key = result["key"]
+        # Sin `expires_on` se asume una vigencia; si GFW la rechaza antes, se renueva (401/403)
+        expires_at = _iso_to_timestamp(result.get("expires_on")) or time.time() + GFW_API_KEY_TTL_S
+        self._update_cache(cache_key, self.api_key, expires_at)
+        return self.api_key
+
+    # === Datos ===
+    def download_alerts(self, start_date: str, end_date: str, polygon,
+                        confidence=None, columns: Optional[List[str]] = None) -> bytes:
+        """
+        Descarga las alertas integradas en CSV (ver `download_alerts`).
+        """
+        payload = build_alerts_payload(start_date, end_date, polygon, confidence=confidence, columns=columns)
+
+        def fetch():
+            response = self._authorized(
+                lambda: self._post(
+                    "download_csv", "/dataset/gfw_integrated_alerts/latest/download/csv",
+                    headers={"x-api-key": self.get_api_key(), "Content-Type": "application/json"},
+                    json=payload,
+                ),
+                forget=self.forget_api_key,
+            )
+            return response.content
+
+        return cassette("gfw", "download_csv", payload, fetch, kind="bytes")
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    """
+    Fecha de expiración (epoch) del claim `exp` de un JWT, o None si no se puede leer.
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, ValueError, TypeError):
+        return None
+
+
+def _iso_to_timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
 def authenticate_gfw(username: str, password: str) -> str:
     """
     Autentica en la API de Global Forest Watch (GFW).
@@ -40,15 +398,7 @@ def authenticate_gfw(username: str, password: str) -> str:
     Retorna:
     - str: Token Bearer para autenticación en solicitudes posteriores.
     """
-    url = "https://data-api.globalforestwatch.org/auth/token"
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    payload = {"username": username, "password": password}
-
-    
-    response = requests.post(url, headers=headers, data=payload)
-    print(response.status_code)
-    response.raise_for_status()
-    return response.json()['data']['access_token']
+    return GFWClient(username=username, password=password, cache_path=None).get_token()
 
 
 def get_api_key(token: str, alias: str, email: str, organization: str = "") -> str:
@@ -64,20 +414,8 @@ def get_api_key(token: str, alias: str, email: str, organization: str = "") -> s
     Retorna:
     - str: API key para uso en endpoints protegidos.
     """
-    url = "https://data-api.globalforestwatch.org/auth/apikey"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "alias": alias,
-        "email": email,
-        "organization": organization,
-        "domains": []
-    }
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    #response.raise_for_status()
-    return response.json().get("key")
+    client = GFWClient(alias=alias, email=email, organization=organization, token=token, cache_path=None)
+    return client.get_api_key()
 
 
 def extract_polygon_from_file(filepath: str) -> List[List[float]]:
@@ -99,7 +437,66 @@ def extract_polygon_from_file(filepath: str) -> List[List[float]]:
     return [list(coord) for coord in coords]
 
 
-def download_alerts(api_key: str, start_date: str, end_date: str, polygon: List[List[float]]) -> bytes:
+def build_alerts_sql(start_date: str, end_date: str, confidence=None, columns: Optional[List[str]] = None) -> str:
+    """
+    Consulta SQL de descarga. El filtro de confianza y la selección de columnas se resuelven
+    en la API, de modo que solo viajan las alertas y columnas que se van a usar.
+
+    Parámetros:
+    - start_date, end_date (str): Rango de fechas 'YYYY-MM-DD' (inclusivo).
+    - confidence (str | List[str], opcional): Nivel(es) de `gfw_integrated_alerts__confidence`
+      a descargar. None descarga todos.
+    - columns (List[str], opcional): Columnas de confianza (de `ALERT_COLUMNS`) a incluir.
+      Longitud, latitud y fecha se piden siempre. None incluye todas.
+    """
+    # Solo se aceptan valores conocidos: se interpolan en el SQL
+    for date in (start_date, end_date):
+        datetime.strptime(date, "%Y-%m-%d")
+    if columns is None:
+        columns = ALERT_COLUMNS
+    unknown = [c for c in columns if c not in ALERT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Columnas no válidas: {unknown}. Usa columnas de {ALERT_COLUMNS}.")
+
+    sql = (
+        f"SELECT {', '.join(BASE_DOWNLOAD_COLUMNS + list(columns))} "
+        f"FROM results WHERE {DATE_COLUMN} >= '{start_date}' "
+        f"AND {DATE_COLUMN} <= '{end_date}'"
+    )
+
+    if confidence is not None:
+        levels = [confidence] if isinstance(confidence, str) else list(confidence)
+        unknown = [level for level in levels if level not in CONFIDENCE_LEVELS]
+        if unknown or not levels:
+            raise ValueError(f"Niveles de confianza no válidos: {unknown}. Usa {CONFIDENCE_LEVELS}.")
+        quoted = ", ".join(f"'{level}'" for level in levels)
+        sql += f" AND gfw_integrated_alerts__confidence IN ({quoted})"
+
+    return sql
+
+
+def build_alerts_payload(start_date: str, end_date: str, polygon,
+                         confidence=None, columns: Optional[List[str]] = None) -> dict:
+    """
+    Cuerpo de la solicitud de descarga: geometría del área y consulta SQL (ver `build_alerts_sql`).
+
+    `polygon` es un anillo [[lon, lat], ...] o una geometría GeoJSON (p. ej. de `src.aoi.prepare_aoi`).
+    """
+    if isinstance(polygon, dict):
+        geometry = polygon
+    else:
+        geometry = {
+            "type": "Polygon",
+            "coordinates": [polygon]  # debe estar cerrado (primer punto igual al último)
+        }
+    return {
+        "geometry": geometry,
+        "sql": build_alerts_sql(start_date, end_date, confidence=confidence, columns=columns)
+    }
+
+
+def download_alerts(api_key: str, start_date: str, end_date: str, polygon,
+                    confidence=None, columns: Optional[List[str]] = None) -> bytes:
     """
     Descarga datos de alertas GFW (alertas integradas) en formato CSV.
 
@@ -107,32 +504,16 @@ def download_alerts(api_key: str, start_date: str, end_date: str, polygon: List[
     - api_key (str): API key obtenida por `get_api_key()`.
     - start_date (str): Fecha de inicio en formato 'YYYY-MM-DD'.
     - end_date (str): Fecha de fin en formato 'YYYY-MM-DD'.
-    - polygon (List[List[float]]): Coordenadas [[lon, lat], ...] de un polígono cerrado, extraídas desde archivo.
+    - polygon (List[List[float]] | dict): Coordenadas [[lon, lat], ...] de un polígono cerrado, extraídas
+      desde archivo, o geometría GeoJSON (Polygon / MultiPolygon) preparada con `src.aoi.prepare_aoi`.
+    - confidence (str | List[str], opcional): Solo descarga estos niveles de la alerta integrada.
+    - columns (List[str], opcional): Columnas de confianza a descargar (por defecto todas).
 
     Retorna:
     - bytes: Contenido del CSV (se puede guardar con `save_to_csv`).
     """
-    url = "https://data-api.globalforestwatch.org/dataset/gfw_integrated_alerts/latest/download/csv"
-    headers = {
-        "x-api-key": api_key,
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "geometry": {
-            "type": "Polygon",
-            "coordinates": [polygon]  # debe estar cerrado (primer punto igual al último)
-        },
-        "sql": (
-            "SELECT longitude, latitude, gfw_integrated_alerts__date, "
-            "gfw_integrated_alerts__confidence, umd_glad_landsat_alerts__confidence, "
-            "umd_glad_sentinel2_alerts__confidence, wur_radd_alerts__confidence "
-            f"FROM results WHERE gfw_integrated_alerts__date >= '{start_date}' "
-            f"AND gfw_integrated_alerts__date <= '{end_date}'"
-        )
-    }
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    return response.content
+    client = GFWClient(api_key=api_key, cache_path=None)
+    return client.download_alerts(start_date, end_date, polygon, confidence=confidence, columns=columns)
 
 
 def save_to_csv(data: bytes, filename: str):
@@ -146,20 +527,118 @@ def save_to_csv(data: bytes, filename: str):
     with open(filename, 'wb') as f:
         f.write(data)
 
-def csv_to_geodataframe(csv_path: str) -> gpd.GeoDataFrame:
-    df = pd.read_csv(csv_path)
+def to_confidence(values: pd.Series, column: str = None) -> pd.Series:
+    """
+    Convierte una columna de confianza a `CONFIDENCE_DTYPE`. Los niveles desconocidos
+    quedan como NaN y se avisa (UserWarning) cuántos y cuáles eran.
+    """
+    values = values.astype("category")
+    unknown = values.cat.categories.difference(CONFIDENCE_LEVELS)
+    if len(unknown):
+        n_unknown = int(values.isin(unknown).sum())
+        warnings.warn(
+            f"⚠️ {n_unknown} alertas con nivel de confianza desconocido en {column or values.name}: "
+            f"{list(unknown)} (quedan como NaN).", UserWarning
+        )
+        values = values.cat.remove_categories(unknown)
+    return values.astype(CONFIDENCE_DTYPE)
+
+def apply_alert_schema(df: pd.DataFrame, float32_coords: bool = False) -> pd.DataFrame:
+    """
+    Aplica el esquema tipado de alertas a un DataFrame ya cargado (p. ej. leído desde GeoJSON):
+    confianzas categóricas, fecha como datetime y, opcionalmente, coordenadas float32.
+    Niveles de confianza desconocidos quedan como NaN (con aviso, ver `to_confidence`).
+    """
+    for column in ALERT_COLUMNS:
+        if column in df.columns:
+            df[column] = to_confidence(df[column], column)
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], errors="coerce")
+    if float32_coords:
+        for column in ("longitude", "latitude"):
+            if column in df.columns:
+                df[column] = df[column].astype("float32")
+    return df
+
+def _typed_alert_chunk(df: pd.DataFrame, row_filter=None, aoi=None) -> gpd.GeoDataFrame:
+    """
+    Tipa un bloque del CSV (confianzas validadas, geometría) y aplica el filtro de filas
+    y el recorte al AOI, para que solo las alertas que se conservan sigan en memoria.
+    """
+    for column in ALERT_COLUMNS:
+        if column in df.columns:
+            df[column] = to_confidence(df[column], column)
+    if row_filter is not None:
+        df = df[row_filter(df)]
     gdf = gpd.GeoDataFrame(
         df,
         geometry=gpd.points_from_xy(df["longitude"], df["latitude"]),
         crs="EPSG:4326"
     )
+    if aoi is not None:
+        from src.aoi import clip_alerts_to_aoi
+
+        gdf = clip_alerts_to_aoi(gdf, aoi)
+    return gdf
+
+
+def _concat_alert_chunks(chunks: List[gpd.GeoDataFrame]) -> gpd.GeoDataFrame:
+    """
+    Une los bloques conservando las columnas categóricas (union_categoricals). El índice
+    de cada bloque ya es el número de fila del CSV: el resultado es el de leerlo de una vez.
+    """
+    from pandas.api.types import union_categoricals
+
+    gdf = pd.concat(chunks)
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            gdf[column] = pd.Categorical(union_categoricals([chunk[column] for chunk in chunks]))
     return gdf
 
+
+def csv_to_geodataframe(csv_path: str, float32_coords: bool = False, chunksize: int = None,
+                        row_filter=None, aoi=None) -> gpd.GeoDataFrame:
+    """
+    Carga el CSV de alertas con el esquema tipado (ver `ALERT_DTYPES`).
+
+    Las confianzas se leen como categóricas y luego se validan contra `CONFIDENCE_LEVELS`
+    (un nivel desconocido se avisa en lugar de perderse en silencio).
+
+    Parámetros:
+    - csv_path (str): Ruta del CSV descargado.
+    - float32_coords (bool): Guarda longitude/latitude como float32 (~1 m de precisión).
+      La geometría siempre es float64.
+    - chunksize (int, opcional): Lee el CSV en bloques de este número de filas; cada bloque
+      se tipa, filtra y recorta antes de leer el siguiente, así que la memoria pico queda
+      acotada por un bloque más las alertas conservadas (para CSV muy grandes).
+    - row_filter (callable, opcional): Función DataFrame → máscara booleana de filas a conservar
+      (p. ej. `lambda df: df["gfw_integrated_alerts__confidence"] == "highest"`).
+    - aoi (geometría o GeoJSON, opcional): Conserva solo las alertas dentro del AOI
+      (ver `src.aoi.clip_alerts_to_aoi`).
+
+    Retorna:
+    - GeoDataFrame en EPSG:4326, indexado por el número de fila en el CSV.
+    """
+    # Categorías inferidas al leer (siguen ocupando 1 byte por valor); se validan después
+    dtypes = {column: "category" if column in ALERT_COLUMNS else dtype for column, dtype in ALERT_DTYPES.items()}
+    if float32_coords:
+        dtypes.update({"longitude": "float32", "latitude": "float32"})
+    read_options = dict(dtype=dtypes, parse_dates=[DATE_COLUMN], date_format="%Y-%m-%d")
+    if chunksize is None:
+        return _typed_alert_chunk(pd.read_csv(csv_path, **read_options), row_filter, aoi)
+
+    with pd.read_csv(csv_path, chunksize=chunksize, **read_options) as reader:
+        chunks = [_typed_alert_chunk(chunk, row_filter, aoi) for chunk in reader]
+    if not chunks:  # CSV sin filas
+        return _typed_alert_chunk(pd.read_csv(csv_path, **read_options), row_filter, aoi)
+    return _concat_alert_chunks(chunks)
+
 def summarize_alert_confidences(df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
     summary = {}
     for column in ALERT_COLUMNS:
         if column in df.columns:
-            counts = df[column].value_counts().to_dict()
+            counts = df[column].value_counts()
+            counts = counts[counts > 0].to_dict()  # las categorías sin alertas no se reportan
             column_summary = {str(level): count for level, count in counts.items()}
             column_summary["total"] = sum(counts.values())
             summary[column] = column_summary
@@ -1,11 +1,10 @@
-import ee
-import geemap
 import os
 
 from shapely.geometry import Polygon
 from datetime import datetime, timedelta
 
 def authenticate_gee(project):
+    import ee
     try:
         ee.Initialize(project=project)
     except Exception:
@@ -17,6 +16,9 @@ def download_sentinel_rgb_for_region(region_geom, start_date, end_date, output_p
     """
     Descarga imagen Sentinel-2 RGB para una región (Polygon) en fechas dadas.
     """
+    import ee
+    import geemap
+
     if isinstance(region_geom, Polygon):
         region = ee.Geometry.Polygon(list(region_geom.exterior.coords))
     else:
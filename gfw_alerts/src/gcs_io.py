@@ -0,0 +1,264 @@
+import asyncio
+import os
+import time
+from functools import lru_cache
+
+from src.cassettes import cassette, is_replay
+from src.instrumentation import external_call, stage
+
+# Subidas simultáneas de `IncrementalUploader`
+UPLOAD_CONCURRENCY = 8
+# Ciclos leer-modificar-escribir de `update_gcs_file` antes de rendirse ante escrituras concurrentes
+UPDATE_ATTEMPTS = 5
+
+
+def split_gcs_path(gcs_path: str):
+    """
+    Separa 'gs://bucket/ruta/al/blob' en (bucket, ruta/al/blob).
+    """
+    _, rest = gcs_path.split("gs://", 1)
+    parts = rest.split("/", 1)
+    return parts[0], parts[1] if len(parts) > 1 else ""
+
+
+@lru_cache(maxsize=1)
+def _client():
+    # usa GOOGLE_APPLICATION_CREDENTIALS; un solo cliente (y pool de conexiones) por proceso
+    from google.cloud import storage
+    return storage.Client()
+
+
+def _blob(gcs_path: str):
+    bucket_name, blob_path = split_gcs_path(gcs_path)
+    return _client().bucket(bucket_name).blob(blob_path)
+
+
+def read_gcs_bytes(gcs_path: str, generation: int = None) -> bytes:
+    """
+    Lee un blob de GCS (reproducible con cassettes). Con `generation`, falla si el blob
+    cambió desde que se consultó esa generación.
+    """
+    def fetch():
+        with external_call("gcs", "download") as call:
+            data = _blob(gcs_path).download_as_bytes(if_generation_match=generation)
+            call["bytes"] = len(data)
+        return data
+
+    return cassette("gcs", "download", gcs_path, fetch, kind="bytes")
+
+
+def gcs_exists(gcs_path: str) -> bool:
+    """
+    True si el blob existe en GCS (reproducible con cassettes).
+    """
+    def fetch():
+        with external_call("gcs", "exists"):
+            return _blob(gcs_path).exists()
+
+    return cassette("gcs", "exists", gcs_path, fetch)
+
+
+def gcs_generation(gcs_path: str) -> int:
+    """
+    Generación actual del blob, 0 si no existe (reproducible con cassettes).
+    """
+    def fetch():
+        bucket_name, blob_path = split_gcs_path(gcs_path)
+        with external_call("gcs", "exists"):
+            blob = _client().bucket(bucket_name).get_blob(blob_path)
+        return blob.generation if blob is not None else 0
+
+    return cassette("gcs", "generation", gcs_path, fetch)
+
+
+def gcs_md5(gcs_path: str):
+    """
+    MD5 (base64, como lo reporta GCS) del blob; None si no existe (reproducible con cassettes).
+    """
+    def fetch():
+        bucket_name, blob_path = split_gcs_path(gcs_path)
+        with external_call("gcs", "exists"):
+            blob = _client().bucket(bucket_name).get_blob(blob_path)
+        return blob.md5_hash if blob is not None else None
+
+    return cassette("gcs", "md5", gcs_path, fetch)
+
+
+def download_gcs_to_local(gcs_path: str, local_path: str):
+    with open(local_path, "wb") as f:
+        f.write(read_gcs_bytes(gcs_path))
+
+
+def write_gcs_bytes(gcs_path: str, data: bytes, content_type: str = None):
+    """
+    Escribe un blob en GCS. En modo replay no se escribe nada (ejecución sin red).
+    """
+    if is_replay():
+        print(f"⏭️ (replay) Omitida escritura en {gcs_path}")
+        return
+    with external_call("gcs", "upload") as call:
+        _blob(gcs_path).upload_from_string(data, content_type=content_type)
+        call["bytes"] = len(data)
+
+
+def upload_file_to_gcs(local_path: str, gcs_path: str):
+    if is_replay():
+        print(f"⏭️ (replay) Omitida subida de {local_path} a {gcs_path}")
+        return
+    with external_call("gcs", "upload") as call:
+        _blob(gcs_path).upload_from_filename(local_path)
+        call["bytes"] = os.path.getsize(local_path)
+    print(f"✅ Subido {local_path} a {gcs_path}")
+
+
+def update_gcs_file(gcs_path: str, local_path: str, update, max_attempts: int = UPDATE_ATTEMPTS):
+    """
+    Actualiza un archivo compartido en GCS sin perder escrituras concurrentes: descarga el
+    blob (si existe) a `local_path`, llama a `update()` y sube el archivo solo si el blob
+    no cambió desde la descarga (precondición de generación). Si otra corrida lo modificó
+    entretanto, repite el ciclo con la versión nueva.
+
+    Parámetros:
+    - update (callable): Función sin argumentos que modifica `local_path`.
+
+    Retorna:
+    - El resultado de la última llamada a `update()`.
+    """
+    from google.api_core.exceptions import PreconditionFailed
+
+    for attempt in range(1, max_attempts + 1):
+        generation = gcs_generation(gcs_path)
+        try:
+            if generation:
+                with open(local_path, "wb") as f:
+                    f.write(read_gcs_bytes(gcs_path, generation=generation))
+            result = update()
+            if is_replay():
+                print(f"⏭️ (replay) Omitida subida de {local_path} a {gcs_path}")
+                return result
+            with external_call("gcs", "upload") as call:
+                # 0: el blob no debe existir todavía
+                _blob(gcs_path).upload_from_filename(local_path, if_generation_match=generation)
+                call["bytes"] = os.path.getsize(local_path)
+        except PreconditionFailed:
+            if attempt == max_attempts:
+                raise
+            print(f"⚠️ {gcs_path} cambió durante la actualización; reintentando ({attempt}/{max_attempts})")
+            continue
+        print(f"✅ Subido {local_path} a {gcs_path}")
+        return result
+
+
+def upload_folder_to_gcs(local_folder: str, gcs_bucket: str, gcs_prefix: str):
+    for root, dirs, files in os.walk(local_folder):
+        for file in files:
+            local_path = os.path.join(root, file)
+            relative_path = os.path.relpath(local_path, local_folder)
+            gcs_path = os.path.join(gcs_prefix, relative_path).replace("\\", "/")
+            upload_file_to_gcs(local_path, f"gs://{gcs_bucket}/{gcs_path}")
+
+
+class IncrementalUploader:
+    """
+    Sube a GCS los artefactos de una carpeta a medida que se terminan, en segundo plano,
+    mientras el pipeline sigue con otras etapas. Cada archivo se sube una sola vez.
+
+    Uso (dentro de un bucle asyncio):
+        uploader = IncrementalUploader(carpeta, bucket, prefijo).start()
+        uploader.submit(ruta_archivo_o_carpeta)
+        await uploader.finish()   # sube lo que falte de la carpeta y espera
+
+    Cada subida se registra como llamada externa (gcs/upload). La etapa "subida" mide solo
+    la espera final de `finish()` (lo que las subidas retrasan el pipeline) y anota el total
+    de archivos, bytes y segundos dentro de transferencias (`tiempo_transferencia_s`).
+    """
+
+    def __init__(self, local_folder: str, gcs_bucket: str, gcs_prefix: str, concurrency: int = UPLOAD_CONCURRENCY):
+        self.local_folder = local_folder
+        self.gcs_bucket = gcs_bucket
+        self.gcs_prefix = gcs_prefix
+        self.concurrency = concurrency
+        self.uploaded = set()
+        self.transferred = {"archivos": 0, "bytes": 0, "tiempo_s": 0.0}
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        return self
+
+    def gcs_path(self, local_path: str) -> str:
+        relative_path = os.path.relpath(local_path, self.local_folder)
+        gcs_path = os.path.join(self.gcs_prefix, relative_path).replace("\\", "/")
+        return f"gs://{self.gcs_bucket}/{gcs_path}"
+
+    def submit(self, *paths):
+        """
+        Agrega archivos (o carpetas completas) a la cola de subida. Debe llamarse desde el bucle de eventos.
+        """
+        for path in paths:
+            if not path:
+                continue
+            path = str(path)
+            files = [path] if os.path.isfile(path) else [
+                os.path.join(root, file) for root, _, names in os.walk(path) for file in names
+            ]
+            for file_path in files:
+                key = os.path.abspath(file_path)
+                if key not in self.uploaded:
+                    self.uploaded.add(key)
+                    self._queue.put_nowait(file_path)
+
+    def mark_uploaded(self, *paths):
+        """
+        Registra archivos que ya están en GCS (subidos por otro proceso) para no subirlos de nuevo.
+        """
+        for path in paths:
+            if path:
+                self.uploaded.add(os.path.abspath(path))
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        pending = []
+
+        def transfer(local_path):
+            start = time.perf_counter()
+            upload_file_to_gcs(local_path, self.gcs_path(local_path))
+            return time.perf_counter() - start
+
+        async def upload(local_path):
+            try:
+                elapsed = await asyncio.to_thread(transfer, local_path)
+            finally:
+                slots.release()
+            # Los totales se actualizan en el bucle de eventos (un solo hilo)
+            self.transferred["archivos"] += 1
+            self.transferred["bytes"] += os.path.getsize(local_path)
+            self.transferred["tiempo_s"] += elapsed
+
+        while True:
+            local_path = await self._queue.get()
+            if local_path is None:
+                break
+            await slots.acquire()
+            pending.append(asyncio.create_task(upload(local_path)))
+        await asyncio.gather(*pending)
+
+    async def finish(self, exclude=()):
+        """
+        Encola los archivos de la carpeta que aún no se subieron (salvo `exclude`) y espera
+        a que terminen todas las subidas.
+        """
+        with stage("subida", profile=False) as record:
+            excluded = {os.path.abspath(p) for p in exclude}
+            for root, _, names in os.walk(self.local_folder):
+                for name in names:
+                    file_path = os.path.join(root, name)
+                    if os.path.abspath(file_path) not in excluded:
+                        self.submit(file_path)
+            self._queue.put_nowait(None)
+            await self._worker
+            record["filas_salida"] = self.transferred["archivos"]
+            record["bytes_transferidos"] = self.transferred["bytes"]
+            record["tiempo_transferencia_s"] = round(self.transferred["tiempo_s"], 4)
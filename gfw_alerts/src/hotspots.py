@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import CRS
+from typing import Optional
+
+
+DATE_COLUMN = "gfw_integrated_alerts__date"
+CONFIDENCE_COLUMN = "gfw_integrated_alerts__confidence"
+
+# Celda más fina (nivel 0) en metros; cada nivel duplica el lado de la celda
+BASE_CELL_M = 250
+N_LEVELS = 5
+
+
+def build_hotspot_index(
+    alerts_gdf: gpd.GeoDataFrame,
+    base_cell_m: float = BASE_CELL_M,
+    levels: int = N_LEVELS,
+    freq: str = "M",
+    crs=None,
+) -> pd.DataFrame:
+    """
+    Indexa las alertas en una grilla cuadrada jerárquica (celdas anidadas).
+
+    La celda (ix, iy) del nivel k contiene exactamente a las celdas (2ix..2ix+1, 2iy..2iy+1)
+    del nivel k-1, de modo que subir de nivel es un corrimiento de bits sobre los índices.
+
+    Parámetros:
+    - alerts_gdf (GeoDataFrame): Alertas (puntos).
+    - base_cell_m (float): Lado de la celda del nivel 0, en metros.
+    - levels (int): Número de niveles a precalcular.
+    - freq (str): Granularidad temporal de los conteos ('D', 'W' o 'M').
+    - crs (opcional): CRS proyectado de la grilla. Por defecto, el UTM estimado de las alertas.
+
+    Retorna:
+    - pd.DataFrame: Columnas nivel, ix, iy, fecha, confianza, n_alertas. El CRS y el
+      tamaño base se guardan en `attrs` para reconstruir la geometría de las celdas.
+    """
+    crs = crs or alerts_gdf.estimate_utm_crs()
+    alerts_proj = alerts_gdf.to_crs(crs)
+
+    period = {"D": "D", "W": "W-SUN", "M": "M"}[freq]
+    cells = pd.DataFrame({
+        "ix": np.floor_divide(alerts_proj.geometry.x.to_numpy(), base_cell_m).astype("int64"),
+        "iy": np.floor_divide(alerts_proj.geometry.y.to_numpy(), base_cell_m).astype("int64"),
+        "fecha": pd.to_datetime(alerts_proj[DATE_COLUMN], errors="coerce").dt.to_period(period).dt.start_time.to_numpy(),
+        "confianza": alerts_proj[CONFIDENCE_COLUMN].astype("string").array,
+    })
+
+    finest = (
+        cells.groupby(["ix", "iy", "fecha", "confianza"], observed=True, dropna=False, sort=True)
+        .size()
+        .reset_index(name="n_alertas")
+    )
+    finest.insert(0, "nivel", 0)
+
+    index = pd.concat(
+        [finest] + [rollup_hotspots(finest, level) for level in range(1, levels)],
+        ignore_index=True,
+    )
+    index["nivel"] = index["nivel"].astype("int8")
+    index["n_alertas"] = index["n_alertas"].astype("int32")
+    index.attrs = {"crs": CRS.from_user_input(crs).to_string(), "base_cell_m": base_cell_m}
+    return index
+
+
+def check_hotspot_total(index: pd.DataFrame, n_alerts: int):
+    """
+    Verifica que cada nivel del índice cuente cada alerta una sola vez (total = `n_alerts`,
+    el número de alertas descargadas). Lanza ValueError si no.
+    """
+    totals = index.groupby("nivel", observed=True)["n_alertas"].sum()
+    wrong = totals[totals != n_alerts]
+    if len(wrong):
+        raise ValueError(
+            f"El índice de hotspots no cuadra con las {n_alerts} alertas descargadas: {wrong.astype(int).to_dict()}"
+        )
+
+
+def rollup_hotspots(index: pd.DataFrame, level: int) -> pd.DataFrame:
+    """
+    Agrega las celdas de un nivel fino a un nivel más grueso (`level`).
+    Usa el nivel más fino disponible en `index` como origen.
+    """
+    source_level = int(index["nivel"].min())
+    if level < source_level:
+        raise ValueError(f"No se puede bajar del nivel {source_level} al nivel {level}.")
+
+    source = index[index["nivel"] == source_level]
+    shift = level - source_level
+    coarse = pd.DataFrame({
+        "ix": source["ix"].to_numpy() >> shift,
+        "iy": source["iy"].to_numpy() >> shift,
+        "fecha": source["fecha"].to_numpy(),
+        "confianza": source["confianza"].array,
+        "n_alertas": source["n_alertas"].to_numpy(),
+    })
+    rolled = (
+        coarse.groupby(["ix", "iy", "fecha", "confianza"], observed=True, dropna=False, sort=True)["n_alertas"]
+        .sum()
+        .reset_index()
+    )
+    rolled.insert(0, "nivel", level)
+    return rolled
+
+
+def top_hotspots(
+    index: pd.DataFrame,
+    level: int,
+    n: int = 10,
+    confidence: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Devuelve las `n` celdas con más alertas en un nivel, opcionalmente filtrando
+    por nivel de confianza y rango de fechas ('YYYY-MM-DD').
+    """
+    mask = index["nivel"] == level
+    if confidence is not None:
+        mask &= index["confianza"] == confidence
+    if start_date is not None:
+        mask &= index["fecha"] >= pd.Timestamp(start_date)
+    if end_date is not None:
+        mask &= index["fecha"] <= pd.Timestamp(end_date)
+
+    totals = index[mask].groupby(["nivel", "ix", "iy"], sort=False)["n_alertas"].sum()
+    top = totals.nlargest(n).reset_index()
+    top.attrs = index.attrs
+    return top
+
+
+def hotspot_cells_to_gdf(cells: pd.DataFrame) -> gpd.GeoDataFrame:
+    """
+    Construye los polígonos (EPSG:4326) de las celdas de un índice o de `top_hotspots`.
+    """
+    base_cell_m = cells.attrs["base_cell_m"]
+    size = base_cell_m * np.left_shift(1, cells["nivel"].to_numpy().astype("int64"))
+    xmin = cells["ix"].to_numpy() * size
+    ymin = cells["iy"].to_numpy() * size
+    geoms = shapely.box(xmin, ymin, xmin + size, ymin + size)
+    return gpd.GeoDataFrame(cells.copy(), geometry=geoms, crs=cells.attrs["crs"]).to_crs(epsg=4326)
+
+
+def save_hotspot_index(index: pd.DataFrame, output_path: str):
+    """
+    Guarda el índice en Parquet (conserva CRS y tamaño base en los metadatos).
+    """
+    index.to_parquet(output_path, index=False)
+
+
+def load_hotspot_index(path: str, level: Optional[int] = None) -> pd.DataFrame:
+    """
+    Lee un índice guardado con `save_hotspot_index`, opcionalmente solo un nivel.
+    """
+    filters = [("nivel", "==", level)] if level is not None else None
+    return pd.read_parquet(path, filters=filters)
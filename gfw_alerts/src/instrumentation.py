@@ -0,0 +1,205 @@
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: sin getrusage, el RSS no se registra
+    resource = None
+
+# Colector activo del proceso; None → la instrumentación no hace nada
+_current = None
+# Etapa en curso (por hilo / tarea asyncio) para atribuir las llamadas externas
+_current_stage = contextvars.ContextVar("simbyp_stage", default=None)
+
+
+def _rss_peak_mb():
+    """
+    Pico de RSS del proceso desde que arrancó (None si la plataforma no lo reporta).
+    """
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+class PipelineMetrics:
+    """
+    Acumula métricas por etapa (tiempo de pared, CPU, pico de RSS, filas, bytes)
+    y por llamada externa (GFW, EE, GCS) durante una corrida del pipeline.
+
+    Si `profile_dir` está definido, cada etapa se perfila con cProfile y se guarda
+    como `<profile_dir>/perfil_<etapa>.prof`.
+    """
+
+    def __init__(self, profile_dir=None):
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self.calls = []
+        self.profile_dir = profile_dir
+        self._profiling = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows_in=None, profile=True):
+        record = {
+            "etapa": name,
+            "filas_entrada": rows_in,
+            "filas_salida": None,
+            "bytes_transferidos": 0,
+            "llamadas_externas": 0,
+        }
+        token = _current_stage.set(record)
+        profiler = self._start_profiler() if profile else None
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        rss0 = _rss_peak_mb()
+        try:
+            yield record
+            record["estado"] = "ok"
+        except BaseException as e:
+            record["estado"] = f"error: {type(e).__name__}"
+            raise
+        finally:
+            record["tiempo_s"] = round(time.perf_counter() - wall0, 4)
+            # process_time es de todo el proceso: con etapas concurrentes se superpone
+            record["cpu_s"] = round(time.process_time() - cpu0, 4)
+            # ru_maxrss es el pico de toda la vida del proceso: se guarda ese pico acumulado y
+            # cuánto lo subió esta etapa (0 si no superó el pico de etapas anteriores)
+            rss1 = _rss_peak_mb()
+            record["rss_pico_proceso_mb"] = rss1
+            record["rss_incremento_pico_mb"] = round(rss1 - rss0, 1) if rss1 is not None else None
+            self._stop_profiler(profiler, name)
+            _current_stage.reset(token)
+            with self._lock:
+                self.stages.append(record)
+
+    def record_call(self, service, operation, latency_s, bytes_transferred=0, ok=True):
+        call = {
+            "servicio": service,
+            "operacion": operation,
+            "latencia_s": round(latency_s, 4),
+            "bytes": int(bytes_transferred or 0),
+            "ok": ok,
+        }
+        stage = _current_stage.get()
+        with self._lock:
+            call["etapa"] = stage["etapa"] if stage else None
+            self.calls.append(call)
+            if stage is not None:
+                stage["bytes_transferidos"] += call["bytes"]
+                stage["llamadas_externas"] += 1
+
+    def _start_profiler(self):
+        # cProfile no admite perfiles anidados ni simultáneos: solo se perfila la primera etapa activa
+        if not self.profile_dir:
+            return None
+        with self._lock:
+            if self._profiling:
+                return None
+            self._profiling = True
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler, name):
+        if profiler is None:
+            return
+        profiler.disable()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.profile_dir, f"perfil_{name}.prof"))
+        with self._lock:
+            self._profiling = False
+
+    def services_summary(self):
+        summary = {}
+        for call in self.calls:
+            s = summary.setdefault(call["servicio"], {"llamadas": 0, "errores": 0, "bytes": 0, "latencia_total_s": 0.0})
+            s["llamadas"] += 1
+            s["errores"] += 0 if call["ok"] else 1
+            s["bytes"] += call["bytes"]
+            s["latencia_total_s"] = round(s["latencia_total_s"] + call["latencia_s"], 4)
+        for s in summary.values():
+            s["latencia_media_s"] = round(s["latencia_total_s"] / s["llamadas"], 4)
+        return summary
+
+    def to_dict(self):
+        return {
+            "inicio": self.started_at,
+            "etapas": self.stages,
+            "servicios": self.services_summary(),
+            "llamadas_externas": self.calls,
+        }
+
+    def save(self, output_path):
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        print(f"✅ Métricas del pipeline guardadas en: {output_path}")
+
+
+def start_metrics(profile_dir=None) -> PipelineMetrics:
+    """
+    Activa un colector nuevo para el proceso y lo devuelve.
+    """
+    global _current
+    _current = PipelineMetrics(profile_dir=profile_dir)
+    return _current
+
+
+def get_metrics():
+    return _current
+
+
+@contextmanager
+def stage(name, rows_in=None, profile=True):
+    """
+    Mide una etapa del pipeline. Devuelve un dict donde se pueden anotar
+    `filas_salida` u otros datos; sin colector activo no mide nada.
+
+    cProfile solo ve el hilo que lo activa: las etapas que solo esperan tareas
+    asyncio deben usar `profile=False` (las que corren en un hilo, `run_stage`).
+    """
+    if _current is None:
+        yield {}
+        return
+    with _current.stage(name, rows_in=rows_in, profile=profile) as record:
+        yield record
+
+
+async def run_stage(name, fn, *args, rows_in=None, rows_out=len, **kwargs):
+    """
+    Ejecuta `fn(*args, **kwargs)` en un hilo del executor como una etapa medida, sin
+    bloquear el bucle de eventos. `rows_out(resultado)` se anota como `filas_salida`.
+    """
+    def work():
+        with stage(name, rows_in=rows_in) as record:
+            result = fn(*args, **kwargs)
+            if rows_out is not None and result is not None:
+                record["filas_salida"] = rows_out(result)
+        return result
+
+    return await asyncio.to_thread(work)
+
+
+@contextmanager
+def external_call(service, operation):
+    """
+    Mide una llamada a un servicio externo ('gfw', 'ee', 'gcs').
+    El bloque puede anotar `call["bytes"]` con el volumen transferido.
+    """
+    call = {"bytes": 0}
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        yield call
+        ok = True
+    finally:
+        if _current is not None:
+            _current.record_call(service, operation, time.perf_counter() - t0, call["bytes"], ok)
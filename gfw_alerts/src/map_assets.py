@@ -0,0 +1,58 @@
+import base64
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+# JS y CSS de los mapas (modo lazy y páginas de mapa con recursos compartidos)
+ASSETS_DIR = Path(__file__).resolve().parent.parent / "reporte" / "assets"
+ASSETS_CONTENT_TYPES = {".js": "text/javascript; charset=utf-8", ".css": "text/css; charset=utf-8"}
+
+# Carpetas cuyos recursos ya se escribieron en este proceso (ver `ensure_map_assets`)
+_written_dirs = set()
+_written_lock = threading.Lock()
+
+
+def write_map_assets(assets_dir: str, source_dir: Path = ASSETS_DIR):
+    """
+    Copia el JS y CSS de los mapas a `assets_dir` (local o gs://), una vez por carpeta
+    de reporte sin importar cuántos mapas la usen.
+
+    Solo se reescribe un archivo si su contenido cambió (los recursos de una versión
+    anterior del código no sobreviven): localmente se comparan los bytes y en GCS el MD5
+    del objeto, así que un recurso igual no se vuelve a subir. La escritura local es
+    atómica, porque varios hilos pueden generar mapas de la misma carpeta a la vez.
+    """
+    target_root = str(assets_dir).rstrip("/")
+    for asset in sorted(Path(source_dir).iterdir()):
+        if asset.suffix not in ASSETS_CONTENT_TYPES:
+            continue
+        content = asset.read_bytes()
+        if target_root.startswith("gs://"):
+            from src.gcs_io import gcs_md5, write_gcs_bytes
+
+            target = f"{target_root}/{asset.name}"
+            if gcs_md5(target) == base64.b64encode(hashlib.md5(content).digest()).decode():
+                continue
+            write_gcs_bytes(target, content, content_type=ASSETS_CONTENT_TYPES[asset.suffix])
+            continue
+
+        target = Path(target_root) / asset.name
+        if target.exists() and target.read_bytes() == content:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{asset.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, target)
+
+
+def ensure_map_assets(assets_dir: str):
+    """
+    `write_map_assets` una sola vez por carpeta en este proceso: cada página de mapa la
+    llama, pero solo la primera de cada carpeta copia (o sube) los recursos.
+    """
+    key = str(assets_dir).rstrip("/")
+    with _written_lock:
+        if key not in _written_dirs:
+            write_map_assets(key)
+            _written_dirs.add(key)
@@ -1,12 +1,49 @@
 import geopandas as gpd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
-import rasterio
-import folium
-import ee
 import json
-from matplotlib_scalebar.scalebar import ScaleBar
+import threading
+
+from src.cassettes import cassette
+from src.instrumentation import external_call
+from src.map_assets import ensure_map_assets
+
+SENTINEL_VIS_PARAMS = {"min": 0, "max": 3000, "bands": ["B4", "B3", "B2"], "gamma": 1.1}
+# Lado mayor (px) de las miniaturas Sentinel-2 del reporte
+THUMBNAIL_DIMENSIONS = 512
+
+# Leaflet compartido por el reporte lazy y las páginas de mapa con recursos compartidos
+LEAFLET_CSS = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"
+LEAFLET_JS = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"
+# Página mínima de un mapa: solo la vista en JSON; JS y CSS se comparten en `assets/`
+MAP_SHELL_TEMPLATE = """<!doctype html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="{leaflet_css}">
+<link rel="stylesheet" href="{assets}/mapas_reporte.css">
+</head>
+<body class="mapa-pagina">
+<div class="mapa-lazy" data-vista="mapa"></div>
+<script type="application/json" id="vistas-mapas">{payload}</script>
+<script src="{leaflet_js}"></script>
+<script src="{assets}/mapas_reporte.js"></script>
+</body>
+</html>
+"""
+
+# Etiquetas en español de los niveles de confianza
+CONFIDENCE_LABELS = {
+    "highest": "Muy alto",
+    "high": "Alto",
+    "nominal": "Nominal",
+    "not_detected": "No detectado"
+}
+
+# Proyectos de Earth Engine ya inicializados en este proceso (los mapas se generan en varios hilos)
+_ee_projects = set()
+_ee_lock = threading.Lock()
 
 def create_cluster_maps(clusters_gdf, alerts_gdf, sentinel_images_dir, output_dir):
     """
@@ -15,6 +52,10 @@ def create_cluster_maps(clusters_gdf, alerts_gdf, sentinel_images_dir, output_di
     - Puntos de alertas en rojo
     - Leyenda, flecha de norte y barra de escala
     """
+    import matplotlib.pyplot as plt
+    import rasterio
+    from matplotlib_scalebar.scalebar import ScaleBar
+
     cluster_maps = []
 
     for cid, cluster in clusters_gdf.iterrows():
@@ -72,21 +113,155 @@ def create_cluster_maps(clusters_gdf, alerts_gdf, sentinel_images_dir, output_di
 
     return cluster_maps
 
-def plot_alerts_interactive(alerts_gdf: gpd.GeoDataFrame, shapefile_path: str, output_path: str):
+def _initialize_ee(project):
+    import ee
+
+    with _ee_lock:
+        if project not in _ee_projects:
+            with external_call("ee", "initialize"):
+                ee.Initialize(project=project)
+            _ee_projects.add(project)
+    return ee
+
+def _sentinel_image(cluster_geom, start_date, end_date, cloudy, project):
+    """
+    Mosaico mediano Sentinel-2 RGB recortado al cluster (objeto de Earth Engine),
+    o None si no hay imágenes con nubosidad menor a `cloudy`.
+    """
+    ee = _initialize_ee(project)
+
+    # === Convertir geometría del cluster a EE ===
+    geom = ee.Geometry.Polygon(cluster_geom.exterior.coords[:])
+
+    # === Crear colección Sentinel-2 filtrada ===
+    col = (
+        ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
+        .filterBounds(geom)
+        .filterDate(start_date, end_date)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", cloudy))
+        .select(["B4", "B3", "B2"])
+    )
+
+    with external_call("ee", "collection_size"):
+        n_images = col.size().getInfo()
+    if n_images == 0:
+        return None
+    return col.median().clip(geom)
+
+def sentinel_composite(cluster_geom, start_date, end_date, cloudy=30, project=None):
+    """
+    Mosaico Sentinel-2 del cluster que se construye una sola vez, al primer uso, y se
+    comparte entre `sentinel_tile_url` y `sentinel_thumbnail` (argumento `composite`):
+    una consulta a la colección por cluster en lugar de una por producto. Si las dos
+    respuestas vienen de cassettes, no se construye.
+
+    Retorna:
+    - Función sin argumentos que devuelve la imagen de Earth Engine (o None sin imágenes).
+    """
+    built = []
+
+    def image():
+        if not built:
+            built.append(_sentinel_image(cluster_geom, start_date, end_date, cloudy, project))
+        return built[0]
+
+    return image
+
+def _sentinel_key(cluster_geom, start_date, end_date, cloudy, vis_params):
+    return {
+        "geometry": [[round(x, 7), round(y, 7)] for x, y in cluster_geom.exterior.coords],
+        "start_date": start_date,
+        "end_date": end_date,
+        "cloudy": cloudy,
+        "vis_params": vis_params,
+    }
+
+def sentinel_tile_url(cluster_geom, start_date, end_date, cloudy=30, project=None, vis_params=SENTINEL_VIS_PARAMS,
+                      composite=None):
+    """
+    Devuelve la URL de teselas (XYZ) del mosaico mediano Sentinel-2 RGB recortado al cluster,
+    o None si no hay imágenes con nubosidad menor a `cloudy` en el rango de fechas.
+    Las respuestas de Earth Engine se pueden grabar y reproducir con cassettes.
+    `composite` (de `sentinel_composite`, mismos parámetros) reutiliza un mosaico ya armado.
+    """
+    composite = composite or sentinel_composite(cluster_geom, start_date, end_date, cloudy, project)
+
+    def fetch():
+        img = composite()
+        if img is None:
+            return None
+        with external_call("ee", "get_map_id"):
+            return img.getMapId(vis_params)["tile_fetcher"].url_format
+
+    key = _sentinel_key(cluster_geom, start_date, end_date, cloudy, vis_params)
+    return cassette("ee", "sentinel_tile_url", key, fetch)
+
+def sentinel_thumbnail(cluster_geom, start_date, end_date, output_path, dimensions=THUMBNAIL_DIMENSIONS,
+                       cloudy=30, project=None, vis_params=SENTINEL_VIS_PARAMS, composite=None):
+    """
+    Descarga una miniatura PNG del mosaico Sentinel-2 del cluster (getThumbURL de Earth Engine).
+    Sirve de imagen estática mientras el mapa interactivo no se ha creado o si no puede cargarse.
+    `composite` (de `sentinel_composite`) reutiliza el mosaico de `sentinel_tile_url`.
+
+    Retorna:
+    - str: `output_path`, o None si no hay imágenes para el cluster.
+    """
+    composite = composite or sentinel_composite(cluster_geom, start_date, end_date, cloudy, project)
+
+    def fetch():
+        import requests
+
+        img = composite()
+        if img is None:
+            return b""
+        with external_call("ee", "thumbnail") as call:
+            url = img.getThumbURL({**vis_params, "dimensions": dimensions, "format": "png"})
+            response = requests.get(url, timeout=(10, 120))
+            response.raise_for_status()
+            call["bytes"] = len(response.content)
+        return response.content
+
+    key = {**_sentinel_key(cluster_geom, start_date, end_date, cloudy, vis_params), "dimensions": dimensions}
+    data = cassette("ee", "sentinel_thumbnail", key, fetch, kind="bytes")
+    if not data:
+        return None
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return output_path
+
+def write_map_page(view: dict, output_path: str, assets_dir: str, title: str = "Mapa"):
+    """
+    Guarda un mapa como página mínima: la vista (de `alerts_map_view` o `cluster_map_view`)
+    en JSON y referencias relativas a los recursos compartidos de `assets_dir` (que se
+    escriben una vez por carpeta, ver `ensure_map_assets`).
+    """
+    ensure_map_assets(assets_dir)
+    assets = os.path.relpath(assets_dir, os.path.dirname(os.path.abspath(output_path))).replace(os.sep, "/")
+    # JSON incrustado en <script>: "</" se escapa para no cerrar la etiqueta
+    payload = json.dumps({"mapa": view}, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    html = MAP_SHELL_TEMPLATE.format(
+        title=title, leaflet_css=LEAFLET_CSS, leaflet_js=LEAFLET_JS, assets=assets, payload=payload
+    )
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    return output_path
+
+def plot_alerts_interactive(alerts_gdf: gpd.GeoDataFrame, shapefile_path: str, output_path: str, assets_dir=None):
     """
     Crea un mapa interactivo con Folium:
     - Área de estudio con borde azul delgado
     - Alertas coloreadas (rojo = Muy alto, naranja = otras)
     - Popups en español
     - Leyenda fija en la esquina inferior izquierda
+
+    Con `assets_dir` no se usa folium: se guarda una página mínima con los datos del mapa
+    que usa el JS/CSS compartido de esa carpeta (ver `write_map_page`).
     """
-    # Diccionario para traducir niveles de confianza
-    translate_conf = {
-        "highest": "Muy alto",
-        "high": "Alto",
-        "nominal": "Nominal",
-        "not_detected": "No detectado"
-    }
+    if assets_dir:
+        view = alerts_map_view(alerts_gdf, shapefile_path)
+        return write_map_page(view, output_path, assets_dir, title="Alertas de deforestación")
+
+    import folium
 
     # Convertir a lat/lon
     alerts_gdf = alerts_gdf.to_crs(epsg=4326)
@@ -110,10 +285,10 @@ def plot_alerts_interactive(alerts_gdf: gpd.GeoDataFrame, shapefile_path: str, o
 
     # Crear puntos de alertas con popups descriptivos
     for _, row in alerts_gdf.iterrows():
-        conf = translate_conf.get(row.get("gfw_integrated_alerts__confidence"), "N/A")
-        glad_landsat = translate_conf.get(row.get("umd_glad_landsat_alerts__confidence"), "N/A")
-        glad_s2 = translate_conf.get(row.get("umd_glad_sentinel2_alerts__confidence"), "N/A")
-        radd = translate_conf.get(row.get("wur_radd_alerts__confidence"), "N/A")
+        conf = CONFIDENCE_LABELS.get(row.get("gfw_integrated_alerts__confidence"), "N/A")
+        glad_landsat = CONFIDENCE_LABELS.get(row.get("umd_glad_landsat_alerts__confidence"), "N/A")
+        glad_s2 = CONFIDENCE_LABELS.get(row.get("umd_glad_sentinel2_alerts__confidence"), "N/A")
+        radd = CONFIDENCE_LABELS.get(row.get("wur_radd_alerts__confidence"), "N/A")
 
         color = "red" if conf == "Muy alto" else "orange"
 
@@ -164,7 +339,8 @@ def plot_sentinel_cluster_interactive(
     output_path,
     alerts_gdf=None,
     cloudy=30,
-    project=None
+    project=None,
+    assets_dir=None
 ):
     """
     Genera un mapa interactivo con:
@@ -173,30 +349,26 @@ def plot_sentinel_cluster_interactive(
     - Borde del cluster
     - Puntos de alertas (solo las de nivel 'highest')
     - Leyenda fija en pantalla
-    """
-
-    ee.Initialize(project=project)
 
-    # === Convertir geometría del cluster a EE ===
-    geom = ee.Geometry.Polygon(cluster_geom.exterior.coords[:])
-    vis_params = {"min": 0, "max": 3000, "bands": ["B4", "B3", "B2"], "gamma": 1.1}
+    Con `assets_dir` se guarda una página mínima con los datos del mapa que usa el
+    JS/CSS compartido de esa carpeta, en lugar de una página folium completa.
+    """
+    if assets_dir:
+        view = cluster_map_view(cluster_geom, cluster_id, start_date, end_date,
+                                alerts_gdf=alerts_gdf, cloudy=cloudy, project=project)
+        if view is None:
+            return None
+        write_map_page(view, output_path, assets_dir, title=f"Cluster {cluster_id}")
+        print(f"✅ Mapa interactivo del cluster {cluster_id} guardado en: {output_path}")
+        return output_path
 
-    # === Crear colección Sentinel-2 filtrada ===
-    col = (
-        ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-        .filterBounds(geom)
-        .filterDate(start_date, end_date)
-        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", cloudy))
-        .select(["B4", "B3", "B2"])
-    )
+    import folium
 
-    if col.size().getInfo() == 0:
+    tile_url = sentinel_tile_url(cluster_geom, start_date, end_date, cloudy=cloudy, project=project)
+    if tile_url is None:
         print(f"⚠️ Cluster {cluster_id}: sin imágenes disponibles")
         return None
 
-    img = col.median().clip(geom)
-    tile_url = img.getMapId(vis_params)["tile_fetcher"].url_format
-
     # === Crear mapa base ===
     centroid = cluster_geom.centroid
     m = folium.Map(
@@ -288,3 +460,111 @@ def plot_sentinel_cluster_interactive(
     except Exception as e:
         print(f"❌ Error generando mapa para cluster {cluster_id}: {e}")
         return None
+
+# === Vistas de mapa como datos (modo de reporte "lazy") ===
+# En lugar de una página folium por mapa, el reporte recibe estos diccionarios y
+# reporte/assets/mapas_reporte.js los dibuja con una sola copia de Leaflet.
+
+def alerts_map_view(alerts_gdf: gpd.GeoDataFrame, area, decimals=5) -> dict:
+    """
+    Vista del mapa general: área de estudio y todas las alertas con sus niveles de confianza.
+
+    Parámetros:
+    - alerts_gdf (GeoDataFrame): Alertas (cualquier nivel de confianza).
+    - area: Área de estudio como geometría GeoJSON (dict), geometría shapely o ruta a archivo.
+    - decimals (int): Decimales de las coordenadas de las alertas.
+
+    Retorna:
+    - dict: Vista con límites, área y puntos [lat, lon, código por sistema]; los códigos
+      indexan `niveles` (-1 = sin dato).
+    """
+    import pandas as pd
+    from shapely.geometry import mapping, shape
+
+    from src.download_gfw_data import ALERT_COLUMNS, CONFIDENCE_LEVELS
+
+    if isinstance(area, str):
+        area = gpd.read_file(area).to_crs(epsg=4326).geometry.union_all()
+    if not isinstance(area, dict):
+        area = mapping(area)
+
+    alerts_gdf = alerts_gdf.to_crs(epsg=4326)
+    lat = alerts_gdf.geometry.y.round(decimals).tolist()
+    lon = alerts_gdf.geometry.x.round(decimals).tolist()
+    codes = [
+        pd.Categorical(alerts_gdf[column], categories=CONFIDENCE_LEVELS).codes.tolist()
+        if column in alerts_gdf.columns else [-1] * len(alerts_gdf)
+        for column in ALERT_COLUMNS
+    ]
+
+    if alerts_gdf.empty:
+        minx, miny, maxx, maxy = shape(area).bounds
+    else:
+        minx, miny, maxx, maxy = alerts_gdf.total_bounds
+
+    return {
+        "tipo": "general",
+        "base": {"url": "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", "attr": "© OpenStreetMap"},
+        "limites": [[miny, minx], [maxy, maxx]],
+        "area": area,
+        "niveles": [CONFIDENCE_LABELS[level] for level in CONFIDENCE_LEVELS],
+        "sistemas": ["GFW (Integrada)", "GLAD Landsat", "GLAD Sentinel-2", "RADD"],
+        "puntos": [list(p) for p in zip(lat, lon, *codes)],
+        "leyenda": [
+            {"forma": "cuadro", "color": "red", "texto": "Muy alto"},
+            {"forma": "cuadro", "color": "orange", "texto": "Otros"},
+        ],
+    }
+
+def cluster_map_view(cluster_geom, cluster_id, start_date, end_date, alerts_gdf=None,
+                     cloudy=30, project=None, decimals=5, composite=None):
+    """
+    Vista de un cluster: mosaico Sentinel-2 (URL de teselas), borde del cluster y alertas
+    de nivel 'highest' dentro de él. Equivale a `plot_sentinel_cluster_interactive` sin
+    generar una página HTML. `composite`: ver `sentinel_composite`.
+
+    Retorna:
+    - dict con la vista, o None si no hay imágenes disponibles.
+    """
+    import shapely
+    from shapely.geometry import mapping
+
+    tile_url = sentinel_tile_url(cluster_geom, start_date, end_date, cloudy=cloudy, project=project,
+                                 composite=composite)
+    if tile_url is None:
+        print(f"⚠️ Cluster {cluster_id}: sin imágenes disponibles")
+        return None
+
+    points = []
+    minx, miny, maxx, maxy = cluster_geom.bounds
+    if alerts_gdf is not None:
+        alerts_gdf = alerts_gdf.to_crs("EPSG:4326")
+        alerts_in_cluster = alerts_gdf[
+            (alerts_gdf.within(cluster_geom)) &
+            (alerts_gdf["gfw_integrated_alerts__confidence"] == "highest")
+        ]
+        if not alerts_in_cluster.empty:
+            minx, miny, maxx, maxy = alerts_in_cluster.total_bounds
+            points = [
+                list(p) for p in zip(
+                    alerts_in_cluster.geometry.y.round(decimals).tolist(),
+                    alerts_in_cluster.geometry.x.round(decimals).tolist(),
+                )
+            ]
+
+    return {
+        "tipo": "cluster",
+        "cluster_id": int(cluster_id),
+        "base": {
+            "url": "https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png",
+            "attr": "CartoDB Positron",
+        },
+        "limites": [[miny, minx], [maxy, maxx]],
+        "teselas": tile_url,
+        "contorno": mapping(shapely.set_precision(cluster_geom, 10 ** -(decimals + 1))),
+        "puntos": points,
+        "leyenda": [
+            {"forma": "punto", "color": "#FF0000", "texto": "Alerta de deforestación"},
+            {"forma": "borde", "color": "red", "texto": "Límite del cluster"},
+        ],
+    }
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from src.process_gfw_alerts import (
+    cluster_alerts_by_section, cluster_section, drop_repeated_alerts, join_reference_layers
+)
+
+
+# Procesos por defecto (`--procesos` en main.py)
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Teselas por proceso: más teselas que procesos equilibra la carga entre zonas densas y vacías
+CHUNKS_PER_WORKER = 4
+# Por debajo de estos números de alertas el costo de arrancar procesos no compensa
+# (el cruce espacial ya es vectorizado; el clustering recorre las alertas en Python)
+MIN_PARALLEL_JOIN_ALERTS = 250_000
+MIN_PARALLEL_CLUSTER_ALERTS = 10_000
+
+# Datos compartidos de cada proceso hijo. Solo se asignan en los hijos (inicializador del
+# pool): el proceso padre nunca los toca, así que varios pools pueden convivir.
+_worker_shared = {}
+
+
+def _pool_context():
+    # Sin fork: el pipeline lanza los pools desde hilos (asyncio.to_thread) con otros hilos
+    # vivos, y un fork en ese estado puede heredar locks tomados y bloquearse
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _init_worker(shared):
+    _worker_shared.update(shared)
+    # Los índices espaciales no viajan al serializar: se construyen una vez por proceso
+    for value in shared.values():
+        if isinstance(value, gpd.GeoDataFrame):
+            value.sindex
+
+
+def _run_shared(fn, task):
+    return fn(_worker_shared, task)
+
+
+def _map_shared(fn, tasks, workers, **shared):
+    """
+    Ejecuta `fn(shared, task)` para cada tarea en un pool de procesos. `shared` se envía
+    una sola vez a cada proceso (inicializador del pool) y cada tarea solo lleva las
+    posiciones de sus alertas. Con un proceso corre en serie. Los resultados se devuelven
+    en orden.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        return [fn(shared, task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=_pool_context(),
+                             initializer=_init_worker, initargs=(shared,)) as pool:
+        return list(pool.map(partial(_run_shared, fn), tasks))
+
+
+def spatial_chunks(gdf: gpd.GeoDataFrame, n_chunks: int):
+    """
+    Parte las alertas en `n_chunks` teselas espacialmente compactas: tramos contiguos
+    de la curva de Hilbert (una grilla recorrida en orden), de tamaño similar.
+
+    Retorna:
+    - List[np.ndarray]: Posiciones (iloc) de las alertas de cada tesela.
+    """
+    order = gdf.hilbert_distance().to_numpy().argsort(kind="stable")
+    return [chunk for chunk in np.array_split(order, n_chunks) if len(chunk)]
+
+
+def _join_chunk(shared, positions):
+    alerts = shared["alerts"].iloc[positions]
+    # Índice temporal = posición original, para reordenar el resultado como en el cruce serial
+    alerts = alerts.set_axis(pd.Index(positions))
+    joined = join_reference_layers(alerts, shared["veredas"], shared["secciones"])
+    # La geometría no vuelve al proceso padre: se toma de las alertas originales
+    return joined.drop(columns=joined.geometry.name), list(joined.columns)
+
+
+def join_reference_layers_parallel(alerts_gdf: gpd.GeoDataFrame, veredas: gpd.GeoDataFrame,
+                                   secciones: gpd.GeoDataFrame, workers: int = DEFAULT_WORKERS,
+                                   min_alerts: int = MIN_PARALLEL_JOIN_ALERTS) -> gpd.GeoDataFrame:
+    """
+    `join_reference_layers` repartido en procesos por teselas espaciales.
+
+    Las capas de referencia se envían una vez a cada proceso, que construye su índice
+    espacial y cruza sus teselas devolviendo solo los atributos. El resultado tiene las
+    mismas filas, orden, índice y tipos que el cruce serial.
+    """
+    if workers <= 1 or len(alerts_gdf) < min_alerts:
+        return join_reference_layers(alerts_gdf, veredas, secciones)
+
+    chunks = spatial_chunks(alerts_gdf, workers * CHUNKS_PER_WORKER)
+    results = _map_shared(
+        _join_chunk, chunks, workers, alerts=alerts_gdf, veredas=veredas, secciones=secciones
+    )
+
+    columns = results[0][1]
+    joined = pd.concat([frame for frame, _ in results])
+    positions = joined.index.to_numpy()
+    order = positions.argsort(kind="stable")
+    joined = joined.iloc[order]
+    positions = positions[order]
+
+    geometry_name = alerts_gdf.geometry.name
+    joined[geometry_name] = alerts_gdf.geometry.to_numpy()[positions]
+    joined = gpd.GeoDataFrame(joined[columns], geometry=geometry_name, crs=alerts_gdf.crs)
+    joined.index = alerts_gdf.index[positions]
+    return joined
+
+
+def _cluster_sections(shared, task):
+    coords = shared["coords"]
+    buffer_m = shared["buffer_m"]
+    return [cluster_section(coords[positions], buffer_m) for positions in task]
+
+
+def cluster_alerts_parallel(alerts_gdf: gpd.GeoDataFrame, buffer_m=1000, workers: int = DEFAULT_WORKERS,
+                            min_alerts: int = MIN_PARALLEL_CLUSTER_ALERTS) -> gpd.GeoDataFrame:
+    """
+    `cluster_alerts_by_section` repartido en procesos por sección.
+
+    Cada proceso agrupa las alertas de un lote de secciones (coordenadas UTM enviadas
+    una vez a cada proceso) y devuelve etiquetas locales; los cluster_id globales se numeran después en
+    el orden de las secciones, igual que en la versión serial.
+    """
+    alerts_gdf = drop_repeated_alerts(alerts_gdf)
+    if workers <= 1 or len(alerts_gdf) < min_alerts:
+        return cluster_alerts_by_section(alerts_gdf, buffer_m=buffer_m)
+
+    utm_crs = alerts_gdf.estimate_utm_crs()
+    alerts_proj = alerts_gdf.to_crs(utm_crs)
+    coords = np.column_stack([alerts_proj.geometry.x.to_numpy(), alerts_proj.geometry.y.to_numpy()])
+
+    # Secciones en el orden de groupby (ordenadas, sin nulos); alertas en su orden original
+    codes, _ = pd.factorize(alerts_proj["SECR_CCNCT"], sort=True)
+    valid = np.flatnonzero(codes >= 0)
+    by_section = valid[codes[valid].argsort(kind="stable")]
+    sections = np.split(by_section, np.flatnonzero(np.diff(codes[by_section])) + 1) if len(by_section) else []
+
+    # Lotes de tamaño parecido (en alertas); cada lote conserva el orden de las secciones
+    n_tasks = min(len(sections), workers * CHUNKS_PER_WORKER)
+    bounds = np.searchsorted(
+        np.cumsum([len(s) for s in sections]), np.linspace(0, len(by_section), n_tasks + 1)[1:-1]
+    )
+    tasks = [batch for batch in np.split(np.arange(len(sections)), bounds) if len(batch)]
+    results = _map_shared(
+        _cluster_sections, [[sections[i] for i in batch] for batch in tasks], workers,
+        coords=coords, buffer_m=buffer_m
+    )
+
+    labels = []
+    offset = 0
+    for section_labels, n_clusters in (item for batch in results for item in batch):
+        labels.append(section_labels + offset)
+        offset += n_clusters
+
+    result = alerts_proj.iloc[by_section].copy()
+    result["cluster_id"] = np.concatenate(labels) if labels else np.array([], dtype=int)
+    return gpd.GeoDataFrame(result, crs=utm_crs).to_crs(epsg=4326)
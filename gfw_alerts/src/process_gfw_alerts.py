@@ -2,27 +2,80 @@ import geopandas as gpd
 import pandas as pd
 import warnings
 import numpy as np
-from sklearn.neighbors import BallTree
+from shapely.geometry import box
 
+from src.download_gfw_data import apply_alert_schema
 
-def process_alerts(alerts_path: str, veredas_path: str, secciones_path: str) -> gpd.GeoDataFrame:
+
+# Columnas que se leen de cada capa de referencia (el resto no se carga)
+VEREDAS_COLUMNS = ['CODIGO_VER', 'NOMB_MPIO', 'NOMBRE_VER']
+SECCIONES_COLUMNS = [
+    'MPIO_CDPMP', 'SECR_CCNCT', 'STVIVIENDA', 'STP19_EC_1', 'STP19_ES_2',
+    'STP19_ACU1', 'STP19_ACU2', 'STP19_ALC1', 'STP19_ALC2', 'STP19_GAS1',
+    'STP19_GAS2', 'STP19_REC1', 'STP19_REC2', 'STP19_INT1', 'STP19_INT2',
+    'STP27_PERS', 'pobdens20', 'gdp_20_m2p', 'acss_mrkt',
+    'elevation', 'dprivt', 'treecv_24'
+]
+# Margen (grados) del recuadro de las alertas al filtrar las capas por extensión
+REFERENCE_BBOX_MARGIN = 0.01
+
+
+def read_reference_layer(path: str, columns=None, bbox=None, where: str = None, **kwargs) -> gpd.GeoDataFrame:
     """
-    Procesa las alertas de deforestación:
-      - Filtra solo 'highest'
-      - Cruza con veredas y secciones rurales
+    Lee una capa de referencia (veredas, secciones) cargando solo lo necesario.
+
+    Parámetros:
+    - path (str): Ruta del shapefile / GeoPackage / GeoJSON.
+    - columns (List[str], opcional): Atributos a leer (la geometría se lee siempre).
+    - bbox (GeoSeries, opcional): Solo lee los elementos que intersectan su extensión
+      (se reproyecta al CRS de la capa).
+    - where (str, opcional): Filtro de atributos en SQL de OGR, p. ej. "MPIO_CDPMP = '18753'".
+    """
+    return gpd.read_file(path, columns=columns, bbox=bbox, where=where, **kwargs)
+
+
+def alerts_bbox(alerts_gdf: gpd.GeoDataFrame, margin: float = REFERENCE_BBOX_MARGIN):
+    """
+    Recuadro de las alertas (con margen) para filtrar las capas de referencia, o None si no hay alertas.
+    """
+    if alerts_gdf.empty:
+        return None
+    minx, miny, maxx, maxy = alerts_gdf.total_bounds
+    return gpd.GeoSeries([box(minx - margin, miny - margin, maxx + margin, maxy + margin)], crs=alerts_gdf.crs)
+
+
+def filter_confidence(alerts_gdf: gpd.GeoDataFrame, confidence: str = "highest") -> gpd.GeoDataFrame:
+    """
+    Filtra las alertas por nivel de confianza de la alerta integrada GFW.
+    """
+    filtered = alerts_gdf[alerts_gdf["gfw_integrated_alerts__confidence"] == confidence]
+
+    if filtered.empty:
+        warnings.warn(f"⚠️ No se encontraron alertas con confianza '{confidence}'.", UserWarning)
+
+    return filtered
+
+def load_reference_layers(veredas_path: str, secciones_path: str, bbox=None,
+                          veredas_where: str = None, secciones_where: str = None):
     """
-    gfw_alerts = gpd.read_file(alerts_path)
-    veredas = gpd.read_file(veredas_path)
-    secciones = gpd.read_file(secciones_path, converters={'MPIO_CDPMP': 'str'})
+    Lee las capas de referencia (solo las columnas usadas) y calcula los porcentajes
+    de acceso a servicios por sección.
 
-    cols_to_filter = [
-        'MPIO_CDPMP', 'SECR_CCNCT', 'STVIVIENDA', 'STP19_EC_1', 'STP19_ES_2',
-        'STP19_ACU1', 'STP19_ACU2', 'STP19_ALC1', 'STP19_ALC2', 'STP19_GAS1',
-        'STP19_GAS2', 'STP19_REC1', 'STP19_REC2', 'STP19_INT1', 'STP19_INT2',
-        'STP27_PERS', 'pobdens20', 'gdp_20_m2p', 'acss_mrkt',
-        'elevation', 'dprivt', 'treecv_24', 'geometry'
-    ]
-    secciones = secciones[cols_to_filter].copy()
+    Parámetros:
+    - veredas_path, secciones_path (str): Rutas de las capas.
+    - bbox (GeoSeries, opcional): Solo lee los elementos que intersectan su extensión.
+    - veredas_where, secciones_where (str, opcional): Filtros de atributos (SQL de OGR).
+
+    Retorna:
+    - (GeoDataFrame, GeoDataFrame): veredas y secciones, listas para `process_alerts`.
+    """
+    veredas = read_reference_layer(veredas_path, columns=VEREDAS_COLUMNS, bbox=bbox, where=veredas_where)
+    veredas = veredas[VEREDAS_COLUMNS + ['geometry']]
+    secciones = read_reference_layer(
+        secciones_path, columns=SECCIONES_COLUMNS, bbox=bbox, where=secciones_where,
+        converters={'MPIO_CDPMP': 'str'}
+    )
+    secciones = secciones[SECCIONES_COLUMNS + ['geometry']].copy()
 
     secciones['STVIVIENDA'] = pd.to_numeric(secciones['STVIVIENDA'], errors="coerce")
     base = secciones['STVIVIENDA'].mask(secciones['STVIVIENDA'] == 0)
@@ -34,23 +87,104 @@ def process_alerts(alerts_path: str, veredas_path: str, secciones_path: str) ->
     secciones['BASUR_PERC'] = secciones['STP19_REC1'] / base * 100
     secciones['INTER_PERC'] = secciones['STP19_INT1'] / base * 100
 
-    gfw_alerts = gfw_alerts[gfw_alerts["gfw_integrated_alerts__confidence"] == "highest"]
-
-    if gfw_alerts.empty:
-        warnings.warn("⚠️ No se encontraron alertas con confianza 'highest'.", UserWarning)
+    return veredas, secciones
 
-    df = gpd.sjoin(gfw_alerts, veredas[['CODIGO_VER', 'NOMB_MPIO', 'NOMBRE_VER', 'geometry']], how='left')
+def join_reference_layers(alerts_gdf: gpd.GeoDataFrame, veredas: gpd.GeoDataFrame,
+                          secciones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Cruza las alertas con veredas y secciones (left join espacial, en el orden de las alertas).
+    """
+    df = gpd.sjoin(alerts_gdf, veredas, how='left')
     df = df.drop(columns='index_right', errors='ignore')
-    df = gpd.sjoin(df, secciones, how='left')
+    return gpd.sjoin(df, secciones, how='left')
+
+def process_alerts(alerts_path, veredas_path, secciones_path, confidence="highest",
+                   veredas_where: str = None, secciones_where: str = None, workers: int = 1) -> gpd.GeoDataFrame:
+    """
+    Procesa las alertas de deforestación:
+      - Filtra solo el nivel `confidence` ('highest' por defecto; None conserva todos)
+      - Cruza con veredas y secciones rurales
+
+    `alerts_path` puede ser una ruta o el GeoDataFrame de `csv_to_geodataframe`;
+    en ambos casos las alertas conservan el esquema tipado.
+
+    De las capas de referencia solo se leen las columnas usadas y los elementos dentro
+    de la extensión de las alertas; `veredas_where` / `secciones_where` agregan un filtro
+    de atributos (SQL de OGR) que se aplica al leer el archivo. También se aceptan las
+    capas ya cargadas con `load_reference_layers` (p. ej. leídas en paralelo a la descarga).
+
+    Con `workers` > 1 el cruce se reparte en procesos por teselas espaciales
+    (ver `src.parallel_alerts`); el resultado es idéntico al serial.
+    """
+    if isinstance(alerts_path, gpd.GeoDataFrame):
+        gfw_alerts = alerts_path
+    else:
+        gfw_alerts = apply_alert_schema(gpd.read_file(alerts_path))
+
+    if confidence is not None:
+        gfw_alerts = filter_confidence(gfw_alerts, confidence)
+
+    if isinstance(veredas_path, gpd.GeoDataFrame) and isinstance(secciones_path, gpd.GeoDataFrame):
+        veredas, secciones = veredas_path, secciones_path
+    else:
+        veredas, secciones = load_reference_layers(
+            veredas_path, secciones_path, bbox=alerts_bbox(gfw_alerts),
+            veredas_where=veredas_where, secciones_where=secciones_where
+        )
+
+    if workers and workers > 1:
+        from src.parallel_alerts import join_reference_layers_parallel
+
+        return join_reference_layers_parallel(gfw_alerts, veredas, secciones, workers=workers)
 
-    return df
+    return join_reference_layers(gfw_alerts, veredas, secciones)
 
-def cluster_alerts_by_section(alerts_gdf: gpd.GeoDataFrame, buffer_m=1000) -> gpd.GeoDataFrame:
+def cluster_section(coords: np.ndarray, buffer_m=1000):
+    """
+    Clusters de las alertas de una sección (coordenadas UTM, en el orden de las alertas).
+
+    Retorna:
+    - (np.ndarray, int): Etiqueta local (1..n) de cada alerta y número de clusters abiertos;
+      los ids globales se obtienen sumando los clusters de las secciones anteriores.
+    """
+    from sklearn.neighbors import BallTree
+
+    tree = BallTree(coords, metric="euclidean")
+    labels = -np.ones(len(coords), dtype=int)
+    n_clusters = 0
+
+    for i in range(len(coords)):
+        if labels[i] == -1:
+            n_clusters += 1
+            neighbors = tree.query_radius([coords[i]], r=2*buffer_m)[0]
+            labels[neighbors] = n_clusters
+
+    return labels, n_clusters
+
+def drop_repeated_alerts(alerts_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Una fila por alerta. El cruce con veredas y secciones (sjoin por la izquierda) repite
+    las alertas en bordes o en polígonos traslapados; se conserva la primera coincidencia,
+    como en el cubo de alertas.
+    """
+    return alerts_gdf[~alerts_gdf.index.duplicated(keep="first")]
+
+
+def cluster_alerts_by_section(alerts_gdf: gpd.GeoDataFrame, buffer_m=1000, workers: int = 1) -> gpd.GeoDataFrame:
     """
     Agrupa alertas en clusters si sus buffers de 250m se intersectan
     y pertenecen a la misma sección rural (SECR_CCNCT).
-    Devuelve los puntos originales con un cluster_id asignado.
+    Devuelve los puntos originales (una vez cada uno, ver `drop_repeated_alerts`)
+    con un cluster_id asignado.
+
+    Con `workers` > 1 las secciones se reparten en procesos; el resultado es idéntico al serial.
     """
+    alerts_gdf = drop_repeated_alerts(alerts_gdf)
+    if workers and workers > 1:
+        from src.parallel_alerts import cluster_alerts_parallel
+
+        return cluster_alerts_parallel(alerts_gdf, buffer_m=buffer_m, workers=workers)
+
     utm_crs = alerts_gdf.estimate_utm_crs()
     alerts_proj = alerts_gdf.to_crs(utm_crs).copy()
 
@@ -59,16 +193,10 @@ def cluster_alerts_by_section(alerts_gdf: gpd.GeoDataFrame, buffer_m=1000) -> gp
 
     for secr, group in alerts_proj.groupby("SECR_CCNCT"):
         coords = np.array([(geom.x, geom.y) for geom in group.geometry])
-        tree = BallTree(coords, metric="euclidean")
-        labels = -np.ones(len(group), dtype=int)
-
-        for i in range(len(coords)):
-            if labels[i] == -1:
-                cluster_id += 1
-                neighbors = tree.query_radius([coords[i]], r=2*buffer_m)[0]
-                labels[neighbors] = cluster_id
+        labels, n_clusters = cluster_section(coords, buffer_m)
 
-        group["cluster_id"] = labels
+        group["cluster_id"] = labels + cluster_id
+        cluster_id += n_clusters
         clusters.append(group)
 
     result = gpd.GeoDataFrame(pd.concat(clusters), crs=utm_crs)
@@ -88,4 +216,72 @@ def get_cluster_bboxes(alerts_clusters_gdf, buffer_m=2000):
         bboxes.append({"cluster_id": cid, "geometry": cluster_geom})
 
     bboxes_gdf = gpd.GeoDataFrame(bboxes, crs=utm_crs)
-    return bboxes_gdf.to_crs(epsg=4326)
\ No newline at end of file
+    return bboxes_gdf.to_crs(epsg=4326)
+
+CLUSTER_NUMERIC_COLUMNS = [
+    'pobdens20', 'gdp_20_m2p', 'acss_mrkt', 'elevation', 'dprivt',
+    'ENRG_PERC', 'ACUED_PERC', 'ALCLT_PERC', 'GAS_PERC', 'BASUR_PERC', 'INTER_PERC'
+]
+CLUSTER_MAJORITY_COLUMNS = ['NOMB_MPIO', 'NOMBRE_VER', 'SECR_CCNCT']
+
+
+def _majority_by_cluster(df: pd.DataFrame, column: str) -> pd.Series:
+    """
+    Valor más frecuente de `column` por cluster_id (empates → primer valor en orden).
+    """
+    counts = (
+        df[["cluster_id", column]]
+        .dropna()
+        .groupby(["cluster_id", column], sort=False, observed=True)
+        .size()
+        .reset_index(name="n")
+    )
+    counts = counts.sort_values(["cluster_id", "n"], ascending=[True, False], kind="stable")
+    return counts.drop_duplicates("cluster_id").set_index("cluster_id")[column]
+
+
+def summarize_clusters(alerts_clusters_gdf: gpd.GeoDataFrame) -> pd.DataFrame:
+    """
+    Resume todas las alertas de cada cluster en una sola pasada de groupby.
+
+    Retorna un DataFrame indexado por cluster_id con:
+      - n_alertas: número de alertas del cluster
+      - fecha_inicio / fecha_fin: rango de fechas de las alertas
+      - NOMB_MPIO, NOMBRE_VER, SECR_CCNCT: valor mayoritario entre las alertas
+      - atributos numéricos de la sección: promedio entre las alertas
+      - lat / lon: centroide de los puntos del cluster (calculado en UTM)
+    """
+    utm_crs = alerts_clusters_gdf.estimate_utm_crs()
+    alerts_proj = alerts_clusters_gdf.to_crs(utm_crs)
+
+    df = pd.DataFrame({
+        "cluster_id": alerts_proj["cluster_id"].to_numpy(),
+        "x": alerts_proj.geometry.x.to_numpy(),
+        "y": alerts_proj.geometry.y.to_numpy(),
+    })
+    agg = {"x": ("x", "mean"), "y": ("y", "mean"), "n_alertas": ("x", "size")}
+
+    if "gfw_integrated_alerts__date" in alerts_proj.columns:
+        df["fecha"] = pd.to_datetime(alerts_proj["gfw_integrated_alerts__date"], errors="coerce").to_numpy()
+        agg["fecha_inicio"] = ("fecha", "min")
+        agg["fecha_fin"] = ("fecha", "max")
+
+    numeric_cols = [c for c in CLUSTER_NUMERIC_COLUMNS if c in alerts_proj.columns]
+    for col in numeric_cols:
+        df[col] = pd.to_numeric(alerts_proj[col], errors="coerce").to_numpy()
+        agg[col] = (col, "mean")
+
+    summary = df.groupby("cluster_id", sort=True).agg(**agg)
+
+    for col in CLUSTER_MAJORITY_COLUMNS:
+        if col in alerts_proj.columns:
+            df[col] = alerts_proj[col].to_numpy()
+            summary[col] = _majority_by_cluster(df, col).reindex(summary.index)
+
+    centroids = gpd.GeoSeries(
+        gpd.points_from_xy(summary["x"], summary["y"]), index=summary.index, crs=utm_crs
+    ).to_crs(epsg=4326)
+    summary["lat"] = centroids.y.round(6)
+    summary["lon"] = centroids.x.round(6)
+
+    return summary.drop(columns=["x", "y"])
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+from shapely.geometry import mapping, shape
+
+
+def build_cluster_jobs(clusters_bboxes, alerts_gdf, start_date, end_date, output_dir, mode="iframe",
+                       project=None, assets_dir=None, gcs_root=None, local_root=None) -> dict:
+    """
+    Arma un trabajo autocontenido por cluster para generar su mapa Sentinel-2
+    (en este proceso o en otros nodos, ver `src.work_queue`).
+
+    Parámetros:
+    - clusters_bboxes (GeoDataFrame): Salida de `get_cluster_bboxes`.
+    - alerts_gdf (GeoDataFrame): Alertas descargadas; cada trabajo lleva solo las de nivel
+      'highest' dentro de su cluster.
+    - output_dir (str): Carpeta de los mapas / miniaturas.
+    - mode (str): 'iframe', 'compartido' o 'lazy' (ver `--modo-reporte`).
+    - gcs_root (str, opcional): gs://... donde el trabajador sube lo que genera, con las rutas
+      relativas a `local_root`. Permite recoger los archivos hechos en otros nodos.
+
+    Retorna:
+    - dict {job_id: payload} en el orden de los clusters. El id incluye un hash del payload:
+      si cambian los insumos, el trabajo es otro.
+    """
+    highest = alerts_gdf.to_crs("EPSG:4326")
+    highest = highest[highest["gfw_integrated_alerts__confidence"] == "highest"][["geometry"]]
+    joined = gpd.sjoin(highest, clusters_bboxes[["cluster_id", "geometry"]], predicate="within")
+    joined = joined.sort_index(kind="stable")  # mismo orden de puntos que en las alertas
+    points = {
+        int(cid): [[p.x, p.y] for p in group.geometry]
+        for cid, group in joined.groupby("cluster_id", sort=False)
+    }
+
+    jobs = {}
+    for _, row in clusters_bboxes.iterrows():
+        cluster_id = int(row["cluster_id"])
+        suffix = "png" if mode == "lazy" else "html"
+        payload = {
+            "cluster_id": cluster_id,
+            "geometria": mapping(row.geometry),
+            "inicio": start_date,
+            "fin": end_date,
+            "modo": mode,
+            "proyecto": project,
+            "salida": os.path.join(output_dir, f"sentinel_cluster_{cluster_id}.{suffix}"),
+            "assets": assets_dir,
+            "alertas": points.get(cluster_id, []),
+            "gcs_raiz": gcs_root,
+            "local_raiz": local_root,
+        }
+        payload = json.loads(json.dumps(payload))
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        jobs[f"cluster_{cluster_id}_{digest}"] = payload
+    return jobs
+
+
+def artifact_gcs_path(payload: dict, local_path: str):
+    """
+    Ruta gs:// de un archivo generado por el trabajo (None si el trabajo no sube a GCS).
+    """
+    if not payload.get("gcs_raiz"):
+        return None
+    relative_path = os.path.relpath(local_path, payload["local_raiz"]).replace("\\", "/")
+    return f"{payload['gcs_raiz'].rstrip('/')}/{relative_path}"
+
+
+def run_cluster_job(payload: dict):
+    """
+    Genera el mapa Sentinel-2 de un cluster (página folium o mínima, o vista + miniatura
+    en modo lazy) y, si el trabajo lo indica, lo sube a GCS.
+
+    Retorna:
+    - dict con `cluster_id` y `map_html` o `vista`/`miniatura`; None si no hay imágenes.
+    """
+    from src.maps import cluster_map_view, plot_sentinel_cluster_interactive, sentinel_composite, sentinel_thumbnail
+
+    cluster_id = payload["cluster_id"]
+    geom = shape(payload["geometria"])
+    output_path = payload["salida"]
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    alerts_gdf = gpd.GeoDataFrame(
+        {"gfw_integrated_alerts__confidence": ["highest"] * len(payload["alertas"])},
+        geometry=gpd.points_from_xy(
+            [p[0] for p in payload["alertas"]], [p[1] for p in payload["alertas"]]
+        ),
+        crs="EPSG:4326",
+    )
+
+    if payload["modo"] == "lazy":
+        # Vista como datos + miniatura estática (sin página folium por cluster), del mismo mosaico
+        composite = sentinel_composite(geom, payload["inicio"], payload["fin"], project=payload["proyecto"])
+        view = cluster_map_view(geom, cluster_id, payload["inicio"], payload["fin"],
+                                alerts_gdf=alerts_gdf, project=payload["proyecto"], composite=composite)
+        if view is None:
+            return None
+        thumbnail = sentinel_thumbnail(geom, payload["inicio"], payload["fin"], output_path,
+                                       project=payload["proyecto"], composite=composite)
+        result = {"cluster_id": cluster_id, "vista": view, "miniatura": thumbnail}
+    else:
+        map_path = plot_sentinel_cluster_interactive(
+            cluster_geom=geom,
+            cluster_id=cluster_id,
+            start_date=payload["inicio"],
+            end_date=payload["fin"],
+            output_path=output_path,
+            alerts_gdf=alerts_gdf,
+            project=payload["proyecto"],
+            assets_dir=payload["assets"]
+        )
+        if not (map_path and os.path.exists(output_path)):
+            print(f"❌ Mapa NO generado para cluster {cluster_id}: {output_path} (map_path: {map_path})")
+            return None
+        print(f"✅ Mapa generado para cluster {cluster_id}: {output_path}")
+        result = {"cluster_id": cluster_id, "map_html": map_path}
+
+    local_path = result.get("map_html") or result.get("miniatura")
+    gcs_path = artifact_gcs_path(payload, local_path) if local_path else None
+    if gcs_path:
+        from src.gcs_io import upload_file_to_gcs
+
+        upload_file_to_gcs(local_path, gcs_path)
+    return result
+
+
+def fetch_job_artifacts(payload: dict, result: dict):
+    """
+    Descarga desde GCS el archivo de un trabajo hecho en otro nodo, si no existe localmente.
+
+    Retorna:
+    - str: Ruta local del archivo (o None si el trabajo no generó archivo).
+    """
+    local_path = result.get("map_html") or result.get("miniatura")
+    if local_path and not os.path.exists(local_path):
+        from src.gcs_io import download_gcs_to_local
+
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        download_gcs_to_local(artifact_gcs_path(payload, local_path), local_path)
+    return local_path
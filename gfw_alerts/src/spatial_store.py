@@ -0,0 +1,108 @@
+import os
+import shutil
+from typing import List, Optional
+from urllib.parse import quote
+
+import geopandas as gpd
+import pandas as pd
+
+
+# Partición por defecto de la capa de análisis (una carpeta por municipio)
+PARTITION_COLUMN = "NOMB_MPIO"
+# Filas por grupo de Parquet: cada grupo guarda el rango de su bbox y se descarta sin leerlo
+ROW_GROUP_SIZE = 10_000
+# Nombre de la partición de valores nulos (convención Hive que entiende pyarrow)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def hilbert_sort(gdf: gpd.GeoDataFrame, total_bounds=None) -> gpd.GeoDataFrame:
+    """
+    Ordena las geometrías según la curva de Hilbert, para que los grupos de filas
+    cercanos en el archivo también lo estén en el espacio.
+    """
+    if gdf.empty:
+        return gdf
+    order = gdf.hilbert_distance(total_bounds=total_bounds).to_numpy().argsort(kind="stable")
+    return gdf.iloc[order]
+
+
+def save_partitioned_geoparquet(
+    gdf: gpd.GeoDataFrame,
+    output_dir: str,
+    partition_by: str = PARTITION_COLUMN,
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> List[str]:
+    """
+    Guarda un GeoDataFrame como GeoParquet particionado (estilo Hive: `<columna>=<valor>/`).
+
+    Cada archivo se ordena por la curva de Hilbert e incluye la columna `bbox` (GeoParquet 1.1),
+    de modo que los lectores pueden filtrar por extensión y por atributos sin leer todo
+    (ver `load_partitioned_geoparquet`), también directamente desde GCS.
+
+    Parámetros:
+    - gdf (GeoDataFrame): Capa a guardar.
+    - output_dir (str): Carpeta de salida (se reemplaza si ya existe).
+    - partition_by (str): Columna de partición.
+    - row_group_size (int): Filas por grupo de Parquet.
+
+    Retorna:
+    - List[str]: Rutas de los archivos escritos.
+    """
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    if gdf.empty:
+        path = os.path.join(output_dir, "part-0.parquet")
+        gdf.to_parquet(path, index=False, write_covering_bbox=True)
+        return [path]
+
+    total_bounds = gdf.total_bounds
+    paths = []
+    for value, part in gdf.groupby(partition_by, dropna=False, observed=True, sort=True):
+        name = NULL_PARTITION if pd.isna(value) else quote(str(value), safe="")
+        folder = os.path.join(output_dir, f"{partition_by}={name}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "part-0.parquet")
+        part = hilbert_sort(part.drop(columns=partition_by), total_bounds)
+        part.to_parquet(path, index=False, write_covering_bbox=True, row_group_size=row_group_size)
+        paths.append(path)
+
+    print(f"✅ GeoParquet particionado por {partition_by} ({len(paths)} particiones) en: {output_dir}")
+    return paths
+
+
+def load_partitioned_geoparquet(
+    path: str,
+    bbox=None,
+    filters=None,
+    columns: Optional[List[str]] = None,
+    partition_by: str = PARTITION_COLUMN,
+) -> gpd.GeoDataFrame:
+    """
+    Lee una capa guardada con `save_partitioned_geoparquet` (ruta local o gs://).
+
+    Parámetros:
+    - bbox (tuple, opcional): (minx, miny, maxx, maxy) en el CRS de la capa; solo se leen
+      los grupos de filas que lo intersectan.
+    - filters (list, opcional): Filtros de pyarrow, p. ej. [("NOMB_MPIO", "==", "La Calera")].
+      Los filtros sobre la columna de partición descartan carpetas enteras.
+    - columns (List[str], opcional): Columnas a leer.
+    """
+    import pyarrow.dataset as ds
+
+    # Partición como texto (no diccionario): admite la partición de nulos
+    partitioning = ds.HivePartitioning.discover(null_fallback=NULL_PARTITION)
+    gdf = gpd.read_parquet(path, bbox=bbox, filters=filters, columns=columns, partitioning=partitioning)
+    if partition_by in gdf.columns:
+        gdf[partition_by] = gdf[partition_by].astype("string")
+    return gdf
+
+
+def save_flatgeobuf(gdf: gpd.GeoDataFrame, output_path: str):
+    """
+    Guarda un GeoDataFrame como FlatGeobuf con índice espacial (R-tree empaquetado),
+    que permite lecturas por bbox en streaming (`gpd.read_file(path, bbox=...)`).
+    """
+    gdf.to_file(output_path, driver="FlatGeobuf", SPATIAL_INDEX="YES")
+    print(f"✅ FlatGeobuf guardado en: {output_path}")
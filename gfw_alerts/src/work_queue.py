@@ -0,0 +1,450 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import closing, suppress
+
+
+# Duración de un lease: si el trabajador no envía latidos en ese plazo, el trabajo vuelve a la cola
+LEASE_SECONDS = 120
+# Intentos por trabajo (leases expirados incluidos) antes de marcarlo como fallido
+MAX_ATTEMPTS = 3
+# Espera entre consultas cuando no hay trabajos disponibles
+POLL_SECONDS = 2.0
+
+# Estados de un trabajo
+PENDING = "pendiente"
+LEASED = "en_proceso"
+DONE = "hecho"
+FAILED = "fallido"
+STATES = (PENDING, LEASED, DONE, FAILED)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue(ABC):
+    """
+    Cola durable de trabajos con leases, compartida entre procesos o nodos.
+
+    Cada trabajo (id → payload JSON) se publica una sola vez; volver a publicarlo solo
+    reencola los que terminaron fallidos (o los estados de `requeue`). Un trabajador lo toma con
+    `claim` por `lease_seconds` y lo mantiene con `heartbeat`; si deja de enviar latidos,
+    el lease expira y otro trabajador lo reintenta (hasta `max_attempts`). El primer
+    resultado escrito con `complete` es el definitivo: los duplicados se ignoran.
+
+    Backends: `SQLiteWorkQueue` (un archivo .db) y `FileWorkQueue` (una carpeta, p. ej.
+    en un disco compartido). Ver `open_queue`.
+    """
+
+    def __init__(self, name: str, max_attempts: int = MAX_ATTEMPTS):
+        self.name = name
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def publish(self, jobs: dict, requeue=(FAILED,)) -> int:
+        """
+        Publica trabajos {job_id: payload}. Los ids ya existentes se conservan, salvo los
+        que están en un estado de `requeue` (por defecto, fallidos): vuelven a quedar
+        pendientes con los intentos en cero. Con `requeue=(FAILED, DONE)` tampoco se
+        reutilizan resultados de corridas anteriores.
+
+        Retorna:
+        - int: Número de trabajos nuevos o reencolados.
+        """
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float = LEASE_SECONDS):
+        """
+        Toma el siguiente trabajo disponible (pendiente o con lease expirado).
+
+        Retorna:
+        - dict con `id`, `payload` e `intento`, o None si no hay trabajos disponibles.
+        """
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        """
+        Extiende el lease. Retorna False si el trabajador ya no lo tiene (expiró y otro lo tomó).
+        """
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        """
+        Guarda el resultado (serializable en JSON). Retorna False si ya había uno.
+        """
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str):
+        """
+        Libera el trabajo para reintentarlo, o lo marca como fallido si agotó los intentos.
+        """
+
+    @abstractmethod
+    def states(self) -> dict:
+        """
+        Retorna {job_id: estado} de todos los trabajos de la cola.
+        """
+
+    @abstractmethod
+    def results(self, job_ids=None) -> dict:
+        """
+        Retorna {job_id: resultado} de los trabajos terminados (solo `job_ids` si se indican).
+        """
+
+    def counts(self) -> dict:
+        counts = dict.fromkeys(STATES, 0)
+        for state in self.states().values():
+            counts[state] += 1
+        return counts
+
+    def is_drained(self) -> bool:
+        """
+        True si no quedan trabajos pendientes ni en proceso.
+        """
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Cola en una base SQLite (modo WAL). Sirve para varios procesos en la misma máquina;
+    la toma de trabajos es atómica (`BEGIN IMMEDIATE`).
+    """
+
+    def __init__(self, path: str, name: str, max_attempts: int = MAX_ATTEMPTS):
+        super().__init__(name, max_attempts)
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trabajos ("
+                " cola TEXT NOT NULL, id TEXT NOT NULL, payload TEXT NOT NULL,"
+                " estado TEXT NOT NULL, intentos INTEGER NOT NULL DEFAULT 0,"
+                " trabajador TEXT, lease_hasta REAL, resultado TEXT, error TEXT,"
+                " PRIMARY KEY (cola, id))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _expire_leases(self, conn, now):
+        conn.execute(
+            "UPDATE trabajos SET estado = CASE WHEN intentos >= ? THEN ? ELSE ? END,"
+            " error = COALESCE(error, 'lease expirado'), trabajador = NULL"
+            " WHERE cola = ? AND estado = ? AND lease_hasta < ?",
+            (self.max_attempts, FAILED, PENDING, self.name, LEASED, now),
+        )
+
+    def publish(self, jobs: dict, requeue=(FAILED,)) -> int:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Un lease vencido en el último intento también cuenta como fallido
+            self._expire_leases(conn, time.time())
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO trabajos (cola, id, payload, estado) VALUES (?, ?, ?, ?)",
+                [(self.name, job_id, json.dumps(payload), PENDING) for job_id, payload in jobs.items()],
+            )
+            for state in requeue:
+                conn.executemany(
+                    "UPDATE trabajos SET estado = ?, intentos = 0, trabajador = NULL, lease_hasta = NULL,"
+                    " resultado = NULL, error = NULL WHERE cola = ? AND id = ? AND estado = ?",
+                    [(PENDING, self.name, job_id, state) for job_id in jobs],
+                )
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+
+    def claim(self, worker_id: str, lease_seconds: float = LEASE_SECONDS):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT id, payload, intentos FROM trabajos WHERE cola = ? AND estado = ? ORDER BY rowid LIMIT 1",
+                (self.name, PENDING),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE trabajos SET estado = ?, trabajador = ?, lease_hasta = ?, intentos = intentos + 1"
+                    " WHERE cola = ? AND id = ?",
+                    (LEASED, worker_id, now + lease_seconds, self.name, row[0]),
+                )
+            conn.execute("COMMIT")
+        if row is None:
+            return None
+        return {"id": row[0], "payload": json.loads(row[1]), "intento": row[2] + 1}
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE trabajos SET lease_hasta = ?"
+                " WHERE cola = ? AND id = ? AND trabajador = ? AND estado = ? AND lease_hasta >= ?",
+                (now + lease_seconds, self.name, job_id, worker_id, LEASED, now),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE trabajos SET estado = ?, resultado = ?, trabajador = ?, error = NULL"
+                " WHERE cola = ? AND id = ? AND estado != ?",
+                (DONE, json.dumps(result), worker_id, self.name, job_id, DONE),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE trabajos SET estado = CASE WHEN intentos >= ? THEN ? ELSE ? END,"
+                " error = ?, trabajador = NULL"
+                " WHERE cola = ? AND id = ? AND trabajador = ? AND estado = ?",
+                (self.max_attempts, FAILED, PENDING, error, self.name, job_id, worker_id, LEASED),
+            )
+
+    def states(self) -> dict:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire_leases(conn, time.time())
+            conn.execute("COMMIT")
+            rows = conn.execute("SELECT id, estado FROM trabajos WHERE cola = ?", (self.name,)).fetchall()
+        return dict(rows)
+
+    def results(self, job_ids=None) -> dict:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, resultado FROM trabajos WHERE cola = ? AND estado = ?", (self.name, DONE)
+            ).fetchall()
+        wanted = None if job_ids is None else set(job_ids)
+        return {job_id: json.loads(result) for job_id, result in rows if wanted is None or job_id in wanted}
+
+
+class FileWorkQueue(WorkQueue):
+    """
+    Cola en una carpeta (local o en un disco compartido entre nodos, p. ej. NFS):
+
+        <raiz>/<cola>/trabajos/<id>.json        payload
+        <raiz>/<cola>/leases/<id>.<intento>     dueño y vencimiento de cada intento
+        <raiz>/<cola>/resultados/<id>.json      resultado (el primero gana)
+        <raiz>/<cola>/fallidos/<id>.json        error del último intento
+
+    Cada intento crea su propio archivo de lease con O_EXCL, así que dos trabajadores
+    nunca toman el mismo intento.
+    """
+
+    def __init__(self, root: str, name: str, max_attempts: int = MAX_ATTEMPTS):
+        super().__init__(name, max_attempts)
+        self.folder = os.path.join(root, name)
+        for sub in ("trabajos", "leases", "resultados", "fallidos"):
+            os.makedirs(os.path.join(self.folder, sub), exist_ok=True)
+
+    def _path(self, sub, name):
+        return os.path.join(self.folder, sub, name)
+
+    def _write_new(self, path, data) -> bool:
+        # Escritura atómica que falla si el archivo ya existe (primer escritor gana)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        try:
+            os.link(tmp_path, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _job_ids(self):
+        return sorted(name[:-5] for name in os.listdir(os.path.join(self.folder, "trabajos")) if name.endswith(".json"))
+
+    def _current_lease(self, job_id):
+        prefix = f"{job_id}."
+        attempts = [
+            int(name[len(prefix):]) for name in os.listdir(os.path.join(self.folder, "leases"))
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        ]
+        if not attempts:
+            return 0, None
+        attempt = max(attempts)
+        return attempt, self._read(self._path("leases", f"{job_id}.{attempt}"))
+
+    def _state(self, job_id, now):
+        if os.path.exists(self._path("resultados", f"{job_id}.json")):
+            return DONE
+        if os.path.exists(self._path("fallidos", f"{job_id}.json")):
+            return FAILED
+        attempt, lease = self._current_lease(job_id)
+        if attempt == 0:
+            return PENDING
+        # Los leases se escriben de forma atómica; uno ilegible se considera vigente
+        if lease is None or lease["hasta"] >= now:
+            return LEASED
+        return FAILED if attempt >= self.max_attempts else PENDING
+
+    def _reset(self, job_id):
+        # Sin resultado, error ni leases el trabajo vuelve a estar pendiente desde el intento 1
+        paths = [self._path("resultados", f"{job_id}.json"), self._path("fallidos", f"{job_id}.json")]
+        prefix = f"{job_id}."
+        paths += [
+            self._path("leases", name) for name in os.listdir(os.path.join(self.folder, "leases"))
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        ]
+        for path in paths:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+    def publish(self, jobs: dict, requeue=(FAILED,)) -> int:
+        now = time.time()
+        published = 0
+        for job_id, payload in jobs.items():
+            if self._write_new(self._path("trabajos", f"{job_id}.json"), payload):
+                published += 1
+            elif self._state(job_id, now) in requeue:
+                self._reset(job_id)
+                published += 1
+        return published
+
+    def claim(self, worker_id: str, lease_seconds: float = LEASE_SECONDS):
+        now = time.time()
+        for job_id in self._job_ids():
+            if self._state(job_id, now) != PENDING:
+                continue
+            attempt, _ = self._current_lease(job_id)
+            lease = {"trabajador": worker_id, "hasta": now + lease_seconds}
+            if not self._write_new(self._path("leases", f"{job_id}.{attempt + 1}"), lease):
+                continue  # otro trabajador tomó este intento
+            payload = self._read(self._path("trabajos", f"{job_id}.json"))
+            return {"id": job_id, "payload": payload, "intento": attempt + 1}
+        return None
+
+    def _own_lease(self, job_id, worker_id):
+        attempt, lease = self._current_lease(job_id)
+        if lease is None or lease["trabajador"] != worker_id:
+            return None
+        return attempt
+
+    def _replace_lease(self, job_id, attempt, lease):
+        path = self._path("leases", f"{job_id}.{attempt}")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(lease, f)
+        os.replace(tmp_path, path)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        attempt = self._own_lease(job_id, worker_id)
+        if attempt is None or self._state(job_id, time.time()) != LEASED:
+            return False
+        self._replace_lease(job_id, attempt, {"trabajador": worker_id, "hasta": time.time() + lease_seconds})
+        return True
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        return self._write_new(self._path("resultados", f"{job_id}.json"), {"trabajador": worker_id, "resultado": result})
+
+    def fail(self, job_id: str, worker_id: str, error: str):
+        attempt = self._own_lease(job_id, worker_id)
+        if attempt is None:
+            return
+        if attempt >= self.max_attempts:
+            self._write_new(self._path("fallidos", f"{job_id}.json"), {"trabajador": worker_id, "error": error})
+        # Lease vencido: el trabajo queda disponible para el siguiente intento
+        self._replace_lease(job_id, attempt, {"trabajador": worker_id, "hasta": 0, "error": error})
+
+    def states(self) -> dict:
+        now = time.time()
+        return {job_id: self._state(job_id, now) for job_id in self._job_ids()}
+
+    def results(self, job_ids=None) -> dict:
+        ids = self._job_ids() if job_ids is None else job_ids
+        results = {}
+        for job_id in ids:
+            data = self._read(self._path("resultados", f"{job_id}.json"))
+            if data is not None:
+                results[job_id] = data["resultado"]
+        return results
+
+
+def open_queue(url: str, name: str, max_attempts: int = MAX_ATTEMPTS) -> WorkQueue:
+    """
+    Abre una cola según la URL:
+    - `sqlite:///ruta/cola.db` (o una ruta terminada en .db / .sqlite) → `SQLiteWorkQueue`
+    - `file:///ruta/carpeta` (o cualquier otra ruta) → `FileWorkQueue`
+    """
+    if url.startswith("sqlite://"):
+        return SQLiteWorkQueue(url[len("sqlite://"):], name, max_attempts)
+    if url.startswith("file://"):
+        return FileWorkQueue(url[len("file://"):], name, max_attempts)
+    if url.endswith((".db", ".sqlite")):
+        return SQLiteWorkQueue(url, name, max_attempts)
+    return FileWorkQueue(url, name, max_attempts)
+
+
+def run_worker(queue: WorkQueue, handler, worker_id=None, lease_seconds: float = LEASE_SECONDS,
+               heartbeat_seconds=None, poll_seconds: float = POLL_SECONDS, until_drained: bool = True) -> int:
+    """
+    Consume trabajos de la cola con `handler(payload) -> resultado` (serializable en JSON).
+
+    Mientras `handler` corre, un hilo envía latidos cada `heartbeat_seconds` (por defecto,
+    un cuarto del lease). Si `handler` lanza una excepción, el trabajo se libera para
+    reintentarlo. Con `until_drained` el trabajador termina cuando no quedan trabajos
+    pendientes ni en proceso (los leases de otros trabajadores que expiren se retoman).
+
+    Retorna:
+    - int: Trabajos completados por este trabajador.
+    """
+    worker_id = worker_id or default_worker_id()
+    heartbeat_seconds = heartbeat_seconds or lease_seconds / 4
+    completed = 0
+
+    while True:
+        job = queue.claim(worker_id, lease_seconds)
+        if job is None:
+            if until_drained and queue.is_drained():
+                return completed
+            time.sleep(poll_seconds)
+            continue
+
+        stop = threading.Event()
+
+        def beat(job_id=job["id"]):
+            while not stop.wait(heartbeat_seconds):
+                if not queue.heartbeat(job_id, worker_id, lease_seconds):
+                    print(f"⚠️ {worker_id}: se perdió el lease de {job_id}")
+                    return
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        try:
+            result = handler(job["payload"])
+        except Exception as e:
+            print(f"❌ {worker_id}: falló {job['id']} (intento {job['intento']}): {e}")
+            queue.fail(job["id"], worker_id, f"{type(e).__name__}: {e}")
+        else:
+            queue.complete(job["id"], worker_id, result)
+            completed += 1
+        finally:
+            stop.set()
+            beater.join()
+
+
+async def wait_drained(queue: WorkQueue, poll_seconds: float = POLL_SECONDS):
+    """
+    Espera (sin bloquear el bucle de eventos) a que la cola no tenga trabajos pendientes ni en proceso.
+    """
+    while not await asyncio.to_thread(queue.is_drained):
+        await asyncio.sleep(poll_seconds)
@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# `import main` no debe cargar las dependencias pesadas (se importan dentro de las funciones)
+HEAVY_MODULES = ("geopandas", "ee", "folium")
+GFW_ALERTS_DIR = Path(__file__).resolve().parent.parent
+# Presupuesto de arranque en frío, en segundos (el mismo de benchmarks/run_benchmarks.py)
+IMPORT_BUDGET_S = 1.0
+# Se toma el mejor de varios intentos para no fallar por ruido de la máquina
+STARTUP_RUNS = 3
+
+
+def test_import_main_skips_heavy_modules():
+    code = (
+        "import json, sys, main; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=GFW_ALERTS_DIR, check=True, capture_output=True, text=True
+    )
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == [], f"import main cargó {loaded}"
+
+
+def test_import_main_within_budget():
+    code = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    times = []
+    for _ in range(STARTUP_RUNS):
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=GFW_ALERTS_DIR, check=True, capture_output=True, text=True
+        )
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    assert min(times) <= IMPORT_BUDGET_S, f"import main tardó {min(times):.3f} s (presupuesto {IMPORT_BUDGET_S} s)"
+
+
+def test_main_help_within_budget():
+    times = []
+    for _ in range(STARTUP_RUNS):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "main.py", "--help"], cwd=GFW_ALERTS_DIR, check=True, capture_output=True, text=True
+        )
+        times.append(time.perf_counter() - start)
+    assert min(times) <= IMPORT_BUDGET_S, f"main.py --help tardó {min(times):.3f} s (presupuesto {IMPORT_BUDGET_S} s)"